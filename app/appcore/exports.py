@@ -0,0 +1,238 @@
+"""
+Exportaciones en segundo plano.
+
+Las exportaciones grandes (stock completo, análisis comparativo, PDFs de
+transacciones y del schedule) no se generan dentro de la petición: la API crea
+un ExportJob y responde de inmediato; el comando run_export_jobs toma los
+trabajos pendientes de cada tenant con SELECT ... FOR UPDATE SKIP LOCKED (varios
+workers pueden correr en paralelo sin tomar el mismo trabajo), genera el
+archivo dentro del schema del tenant y lo guarda en MEDIA_ROOT/exports/.
+
+El avance se notifica por Channels al grupo del usuario (user_<id>_unread,
+el mismo socket de notificaciones) con mensajes 'export.progress'.
+"""
+
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django_tenants.utils import schema_context
+
+from appcore.models import ExportJob
+
+logger = logging.getLogger(__name__)
+
+
+class ExportParamsError(ValueError):
+    """Parámetros inválidos para el tipo de exportación pedido."""
+
+
+# ===== PRODUCTORES =====
+# Cada productor recibe los params del trabajo y un archivo binario abierto,
+# escribe el contenido y devuelve el nombre de archivo para la descarga.
+
+def _complete_stock(params, target):
+    from appinventory.views import complete_stock_export
+    from utils.xlsx_export import build_workbook
+
+    sheets, filename = complete_stock_export()
+    build_workbook(sheets, target)
+    return filename
+
+
+def _comparative_analysis(params, target):
+    from appinventory.views import comparative_analysis_export
+    from utils.xlsx_export import build_workbook
+
+    sheets, filename = comparative_analysis_export()
+    build_workbook(sheets, target)
+    return filename
+
+
+def _transaction_pdf(params, target):
+    from apptransactions.views import render_transaction_pdf, transaction_pdf_queryset
+
+    document = transaction_pdf_queryset().get(id=params['document_id'])
+    pdf_file, filename = render_transaction_pdf(document, params['logo_url'])
+    target.write(pdf_file)
+    return filename
+
+
+def _schedule_pdf(params, target):
+    from appschedule.views import render_schedule_pdf
+
+    pdf_file = render_schedule_pdf(
+        parse_date(params['start_at']), parse_date(params['end_at']), params['logo_url']
+    )
+    target.write(pdf_file)
+    return f"schedule_{params['start_at']}_to_{params['end_at']}.pdf"
+
+
+# tipo -> (productor, params obligatorios, usa logo del tenant)
+EXPORT_KINDS = {
+    'complete_stock': (_complete_stock, (), False),
+    'comparative_analysis': (_comparative_analysis, (), False),
+    'transaction_pdf': (_transaction_pdf, ('document_id',), True),
+    'schedule_pdf': (_schedule_pdf, ('start_at', 'end_at'), True),
+}
+
+
+def _job_timeout():
+    return timedelta(seconds=getattr(settings, 'EXPORT_JOB_TIMEOUT', 900))
+
+
+def _max_attempts():
+    return getattr(settings, 'EXPORT_JOB_MAX_ATTEMPTS', 3)
+
+
+def _heartbeat_interval():
+    return getattr(settings, 'EXPORT_JOB_HEARTBEAT', 30)
+
+
+# ===== COLA =====
+
+def enqueue_export(kind, params, user, logo_url=None):
+    """Valida los parámetros y crea el trabajo pendiente."""
+    if kind not in EXPORT_KINDS:
+        raise ExportParamsError(f"Tipo de exportación desconocido: '{kind}'")
+    _, required, uses_logo = EXPORT_KINDS[kind]
+
+    params = dict(params or {})
+    missing = [name for name in required if not params.get(name)]
+    if missing:
+        raise ExportParamsError(f"Faltan parámetros: {', '.join(missing)}")
+    if kind == 'schedule_pdf' and not (parse_date(params['start_at']) and parse_date(params['end_at'])):
+        raise ExportParamsError("start_at y end_at deben tener formato YYYY-MM-DD")
+    if uses_logo:
+        params['logo_url'] = logo_url
+
+    job = ExportJob.objects.create(kind=kind, params=params, created_by=user)
+    notify_progress(job)
+    return job
+
+
+def claim_next_job():
+    """
+    Toma el siguiente trabajo del schema actual, o None.
+
+    Mientras corre, el worker renueva heartbeat_at cada EXPORT_JOB_HEARTBEAT
+    segundos (ver _heartbeat). Los trabajos 'running' sin latido durante
+    EXPORT_JOB_TIMEOUT (el worker murió) vuelven a tomarse hasta
+    EXPORT_JOB_MAX_ATTEMPTS intentos; los que los agotaron se marcan como
+    fallidos y se sigue con el siguiente.
+    """
+    stale_before = timezone.now() - _job_timeout()
+    while True:
+        with transaction.atomic():
+            job = (
+                ExportJob.objects
+                .select_for_update(skip_locked=True)
+                .filter(
+                    Q(status=ExportJob.STATUS_PENDING)
+                    | Q(status=ExportJob.STATUS_RUNNING, heartbeat_at__lt=stale_before)
+                    | Q(status=ExportJob.STATUS_RUNNING, heartbeat_at__isnull=True, started_at__lt=stale_before)
+                )
+                .order_by('created_at')
+                .first()
+            )
+            if job is None:
+                return None
+            if job.attempts >= _max_attempts():
+                _finish(job, ExportJob.STATUS_FAILED, error="Se agotaron los intentos (worker interrumpido).")
+                continue
+
+            job.status = ExportJob.STATUS_RUNNING
+            job.attempts += 1
+            job.progress = 10
+            job.started_at = job.heartbeat_at = timezone.now()
+            job.save(update_fields=['status', 'attempts', 'progress', 'started_at', 'heartbeat_at'])
+        notify_progress(job)
+        return job
+
+
+@contextmanager
+def _heartbeat(job):
+    """
+    Renueva heartbeat_at desde un hilo aparte mientras el productor trabaja
+    (un productor es una sola llamada larga, sin puntos de avance intermedios).
+    El hilo usa su propia conexión, en el schema del trabajo.
+    """
+    schema_name = connection.schema_name
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(_heartbeat_interval()):
+                try:
+                    with schema_context(schema_name):
+                        ExportJob.objects.filter(
+                            pk=job.pk, status=ExportJob.STATUS_RUNNING
+                        ).update(heartbeat_at=timezone.now())
+                except Exception:
+                    logger.warning("No se pudo renovar el latido de la exportación #%s", job.pk, exc_info=True)
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=beat, name=f"export-heartbeat-{job.pk}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run_job(job):
+    """Genera el archivo del trabajo (fuera de la transacción del claim)."""
+    producer = EXPORT_KINDS[job.kind][0] if job.kind in EXPORT_KINDS else None
+    if producer is None:
+        _finish(job, ExportJob.STATUS_FAILED, error=f"Tipo de exportación desconocido: '{job.kind}'")
+        return job
+
+    try:
+        with tempfile.TemporaryFile() as tmp:
+            with _heartbeat(job):
+                filename = producer(job.params, tmp)
+            tmp.seek(0)
+            job.progress = 90
+            notify_progress(job)
+            job.file.save(os.path.basename(filename), File(tmp), save=False)
+        job.filename = filename
+        _finish(job, ExportJob.STATUS_DONE)
+    except Exception as e:
+        logger.exception("Error en exportación %s #%s", job.kind, job.pk)
+        _finish(job, ExportJob.STATUS_FAILED, error=str(e))
+    return job
+
+
+def _finish(job, status, error=''):
+    job.status = status
+    job.error = error
+    job.progress = 100 if status == ExportJob.STATUS_DONE else job.progress
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'progress', 'file', 'filename', 'finished_at'])
+    transaction.on_commit(lambda: notify_progress(job))
+
+
+def notify_progress(job):
+    if not job.created_by_id:
+        return
+    from appschedule.groups import tenant_group
+    from appschedule.signals import _notify_group
+
+    _notify_group(tenant_group(f"user_{job.created_by_id}_unread"), {
+        'type': 'export.progress',
+        'job_id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+    })
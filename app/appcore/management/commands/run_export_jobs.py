@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django_tenants.utils import get_public_schema_name, get_tenant_model, schema_context
+
+from appcore.exports import claim_next_job, run_job
+
+# python manage.py run_export_jobs                     (worker continuo, todos los tenants)
+# python manage.py run_export_jobs --once              (procesa lo pendiente y termina)
+# python manage.py run_export_jobs --schema phoenix    (sólo un tenant)
+
+
+class Command(BaseCommand):
+    help = 'Process queued export jobs (Excel/PDF) for every active tenant.'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Salir cuando no queden trabajos pendientes.")
+        parser.add_argument("--sleep", type=float, default=2.0, help="Segundos de espera cuando la cola está vacía.")
+        parser.add_argument("--schema", help="Procesar sólo este schema.")
+
+    def _schemas(self, only):
+        if only:
+            return [only]
+        return list(
+            get_tenant_model().objects
+            .filter(is_active=True)
+            .exclude(schema_name=get_public_schema_name())
+            .values_list("schema_name", flat=True)
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("[INFO] Export worker started.")
+        while True:
+            processed = 0
+            for schema in self._schemas(options.get("schema")):
+                with schema_context(schema):
+                    job = claim_next_job()
+                    if job is None:
+                        continue
+                    run_job(job)
+                    processed += 1
+                    self.stdout.write(f"[{schema}] {job.kind} #{job.id}: {job.status}")
+
+            if processed:
+                continue
+            if options["once"]:
+                break
+            # Un worker de larga duración no debe quedarse con conexiones caídas
+            connections.close_all()
+            time.sleep(options["sleep"])
+        self.stdout.write(self.style.SUCCESS("[SUCCESS] No pending export jobs."))
@@ -0,0 +1,37 @@
+# Generated by Django 5.0.3 on 2026-10-18 18:10
+
+import os
+import shutil
+
+from django.conf import settings
+from django.db import migrations, models
+
+import appcore.models
+
+
+def move_exports_out_of_media(apps, schema_editor):
+    """Los archivos ya generados pasan de MEDIA_ROOT a EXPORT_ROOT con el mismo nombre."""
+    ExportJob = apps.get_model('appcore', 'ExportJob')
+    for name in ExportJob.objects.exclude(file='').values_list('file', flat=True):
+        source = os.path.join(settings.MEDIA_ROOT, name)
+        if not os.path.exists(source):
+            continue
+        target = os.path.join(settings.EXPORT_ROOT, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.move(source, target)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appcore', '0003_exportjob_heartbeat_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exportjob',
+            name='file',
+            field=models.FileField(blank=True, max_length=255, storage=appcore.models.export_storage, upload_to=appcore.models.export_job_upload_to),
+        ),
+        migrations.RunPython(move_exports_out_of_media, migrations.RunPython.noop),
+    ]
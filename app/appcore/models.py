@@ -1,3 +1,7 @@
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
 from django.db import models
 from django.utils.text import slugify
 
@@ -42,3 +46,63 @@ class ManualEntry(models.Model):
 
     def __str__(self):
         return f"{self.title} ({self.module})"
+
+
+def export_storage():
+    # Fuera de MEDIA_ROOT (/media/ es público): los archivos sólo salen por la vista de descarga
+    return FileSystemStorage(location=settings.EXPORT_ROOT)
+
+
+def export_job_upload_to(instance, filename):
+    # Carpeta por tenant y por trabajo
+    from django.db import connection
+    return f"{connection.schema_name}/{instance.token}/{filename}"
+
+
+class ExportJob(models.Model):
+    """
+    Exportación (Excel/PDF) ejecutada en segundo plano por el comando
+    run_export_jobs. La tabla es la cola: el worker toma trabajos pendientes
+    con SELECT ... FOR UPDATE SKIP LOCKED (ver appcore/exports.py).
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    kind = models.CharField(max_length=50)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    progress = models.PositiveSmallIntegerField(default=0)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    file = models.FileField(upload_to=export_job_upload_to, storage=export_storage, max_length=255, blank=True)
+    filename = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='export_jobs'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Lo renueva el worker mientras genera el archivo (ver appcore.exports._heartbeat)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='appcore_exportjob_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
@@ -0,0 +1,20 @@
+from rest_framework import serializers
+
+from appcore.models import ExportJob
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = [
+            'id', 'kind', 'params', 'status', 'progress', 'filename', 'error',
+            'created_at', 'started_at', 'finished_at', 'download_url',
+        ]
+        read_only_fields = fields
+
+    def get_download_url(self, obj):
+        if obj.status != ExportJob.STATUS_DONE:
+            return None
+        return f"/api/export-jobs/{obj.id}/download/"
@@ -0,0 +1,9 @@
+from django.urls import path
+
+from .views import ExportJobListCreateAPIView, ExportJobDetailAPIView, ExportJobDownloadAPIView
+
+urlpatterns = [
+    path('api/export-jobs/', ExportJobListCreateAPIView.as_view(), name='export-jobs'),
+    path('api/export-jobs/<int:pk>/', ExportJobDetailAPIView.as_view(), name='export-job-detail'),
+    path('api/export-jobs/<int:pk>/download/', ExportJobDownloadAPIView.as_view(), name='export-job-download'),
+]
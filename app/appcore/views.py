@@ -1,3 +1,66 @@
-from django.shortcuts import render
+import mimetypes
 
-# Create your views here.
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from rest_framework import status
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from appcore.exports import ExportParamsError, enqueue_export
+from appcore.models import ExportJob
+from appcore.serializers import ExportJobSerializer
+from utils.branding import tenant_logo_url
+
+
+class ExportJobListCreateAPIView(APIView):
+    """
+    GET: últimas exportaciones del usuario.
+    POST {"kind": "...", "params": {...}}: encola una exportación (202).
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        jobs = ExportJob.objects.filter(created_by=request.user)[:50]
+        return Response(ExportJobSerializer(jobs, many=True).data)
+
+    def post(self, request):
+        try:
+            job = enqueue_export(
+                request.data.get('kind'),
+                request.data.get('params'),
+                request.user,
+                logo_url=tenant_logo_url(request),
+            )
+        except ExportParamsError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(ExportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+class ExportJobDetailAPIView(APIView):
+    """Estado de una exportación (para polling si no hay WebSocket)."""
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        job = get_object_or_404(ExportJob, pk=pk, created_by=request.user)
+        return Response(ExportJobSerializer(job).data)
+
+
+class ExportJobDownloadAPIView(APIView):
+    """Descarga del archivo generado."""
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        job = get_object_or_404(ExportJob, pk=pk, created_by=request.user)
+        if job.status != ExportJob.STATUS_DONE or not job.file:
+            return Response({'error': 'La exportación aún no está lista'}, status=status.HTTP_409_CONFLICT)
+        try:
+            fileobj = job.file.open('rb')
+        except FileNotFoundError:
+            raise Http404("El archivo de la exportación ya no existe")
+        content_type = mimetypes.guess_type(job.filename)[0] or 'application/octet-stream'
+        return FileResponse(fileobj, as_attachment=True, filename=job.filename, content_type=content_type)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AppinventoryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'appinventory'
+
+    def ready(self):
+        import appinventory.signals
@@ -0,0 +1,158 @@
+"""
+Tabla de conversión de unidades cacheada por proceso y por tenant.
+
+convert_to_reference_unit() trabaja con objetos (product, unit) y puede
+disparar cargas perezosas de FK en cada llamada. Este módulo carga una sola
+vez, por schema, la tabla de UnitOfMeasure (signo y factor) y la unidad por
+defecto de cada producto, y ofrece:
+
+- UnitConversionTable.preload_products(product_ids)
+- UnitConversionTable.to_reference(product_id, unit_id, quantity)
+- UnitConversionTable.convert_many([(product_id, unit_id, quantity), ...])
+
+Ambas aplican exactamente las mismas reglas y redondeo que
+convert_to_reference_unit(). Las señales (appinventory/signals.py) descartan
+la tabla en el proceso que hace el cambio y, tras el commit, cambian la
+versión compartida del scope "unit_conversions" (utils.tenant_cache): los
+demás procesos recargan cuando la ven, como mucho
+SHARED_VERSION_CHECK_INTERVAL segundos después (recent_version). El TTL
+(UNIT_CONVERSION_CACHE_TTL) queda sólo como respaldo.
+"""
+
+import threading
+import time
+from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from utils.tenant_cache import bump_version, recent_version
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0.00')
+VERSION_SCOPE = 'unit_conversions'
+
+
+def _cache_ttl():
+    return getattr(settings, 'UNIT_CONVERSION_CACHE_TTL', 60)
+
+
+class UnitConversionTable:
+    def __init__(self, version=None):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self._lock = threading.Lock()
+        # product_id -> unit_default_id (se completa bajo demanda)
+        self.product_units = {}
+        self._load_units()
+
+    def _load_units(self):
+        from appinventory.models import UnitOfMeasure
+
+        # unit_id -> (sign, factor); factores inválidos se guardan como None
+        self.units = {
+            unit_id: (sign, factor if factor and factor > 0 else None)
+            for unit_id, sign, factor in UnitOfMeasure.objects.values_list(
+                'id', 'conversion_sign', 'conversion_factor'
+            )
+        }
+
+    def is_expired(self):
+        return time.monotonic() - self.loaded_at > _cache_ttl()
+
+    def preload_products(self, product_ids):
+        """Carga en una sola consulta las unidades por defecto que falten."""
+        missing = {pid for pid in product_ids if pid is not None and pid not in self.product_units}
+        if not missing:
+            return
+        from appinventory.models import Product
+
+        loaded = dict(Product.objects.filter(id__in=missing).values_list('id', 'unit_default_id'))
+        with self._lock:
+            for pid in missing:
+                self.product_units[pid] = loaded.get(pid)
+
+    def to_reference(self, product_id, unit_id, quantity):
+        if quantity is None:
+            return ZERO
+        try:
+            quantity = Decimal(quantity)
+        except (InvalidOperation, TypeError):
+            return ZERO
+
+        if not unit_id:
+            return quantity.quantize(CENT, rounding=ROUND_HALF_UP)
+
+        if product_id not in self.product_units:
+            self.preload_products([product_id])
+        if unit_id == self.product_units.get(product_id):
+            return quantity.quantize(CENT, rounding=ROUND_HALF_UP)
+
+        if unit_id not in self.units:
+            self._load_units()  # unidad creada en otro proceso después de la carga
+        sign, factor = self.units.get(unit_id, ('ref', None))
+        if factor is None:
+            return quantity.quantize(CENT, rounding=ROUND_HALF_UP)
+        if sign == '*':
+            quantity = quantity * factor
+        elif sign == '/':
+            quantity = quantity / factor
+        return quantity.quantize(CENT, rounding=ROUND_HALF_UP)
+
+    def convert_many(self, rows):
+        """
+        Convierte una secuencia de (product_id, unit_id, quantity) a la unidad
+        de referencia, en el mismo orden. Como máximo una consulta para los
+        productos que aún no estén en la tabla.
+        """
+        rows = list(rows)
+        self.preload_products(product_id for product_id, _, _ in rows)
+        return [self.to_reference(product_id, unit_id, qty) for product_id, unit_id, qty in rows]
+
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def _schema_name():
+    return getattr(connection, 'schema_name', 'public')
+
+
+def get_conversion_table():
+    """Tabla de conversión del tenant activo (cargada una vez por proceso y versión)."""
+    schema = _schema_name()
+    version = recent_version(VERSION_SCOPE, schema)
+    table = _tables.get(schema)
+    if table is None or table.version != version or table.is_expired():
+        table = UnitConversionTable(version)
+        with _tables_lock:
+            _tables[schema] = table
+    return table
+
+
+def _bump_on_commit(schema):
+    transaction.on_commit(lambda: bump_version(VERSION_SCOPE, schema))
+
+
+def invalidate_conversion_table(schema_name=None):
+    """Descarta la tabla aquí y, tras el commit, en los demás procesos."""
+    schema = schema_name or _schema_name()
+    with _tables_lock:
+        _tables.pop(schema, None)
+    _bump_on_commit(schema)
+
+
+def forget_product(product_id):
+    """
+    Descarta la unidad por defecto cacheada de un producto en este proceso;
+    los demás recargan la tabla tras el commit.
+    """
+    schema = _schema_name()
+    table = _tables.get(schema)
+    if table is not None:
+        table.product_units.pop(product_id, None)
+    _bump_on_commit(schema)
+
+
+def to_reference_quantity(product_id, unit_id, quantity):
+    return get_conversion_table().to_reference(product_id, unit_id, quantity)
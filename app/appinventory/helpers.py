@@ -23,7 +23,8 @@ def convert_to_reference_unit(product, unit, quantity):
         # print("⚠️ Unit es None, devolviendo quantity sin conversión.")
         return quantity.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
 
-    if unit == product.unit_default:
+    # Comparar ids evita cargar product.unit_default desde la BD
+    if unit.pk == product.unit_default_id:
         # print("✅ Unit es la unidad por defecto, devolviendo quantity sin conversión.")
         return quantity.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
 
@@ -47,3 +48,32 @@ def convert_to_reference_unit(product, unit, quantity):
     except Exception as e:
         print(f"❌ Error en conversión matemática: {e}")
         return quantity.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def reference_quantity_expression(prefix=""):
+    """
+    Expresión ORM equivalente a convert_to_reference_unit(), evaluada en SQL.
+
+    `prefix` es la ruta (con '__' final) hasta el modelo que tiene los campos
+    `quantity`, `unit` y `product` (ej: '' para DocumentLine/InventoryMovement).
+    Replica las mismas reglas: sin unidad, unidad por defecto del producto o
+    factor inválido => cantidad original; '*' multiplica, '/' divide; redondeo
+    a 2 decimales.
+    """
+    from django.db.models import Case, DecimalField, F, Q, When
+    from django.db.models.functions import Round
+
+    quantity = F(f"{prefix}quantity")
+    factor = F(f"{prefix}unit__conversion_factor")
+    return Case(
+        When(
+            Q(**{f"{prefix}unit__isnull": True})
+            | Q(**{f"{prefix}unit": F(f"{prefix}product__unit_default")})
+            | Q(**{f"{prefix}unit__conversion_factor__lte": 0}),
+            then=quantity,
+        ),
+        When(**{f"{prefix}unit__conversion_sign": "*"}, then=Round(quantity * factor, 2)),
+        When(**{f"{prefix}unit__conversion_sign": "/"}, then=Round(quantity / factor, 2)),
+        default=quantity,
+        output_field=DecimalField(max_digits=20, decimal_places=4),
+    )
@@ -1,48 +1,204 @@
-from django.core.management.base import BaseCommand
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django_tenants.utils import get_public_schema_name, get_tenant_model, schema_context
+
 from apptransactions.models import DocumentLine
-from appinventory.models import Stock
-from django.db import transaction
-from appinventory.helpers import convert_to_reference_unit
+from appinventory.models import InventoryMovement, Stock, StockRecalculation
+from appinventory.helpers import reference_quantity_expression
 
-# python manage.py recalculate_stock
+# python manage.py recalculate_stock                               (rebuild completo del schema actual)
+# python manage.py recalculate_stock --since last                  (incremental desde el último checkpoint)
+# python manage.py recalculate_stock --since 2025-01-01
+# python manage.py recalculate_stock --all-tenants --workers 4     (todos los schemas en paralelo)
 
-class Command(BaseCommand):
-    help = 'Recalculate stock levels for all products and warehouses based on document lines.'
 
-    @transaction.atomic
-    def handle(self, *args, **kwargs):
-        self.stdout.write("[INFO] Clearing current stock levels...")
-        Stock.objects.all().delete()
+def _parse_since(value):
+    """'last' => started_at del último checkpoint; si no, fecha o fecha-hora ISO."""
+    if value is None:
+        return None
+    if value == "last":
+        last = StockRecalculation.objects.order_by("-started_at").first()
+        return last.started_at if last else None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        parsed_date = parse_date(value)
+        if parsed_date is None:
+            raise CommandError(f"--since inválido: '{value}'. Use 'last', YYYY-MM-DD o fecha-hora ISO.")
+        parsed = datetime.combine(parsed_date, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _touched_pairs(since):
+    """
+    Pares (product_id, warehouse_id) con actividad desde `since`.
+
+    Stock.updated_at cubre lo que no deja rastro en las otras tablas: líneas o
+    movimientos borrados y ediciones de documentos con fecha anterior a `since`
+    (todos pasan por Stock.objects.add_quantities).
+    """
+    pairs = set(
+        Stock.objects
+        .filter(updated_at__gte=since)
+        .values_list("product_id", "warehouse_id")
+    )
+    pairs.update(
+        InventoryMovement.objects
+        .filter(timestamp__gte=since)
+        .values_list("product_id", "warehouse_id")
+        .distinct()
+    )
+    pairs.update(
+        DocumentLine.objects
+        .filter(document__date__gte=since.date(), warehouse__isnull=False)
+        .values_list("product_id", "warehouse_id")
+        .distinct()
+    )
+    return pairs
 
-        self.stdout.write("[INFO] Recalculating stock from document lines...")
-        count = 0
 
-        lines = DocumentLine.objects.select_related(
-            'document', 'product', 'unit', 'warehouse', 'document__document_type'
+def compute_stock_totals(pairs=None):
+    """
+    Stock esperado por (product_id, warehouse_id) calculado con un único
+    GROUP BY sobre las líneas de documentos activos. La conversión a la unidad
+    de referencia se hace en SQL (reference_quantity_expression).
+    """
+    lines = (
+        DocumentLine.objects
+        .filter(document__is_active=True, warehouse__isnull=False)
+        .exclude(document__document_type__stock_movement=0)
+    )
+    if pairs is not None:
+        lines = lines.filter(
+            product_id__in={product_id for product_id, _ in pairs},
+            warehouse_id__in={warehouse_id for _, warehouse_id in pairs},
         )
 
-        for line in lines:
-            stock_movement = line.document.document_type.stock_movement
-            if not stock_movement:
-                continue  # Neutral document type, skip
+    signed_quantity = ExpressionWrapper(
+        reference_quantity_expression() * F("document__document_type__stock_movement"),
+        output_field=DecimalField(max_digits=20, decimal_places=4),
+    )
+    rows = (
+        lines
+        .order_by()
+        .values("product_id", "warehouse_id")
+        .annotate(total=Sum(signed_quantity))
+        .values_list("product_id", "warehouse_id", "total")
+    )
 
-            warehouse = line.warehouse or line.document.warehouse
-            if not warehouse:
-                continue  # No warehouse defined
+    totals = {(product_id, warehouse_id): total for product_id, warehouse_id, total in rows}
+    if pairs is not None:
+        totals = {key: total for key, total in totals.items() if key in pairs}
+    return totals
+
+
+def recalculate_stock(since=None):
+    """
+    Recalcula el stock del schema actual y registra un checkpoint.
+
+    Sin `since` reconstruye todos los pares; con `since` sólo los pares con
+    actividad desde esa fecha. Los pares sin líneas quedan en 0.
+    El cálculo y el upsert corren en la misma transacción con la tabla de
+    stock bloqueada (lock_for_recalculation): un posteo que confirma mientras
+    tanto espera y suma su delta sobre el total ya recalculado, en vez de
+    perderse al sobrescribirlo.
+    """
+    started_at = timezone.now()
+    with transaction.atomic():
+        Stock.objects.lock_for_recalculation()
+        pairs = _touched_pairs(since) if since else None
+        totals = compute_stock_totals(pairs)
+
+        if pairs is None:
+            stale = Stock.objects.values_list("product_id", "warehouse_id")
+        else:
+            stale = pairs
+        for key in stale:
+            totals.setdefault(key, 0)
+
+        Stock.objects.set_quantities(totals)
+        return StockRecalculation.objects.create(
+            mode="incremental" if since else "full",
+            since=since,
+            started_at=started_at,
+            pairs_updated=len(totals),
+        )
 
-            converted_qty = convert_to_reference_unit(line.product, line.unit, line.quantity)
 
-            stock, created = Stock.objects.get_or_create(
-                product=line.product,
-                warehouse=warehouse,
-                defaults={'quantity': 0}
-            )
-            stock.quantity += converted_qty * stock_movement
-            stock.save()
-            count += 1
+def _recalculate_schema(schema_name, since_value):
+    """Punto de entrada de cada proceso del pool (un schema por tarea)."""
+    try:
+        with schema_context(schema_name):
+            run = recalculate_stock(_parse_since(since_value))
+            return schema_name, run.mode, run.pairs_updated
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Recalculate stock levels for all products and warehouses based on document lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since",
+            help="Reconciliación incremental: 'last' (último checkpoint), YYYY-MM-DD o fecha-hora ISO.",
+        )
+        parser.add_argument(
+            "--all-tenants",
+            action="store_true",
+            help="Recalcular todos los schemas de tenants activos en un pool de procesos.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=multiprocessing.cpu_count(),
+            help="Procesos del pool con --all-tenants (default: número de CPUs).",
+        )
+
+    def handle(self, *args, **options):
+        since_value = options.get("since")
+
+        if not options.get("all_tenants"):
+            since = _parse_since(since_value)
+            mode = f"incremental since {since:%Y-%m-%d %H:%M}" if since else "full rebuild"
+            self.stdout.write(f"[INFO] Recalculating stock ({mode})...")
+            run = recalculate_stock(since)
+            self.stdout.write(self.style.SUCCESS(
+                f"[SUCCESS] Stock successfully recalculated for {run.pairs_updated} product/warehouse pairs."
+            ))
+            return
+
+        schemas = list(
+            get_tenant_model().objects
+            .filter(is_active=True)
+            .exclude(schema_name=get_public_schema_name())
+            .values_list("schema_name", flat=True)
+        )
+        workers = max(1, min(options["workers"], len(schemas) or 1))
+        self.stdout.write(f"[INFO] Recalculating stock for {len(schemas)} tenant(s) with {workers} worker(s)...")
 
-            self.stdout.write(
-                f"[INFO] Product: {line.product.name} | Warehouse: {warehouse.name} | type: { stock_movement } | Qty: {converted_qty:.2f} -> Total: {stock.quantity:.2f}"
-            )
+        # Los procesos hijos no deben heredar conexiones abiertas del padre
+        connections.close_all()
+        failures = 0
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork")) as pool:
+            futures = {pool.submit(_recalculate_schema, schema, since_value): schema for schema in schemas}
+            for done, future in enumerate(as_completed(futures), start=1):
+                schema = futures[future]
+                try:
+                    _, mode, pairs_updated = future.result()
+                    self.stdout.write(f"[{done}/{len(schemas)}] {schema}: {mode}, {pairs_updated} pairs")
+                except Exception as e:
+                    failures += 1
+                    self.stdout.write(self.style.ERROR(f"[{done}/{len(schemas)}] {schema}: {e}"))
 
-        self.stdout.write(self.style.SUCCESS(f"[SUCCESS] Stock successfully recalculated from {count} document lines."))
+        if failures:
+            raise CommandError(f"Stock recalculation failed for {failures} tenant(s).")
+        self.stdout.write(self.style.SUCCESS(f"[SUCCESS] Stock recalculated for {len(schemas)} tenant(s)."))
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.3 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appinventory', '0004_alter_productimage_assignment_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockRecalculation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mode', models.CharField(choices=[('full', 'Full rebuild'), ('incremental', 'Incremental')], max_length=20)),
+                ('since', models.DateTimeField(blank=True, null=True)),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField(auto_now_add=True)),
+                ('pairs_updated', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+    ]
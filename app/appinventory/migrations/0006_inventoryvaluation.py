@@ -0,0 +1,43 @@
+# Generated by Django 5.0.3 on 2026-10-18 11:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+POPULATE_SQL = """
+    INSERT INTO appinventory_inventoryvaluation (product_id, warehouse_id, quantity, default_price, value)
+    SELECT s.product_id, s.warehouse_id, s.quantity, dp.price,
+           ROUND(s.quantity * COALESCE(dp.price, 0), 2)
+    FROM appinventory_stock s
+    LEFT JOIN LATERAL (
+        SELECT pp.price FROM appinventory_productprice pp
+        WHERE pp.product_id = s.product_id AND pp.is_default AND pp.is_active
+        ORDER BY pp.id
+        LIMIT 1
+    ) dp ON TRUE
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appinventory', '0005_stockrecalculation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryValuation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('default_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('value', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='appinventory.product')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='appinventory.warehouse')),
+            ],
+            options={
+                'unique_together': {('product', 'warehouse')},
+            },
+        ),
+        migrations.RunSQL(POPULATE_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-18 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appinventory', '0006_inventoryvaluation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stock',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, blank=True, db_index=True, null=True),
+        ),
+    ]
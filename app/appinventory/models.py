@@ -1,8 +1,9 @@
 from decimal import Decimal
-from django.db import models
+from django.db import connection, models
 from django.conf import settings
 from django.core.exceptions import ValidationError
-from appinventory.helpers import convert_to_reference_unit
+from appinventory.conversions import to_reference_quantity
+from utils.tenant_cache import bump_version_on_commit
 
 # Categorías de Unidades de Medida (Longitud, Peso, Volumen...)
 class UnitCategory(models.Model):
@@ -175,10 +176,218 @@ class ProductPrice(models.Model):
         return f"{self.product} | {self.price_type} | {self.unit} → ${self.price}"
     
 
+class StockManager(models.Manager):
+    UPSERT_BATCH_SIZE = 1000
+
+    def add_quantities(self, deltas):
+        """
+        Suma atómicamente cantidades (en unidad de referencia) al stock.
+
+        `deltas` es un dict {(product_id, warehouse_id): Decimal}. Se resuelve en
+        un único INSERT ... ON CONFLICT DO UPDATE, así que no hay lectura previa
+        ni SELECT FOR UPDATE: PostgreSQL serializa los escritores concurrentes
+        sobre el índice único (product, warehouse) y ninguna suma se pierde.
+        """
+        self._upsert({key: delta for key, delta in deltas.items() if delta}, accumulate=True)
+
+    def set_quantities(self, totals):
+        """
+        Fija el stock de cada (product_id, warehouse_id) al valor indicado con un
+        único upsert (usado por recalculate_stock). No toca updated_at: un
+        recálculo no es actividad para el siguiente `--since last`.
+        """
+        self._upsert(totals, accumulate=False)
+
+    def lock_for_recalculation(self):
+        """
+        LOCK TABLE ... IN EXCLUSIVE MODE hasta el fin de la transacción.
+
+        Espera a que terminen los posteos en curso (add_quantities, lock_available)
+        y bloquea los nuevos, así el GROUP BY de recalculate_stock ve todas las
+        líneas ya confirmadas y ningún delta se escribe entre el cálculo y el
+        upsert. Las lecturas simples de Stock no se bloquean.
+        """
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {table} IN EXCLUSIVE MODE")
+
+    def lock_available(self, pairs):
+        """
+        Devuelve {(product_id, warehouse_id): quantity} para los pares pedidos,
+        bloqueando esas filas (SELECT ... FOR UPDATE) hasta el fin de la
+        transacción. Los pares sin fila de stock no aparecen en el resultado.
+        """
+        pairs = set(pairs)
+        if not pairs:
+            return {}
+        rows = (
+            self.select_for_update()
+            .filter(
+                product_id__in={product_id for product_id, _ in pairs},
+                warehouse_id__in={warehouse_id for _, warehouse_id in pairs},
+            )
+            .order_by('product_id', 'warehouse_id')
+            .values_list('product_id', 'warehouse_id', 'quantity')
+        )
+        return {
+            (product_id, warehouse_id): quantity
+            for product_id, warehouse_id, quantity in rows
+            if (product_id, warehouse_id) in pairs
+        }
+
+    def _upsert(self, quantities, accumulate):
+        # Las filas se envían ordenadas para que dos upserts multi-fila bloqueen
+        # en el mismo orden y no se produzcan deadlocks.
+        rows = sorted(quantities.items())
+        if not rows:
+            return
+
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        if accumulate:
+            # clock_timestamp() y no NOW(): la hora de la escritura, no la del
+            # inicio de la transacción, para que `--since last` no la salte
+            touched = "clock_timestamp()"
+            updates = f"quantity = {table}.quantity + EXCLUDED.quantity, updated_at = EXCLUDED.updated_at"
+        else:
+            touched = "NULL"
+            updates = "quantity = EXCLUDED.quantity"
+
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), self.UPSERT_BATCH_SIZE):
+                batch = rows[start:start + self.UPSERT_BATCH_SIZE]
+                params = []
+                for (product_id, warehouse_id), quantity in batch:
+                    params.extend([product_id, warehouse_id, quantity])
+                cursor.execute(f"""
+                    INSERT INTO {table} (product_id, warehouse_id, quantity, updated_at)
+                    VALUES {", ".join([f"(%s, %s, %s, {touched})"] * len(batch))}
+                    ON CONFLICT (product_id, warehouse_id)
+                    DO UPDATE SET {updates}
+                """, params)
+                InventoryValuation.objects.refresh(pairs=[key for key, _ in batch])
+
+        # El SQL directo no dispara post_save de Stock: invalidar la analítica aquí
+        bump_version_on_commit("inventory_analytics")
+
+
+class InventoryValuationManager(models.Manager):
+    def refresh(self, pairs=None, product_ids=None):
+        """
+        Recalcula las filas de valuación a partir de Stock y del precio por
+        defecto activo de cada producto, con un único INSERT ... SELECT ...
+        ON CONFLICT DO UPDATE.
+
+        - `pairs`: sólo esos (product_id, warehouse_id) (tras mover stock).
+        - `product_ids`: todas las filas de esos productos (tras cambiar precios).
+        - Sin argumentos: reconstrucción completa (y limpieza de huérfanos).
+        """
+        qn = connection.ops.quote_name
+        table = qn(self.model._meta.db_table)
+        stock_table = qn(Stock._meta.db_table)
+        price_table = qn(ProductPrice._meta.db_table)
+
+        params = []
+        if pairs is not None:
+            pairs = list(pairs)
+            if not pairs:
+                return
+            condition = f"(s.product_id, s.warehouse_id) IN ({', '.join(['(%s, %s)'] * len(pairs))})"
+            for product_id, warehouse_id in pairs:
+                params.extend([product_id, warehouse_id])
+        elif product_ids is not None:
+            product_ids = list(product_ids)
+            if not product_ids:
+                return
+            condition = "s.product_id = ANY(%s)"
+            params.append(product_ids)
+        else:
+            condition = "TRUE"
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {table} (product_id, warehouse_id, quantity, default_price, value)
+                SELECT s.product_id, s.warehouse_id, s.quantity, dp.price,
+                       ROUND(s.quantity * COALESCE(dp.price, 0), 2)
+                FROM {stock_table} s
+                LEFT JOIN LATERAL (
+                    SELECT pp.price FROM {price_table} pp
+                    WHERE pp.product_id = s.product_id AND pp.is_default AND pp.is_active
+                    ORDER BY pp.id
+                    LIMIT 1
+                ) dp ON TRUE
+                WHERE {condition}
+                ON CONFLICT (product_id, warehouse_id) DO UPDATE SET
+                    quantity = EXCLUDED.quantity,
+                    default_price = EXCLUDED.default_price,
+                    value = EXCLUDED.value
+            """, params)
+            if pairs is None and product_ids is None:
+                cursor.execute(f"""
+                    DELETE FROM {table} v
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM {stock_table} s
+                        WHERE s.product_id = v.product_id AND s.warehouse_id = v.warehouse_id
+                    )
+                """)
+
+    def total_value(self):
+        return self.aggregate(total=models.Sum('value'))['total'] or Decimal('0')
+
+
+class InventoryValuation(models.Model):
+    """
+    Valuación materializada del inventario: una fila por (producto, almacén)
+    con la cantidad en stock, el precio por defecto activo y su valor.
+    Se mantiene al mover stock (StockManager) y al cambiar precios (señales),
+    así el dashboard lee el total sin recorrer Stock ni consultar precios.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='+')
+    quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    default_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    objects = InventoryValuationManager()
+
+    class Meta:
+        unique_together = ("product", "warehouse")
+
+    def __str__(self):
+        return f"{self.product} | {self.warehouse} | {self.quantity} → ${self.value}"
+
+
+class StockRecalculation(models.Model):
+    """
+    Registro (checkpoint) de cada ejecución de recalculate_stock en el tenant.
+    `--since last` reanuda desde el started_at de la última ejecución, completa
+    o incremental: cada una deja al día todo lo escrito antes de su started_at.
+    """
+    MODE_CHOICES = [
+        ('full', 'Full rebuild'),
+        ('incremental', 'Incremental'),
+    ]
+
+    mode = models.CharField(max_length=20, choices=MODE_CHOICES)
+    since = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(auto_now_add=True)
+    pairs_updated = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"{self.get_mode_display()} @ {self.started_at:%Y-%m-%d %H:%M} ({self.pairs_updated} pares)"
+
+
 class Stock(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE)
     quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    # Último delta de posteo (add_quantities); lo usa `recalculate_stock --since`
+    updated_at = models.DateTimeField(auto_now=True, null=True, blank=True, db_index=True)
+
+    objects = StockManager()
 
     class Meta:
         unique_together = ("product", "warehouse")
@@ -210,8 +419,7 @@ class InventoryMovement(models.Model):
         return f"{self.get_movement_type_display()} - {self.product} ({self.quantity}) en {self.warehouse}"
 
     def get_converted_quantity(self):
-        result = convert_to_reference_unit(self.product, self.unit, self.quantity)
-        return result
+        return to_reference_quantity(self.product_id, self.unit_id, self.quantity)
 
     def save(self, *args, **kwargs):
         """
@@ -232,7 +440,7 @@ class InventoryMovement(models.Model):
         # Calcular cantidad convertida para actualizar el stock
         # ⚠️ NO sobrescribir self.quantity - mantener la cantidad original
         try:
-            converted_qty = self.get_converted_quantity() if self.unit else self.quantity
+            converted_qty = self.get_converted_quantity() if self.unit_id else self.quantity
         except Exception as e:
             print(f"⚠️ Error en conversión, usando cantidad original: {e}")
             converted_qty = self.quantity
@@ -252,40 +460,24 @@ class InventoryMovement(models.Model):
             print(f"❌ ERROR al guardar InventoryMovement: {e}")
             raise
 
-        # Ajustar el stock usando la cantidad convertida
-        stock, _ = Stock.objects.get_or_create(
-            product=self.product, 
-            warehouse=self.warehouse,
-            defaults={'quantity': Decimal('0.00')}
-        )
-        old_qty = stock.quantity
-        
-        # Usar la cantidad convertida para actualizar el stock
-        stock.quantity += converted_qty * self.movement_type
-        stock.save()
+        # Ajustar el stock usando la cantidad convertida (upsert atómico, sin leer el stock)
+        delta = converted_qty * self.movement_type
+        Stock.objects.add_quantities({(self.product_id, self.warehouse_id): delta})
 
-        print(f"📊 Stock actualizado: {old_qty} → {stock.quantity} (producto: {self.product}, almacén: {self.warehouse})")
+        print(f"📊 Stock actualizado: {delta:+} (producto: {self.product}, almacén: {self.warehouse})")
 
     def delete(self, *args, **kwargs):
         """
         Elimina el movimiento de inventario y revierte su efecto en el stock.
         """
-        from .models import Stock
-        
         # Calcular cantidad convertida
         converted_qty = self.get_converted_quantity()
         
-        # Revertir el efecto en el stock
-        stock, _ = Stock.objects.get_or_create(
-            product=self.product, 
-            warehouse=self.warehouse,
-            defaults={'quantity': Decimal('0.00')}
-        )
-        old_qty = stock.quantity
-        stock.quantity -= converted_qty * self.movement_type
-        stock.save()
+        # Revertir el efecto en el stock (upsert atómico, sin leer el stock)
+        delta = -converted_qty * self.movement_type
+        Stock.objects.add_quantities({(self.product_id, self.warehouse_id): delta})
         
-        print(f"🗑️ Movimiento eliminado - Stock revertido: {old_qty} → {stock.quantity} (producto: {self.product})")
+        print(f"🗑️ Movimiento eliminado - Stock revertido: {delta:+} (producto: {self.product})")
         
         # Eliminar el movimiento
         super().delete(*args, **kwargs)
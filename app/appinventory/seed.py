@@ -0,0 +1,133 @@
+"""
+Carga de los datos maestros de inventario (fixtures/masters_inventory.json)
+con COPY en lugar de loaddata.
+
+loaddata guarda objeto por objeto (un INSERT/UPDATE y las señales de cada
+fila, más el .set() de marcas por producto) y después había que resetear la
+secuencia de cada tabla en un bucle. Aquí:
+
+- el fixture se lee con el deserializador de Django (mismos tipos y valores
+  por defecto que loaddata);
+- cada tabla se copia con un COPY ... FROM STDIN a una tabla temporal y se
+  pasa a la real con un solo INSERT ... SELECT ... ON CONFLICT (id) DO UPDATE,
+  igual que loaddata, que sobrescribe filas con el mismo pk;
+- las marcas de cada producto (campo `brands`, through ProductBrandAssignment)
+  se insertan en bloque;
+- las secuencias se ajustan en un solo statement (sequence_reset_sql).
+
+COPY no dispara señales: al final se invalida la tabla de conversión, se
+reconstruye la valuación y se invalida la analítica cacheada una sola vez.
+"""
+
+import csv
+import io
+import os
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core import serializers
+from django.core.management.color import no_style
+from django.db import connection
+from django.utils import timezone
+
+from appinventory.conversions import invalidate_conversion_table
+from appinventory.models import InventoryValuation, ProductBrandAssignment
+from utils.tenant_cache import bump_version_on_commit
+
+MASTER_FIXTURE = os.path.join('appinventory', 'fixtures', 'masters_inventory.json')
+
+
+def master_fixture_path():
+    return os.path.join(settings.BASE_DIR, MASTER_FIXTURE)
+
+
+def _db_value(field, obj, now):
+    value = getattr(obj, field.attname)
+    if value is None and (getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)):
+        value = now
+    return field.get_db_prep_save(value, connection)
+
+
+def _csv_rows(rows):
+    # QUOTE_NONNUMERIC: '' va entre comillas y None queda vacío (NULL en COPY CSV)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+    writer.writerows(rows)
+    buffer.seek(0)
+    return buffer
+
+
+def copy_rows(model, fields, rows, conflict=('id',)):
+    """
+    COPY de `rows` (tuplas en el orden de `fields`) a la tabla de `model`,
+    vía tabla temporal. Devuelve las filas insertadas o actualizadas.
+    """
+    if not rows:
+        return 0
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    staging = qn(f"_seed_{model._meta.db_table}")
+    columns = [qn(field.column) for field in fields]
+    column_list = ', '.join(columns)
+    conflict_list = ', '.join(qn(model._meta.get_field(name).column) for name in conflict)
+    updates = [f"{column} = EXCLUDED.{column}" for column, field in zip(columns, fields) if field.name not in conflict]
+    on_conflict = f"DO UPDATE SET {', '.join(updates)}" if updates and conflict == ('id',) else "DO NOTHING"
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"CREATE TEMP TABLE {staging} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP")
+        cursor.copy_expert(
+            f"COPY {staging} ({column_list}) FROM STDIN WITH (FORMAT csv)",
+            _csv_rows(rows),
+        )
+        cursor.execute(
+            f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {staging} "
+            f"ON CONFLICT ({conflict_list}) {on_conflict}"
+        )
+        count = cursor.rowcount
+        cursor.execute(f"DROP TABLE {staging}")
+    return count
+
+
+def seed_master_inventory(path=None):
+    """
+    Importa el fixture de datos maestros en el schema actual. Debe llamarse
+    dentro de transaction.atomic() (la vista marca el tenant en la misma
+    transacción). Devuelve {tabla: filas}.
+    """
+    path = path or master_fixture_path()
+    now = timezone.now()
+
+    # Modelo -> filas, en el orden del fixture (categorías antes que productos, etc.)
+    objects = OrderedDict()
+    brand_links = []
+    with open(path, 'rb') as fixture:
+        for deserialized in serializers.deserialize('json', fixture, ignorenonexistent=True):
+            obj = deserialized.object
+            objects.setdefault(type(obj), []).append(obj)
+            for brand_id in (deserialized.m2m_data or {}).get('brands', ()):
+                brand_links.append((obj.pk, brand_id))
+
+    counts = {}
+    for model, instances in objects.items():
+        fields = model._meta.concrete_fields
+        rows = [tuple(_db_value(field, obj, now) for field in fields) for obj in instances]
+        counts[model._meta.db_table] = copy_rows(model, fields, rows)
+
+    if brand_links:
+        fields = [ProductBrandAssignment._meta.get_field(name) for name in ('product', 'brand', 'created_at')]
+        rows = [(product_id, brand_id, now) for product_id, brand_id in brand_links]
+        counts[ProductBrandAssignment._meta.db_table] = copy_rows(
+            ProductBrandAssignment, fields, rows, conflict=('product', 'brand')
+        )
+
+    # Secuencias al máximo id de cada tabla, en un solo statement
+    reset_sql = connection.ops.sequence_reset_sql(no_style(), list(objects) + [ProductBrandAssignment])
+    if reset_sql:
+        with connection.cursor() as cursor:
+            cursor.execute('\n'.join(reset_sql))
+
+    # Lo que habrían hecho las señales fila por fila
+    invalidate_conversion_table()
+    InventoryValuation.objects.refresh()
+    bump_version_on_commit("inventory_analytics")
+    return counts
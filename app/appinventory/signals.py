@@ -0,0 +1,63 @@
+"""
+Señales de appinventory.
+
+- Mantienen coherente la tabla de conversión cacheada (appinventory.conversions)
+  cuando cambian las unidades de medida o la unidad por defecto de un producto.
+- Mantienen la valuación materializada (InventoryValuation) cuando cambian
+  precios o se edita o borra Stock directamente.
+- Invalidan la analítica cacheada (utils.tenant_cache) cuando cambia el stock,
+  un producto (nombre, reorder_level, is_active) o un precio.
+"""
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from appinventory.models import InventoryValuation, Product, ProductPrice, Stock, UnitOfMeasure
+from appinventory.conversions import forget_product, invalidate_conversion_table
+from utils.tenant_cache import bump_version_on_commit
+
+
+@receiver(post_save, sender=UnitOfMeasure, dispatch_uid="unit_invalidate_conversion_table")
+@receiver(post_delete, sender=UnitOfMeasure, dispatch_uid="unit_delete_invalidate_conversion_table")
+def invalidate_units(sender, instance, **kwargs):
+    """Un cambio de signo/factor afecta a toda la tabla del tenant."""
+    invalidate_conversion_table()
+
+
+@receiver(post_save, sender=Product, dispatch_uid="product_refresh_default_unit")
+@receiver(post_delete, sender=Product, dispatch_uid="product_delete_refresh_default_unit")
+def refresh_product_unit(sender, instance, **kwargs):
+    """Olvida la unidad por defecto cacheada del producto; se recarga bajo demanda."""
+    forget_product(instance.pk)
+
+
+@receiver(post_save, sender=Product, dispatch_uid="product_invalidate_analytics")
+@receiver(post_delete, sender=Product, dispatch_uid="product_delete_invalidate_analytics")
+def invalidate_product_analytics(sender, instance, **kwargs):
+    """Bajo stock y rankings muestran nombre, reorder_level e is_active del producto."""
+    bump_version_on_commit("inventory_analytics")
+
+
+@receiver(post_save, sender=Stock, dispatch_uid="stock_refresh_valuation")
+def refresh_stock_valuation(sender, instance, **kwargs):
+    """Ediciones directas de Stock (admin); los upserts de StockManager ya refrescan."""
+    InventoryValuation.objects.refresh(pairs=[(instance.product_id, instance.warehouse_id)])
+    bump_version_on_commit("inventory_analytics")
+
+
+@receiver(post_delete, sender=Stock, dispatch_uid="stock_delete_valuation")
+def delete_stock_valuation(sender, instance, **kwargs):
+    """Sin fila de stock no hay valuación: refresh() sólo inserta o actualiza."""
+    InventoryValuation.objects.filter(
+        product_id=instance.product_id, warehouse_id=instance.warehouse_id
+    ).delete()
+    bump_version_on_commit("inventory_analytics")
+
+
+@receiver(post_save, sender=ProductPrice, dispatch_uid="price_refresh_valuation")
+@receiver(post_delete, sender=ProductPrice, dispatch_uid="price_delete_refresh_valuation")
+def refresh_price_valuation(sender, instance, **kwargs):
+    """Un cambio de precio por defecto revalúa todas las filas del producto."""
+    if kwargs.get('raw'):
+        return  # loaddata (seed de datos maestros): el stock aún no existe
+    InventoryValuation.objects.refresh(product_ids=[instance.product_id])
+    bump_version_on_commit("inventory_analytics")
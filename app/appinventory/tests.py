@@ -1,3 +1,78 @@
+import datetime
+import json
+from collections import Counter
+from decimal import Decimal
+
+from django.apps import apps
 from django.test import TestCase
 
-# Create your tests here.
+from appinventory.models import Product, ProductBrandAssignment, ProductPrice
+from appinventory.seed import master_fixture_path, seed_master_inventory
+
+
+class SeedMasterInventoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        with open(master_fixture_path()) as fixture:
+            cls.fixture = json.load(fixture)
+
+    def _expected_brand_links(self):
+        return sum(
+            len(obj['fields'].get('brands', ()))
+            for obj in self.fixture if obj['model'] == 'appinventory.product'
+        )
+
+    def test_copies_every_fixture_row(self):
+        counts = seed_master_inventory()
+
+        for label, expected in Counter(obj['model'] for obj in self.fixture).items():
+            model = apps.get_model(label)
+            self.assertEqual(model.objects.count(), expected, label)
+            self.assertEqual(counts[model._meta.db_table], expected, label)
+        self.assertEqual(ProductBrandAssignment.objects.count(), self._expected_brand_links())
+
+    def test_keeps_booleans_nulls_and_decimals(self):
+        seed_master_inventory()
+
+        price = ProductPrice.objects.get(pk=2321)
+        self.assertEqual(price.price, Decimal('0.65'))
+        self.assertIs(price.is_default, True)
+        self.assertIs(price.is_sale, True)
+        self.assertIs(price.is_purchase, False)
+        self.assertEqual(price.valid_from, datetime.date(2025, 9, 23))
+        self.assertEqual(price.valid_until, datetime.date(2025, 10, 30))
+
+        price = ProductPrice.objects.get(pk=1)
+        self.assertIsNone(price.valid_until)
+        self.assertIs(price.is_sale, False)
+        self.assertIs(price.is_purchase, True)
+        self.assertIsNone(ProductPrice.objects.get(pk=2074).valid_from)
+
+        product = Product.objects.get(pk=1)
+        self.assertEqual(product.name, '#1 THHN Stranded Black')
+        self.assertEqual(product.sku, '000000')
+        self.assertEqual(product.reorder_level, Decimal('1.00'))
+        self.assertEqual(product.category_id, 9)
+        self.assertEqual(product.unit_default_id, 17)
+        self.assertEqual(product.created_at, datetime.datetime(2025, 9, 22, 20, 22, 17, tzinfo=datetime.timezone.utc))
+
+    def test_links_brands_through_assignment(self):
+        seed_master_inventory()
+
+        self.assertEqual(
+            sorted(Product.objects.get(pk=33).brands.values_list('pk', flat=True)), [20, 57]
+        )
+        self.assertEqual(list(Product.objects.get(pk=1).brands.values_list('pk', flat=True)), [60])
+
+    def test_is_idempotent_and_resets_sequences(self):
+        seed_master_inventory()
+        Product.objects.filter(pk=1).update(name='Edited')
+
+        seed_master_inventory()
+
+        # Como loaddata: el fixture sobrescribe la fila con el mismo pk
+        self.assertEqual(Product.objects.get(pk=1).name, '#1 THHN Stranded Black')
+        self.assertEqual(ProductBrandAssignment.objects.count(), self._expected_brand_links())
+        max_pk = max(obj['pk'] for obj in self.fixture if obj['model'] == 'appinventory.product')
+        product = Product.objects.create(name='New product', sku='NEW-1')
+        self.assertGreater(product.pk, max_pk)
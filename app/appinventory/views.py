@@ -2,10 +2,10 @@
 from django.views.generic import TemplateView
 from django.db import models, transaction
 from django.db.models import F, Sum, OuterRef, Subquery, Count, Max, Q
+from django.db.models.functions import Cast
 from django.db.models.deletion import ProtectedError
 from django.db import IntegrityError
 from django.http import HttpResponse
-from django.core.management import call_command
 from django_tenants.utils import get_tenant
 import json
 import os
@@ -26,10 +26,17 @@ from rest_framework.permissions import (
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
 from utils.datatable import handle_datatable_query
+from utils.tenant_cache import cached_response
+from utils.xlsx_export import ExportSheet, xlsx_response, EXPORT_CHUNK_SIZE
+from appinventory.analytics import (
+    ranked_aggregate, period_start, ranking_limit,
+    SALES_LINE_METRICS, DOCUMENT_PARTY_METRICS,
+    )
 # App Models
 from appinventory.models import (
     Product, Stock, Warehouse, ProductCategory,
-    ProductBrand, UnitOfMeasure, UnitCategory, PriceType, InventoryMovement, ProductImage
+    ProductBrand, UnitOfMeasure, UnitCategory, PriceType, InventoryMovement, ProductImage,
+    InventoryValuation, ProductPrice
     )
 from apptransactions.models import Document, DocumentLine, DocumentType
 # Serializers
@@ -671,12 +678,8 @@ class InventoryDashboardMetricsAPIView(APIView):
             total_warehouses = Warehouse.objects.filter(is_active=True).count()
             total_stock_units = Stock.objects.aggregate(total=Sum('quantity'))['total'] or 0
             
-            # Calcular valor total del inventario
-            total_inventory_value = 0
-            for stock in Stock.objects.select_related('product').all():
-                default_price = stock.product.prices.filter(is_default=True, is_active=True).first()
-                if default_price:
-                    total_inventory_value += float(stock.quantity) * float(default_price.price)
+            # Valor total del inventario (valuación materializada, ver InventoryValuation)
+            total_inventory_value = float(InventoryValuation.objects.total_value())
             
             # Productos con stock bajo
             low_stock_count = Product.objects.filter(is_active=True).annotate(
@@ -717,49 +720,46 @@ class InventoryDashboardMetricsAPIView(APIView):
             return Response({'error': str(e)}, status=500)
 
 
+def _sales_lines(start_date):
+    """Líneas de documentos de venta activos desde `start_date`."""
+    return DocumentLine.objects.filter(
+        document__document_type__is_sales=True,
+        document__date__gte=start_date,
+        document__is_active=True
+    )
+
+
+def _top_selling_products(start_date, limit):
+    rows = ranked_aggregate(
+        _sales_lines(start_date), "product", SALES_LINE_METRICS, "-total_value", limit
+    )
+    for row in rows:
+        row['quantity_sold'] = row['quantity_sold'] or 0
+        row['total_value'] = float(row['total_value'] or 0)
+    return rows
+
+
+def _top_builders(documents, limit):
+    rows = ranked_aggregate(
+        documents, "builder", DOCUMENT_PARTY_METRICS, "-total_purchases", limit
+    )
+    for row in rows:
+        row['total_purchases'] = float(row['total_purchases'] or 0)
+    return rows
+
+
 class TopSellingProductsAPIView(APIView):
     """
-    Top 25 productos más vendidos por período
+    Top productos más vendidos por período (?period_days=30&limit=25)
     """
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
 
+    @cached_response("inventory_analytics")
     def get(self, request):
         try:
-            period_days = int(request.query_params.get('period_days', 30))
-            from datetime import datetime, timedelta
-            start_date = datetime.now() - timedelta(days=period_days)
-            
-            # Agregación de ventas por producto
-            top_products = DocumentLine.objects.filter(
-                document__document_type__is_sales=True,
-                document__date__gte=start_date.date(),
-                document__is_active=True
-            ).values('product').annotate(
-                quantity_sold=Sum('quantity'),
-                total_value=Sum('final_price'),
-                transaction_count=Count('document', distinct=True),
-                last_sale_date=Max('document__date')
-            ).order_by('-total_value')[:25]
-            
-            # Enriquecer con datos del producto
-            result = []
-            for item in top_products:
-                product = Product.objects.select_related('category').get(id=item['product'])
-                result.append({
-                    'id': product.id,
-                    'name': product.name,
-                    'sku': product.sku,
-                    'category': {
-                        'id': product.category.id if product.category else None,
-                        'name': product.category.name if product.category else None
-                    },
-                    'quantity_sold': item['quantity_sold'] or 0,
-                    'total_value': float(item['total_value'] or 0),
-                    'transaction_count': item['transaction_count'] or 0,
-                    'last_sale_date': item['last_sale_date']
-                })
-            
+            _, start_date = period_start(request, 30)
+            result = _top_selling_products(start_date, ranking_limit(request, 25))
             return Response(result)
             
         except Exception as e:
@@ -773,48 +773,17 @@ class SalesAnalysisAPIView(APIView):
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
 
+    @cached_response("inventory_analytics")
     def get(self, request):
         try:
-            period_days = int(request.query_params.get('period_days', 30))
-            from datetime import datetime, timedelta
-            start_date = datetime.now() - timedelta(days=period_days)
+            from datetime import timedelta
+            period_days, start_date = period_start(request, 30)
             
             # Top productos más vendidos
-            top_products = DocumentLine.objects.filter(
-                document__document_type__is_sales=True,
-                document__date__gte=start_date.date(),
-                document__is_active=True
-            ).values('product').annotate(
-                quantity_sold=Sum('quantity'),
-                total_value=Sum('final_price'),
-                transaction_count=Count('document', distinct=True),
-                last_sale_date=Max('document__date')
-            ).order_by('-total_value')[:25]
-            
-            # Enriquecer con datos del producto
-            top_products_list = []
-            for item in top_products:
-                product = Product.objects.select_related('category').get(id=item['product'])
-                top_products_list.append({
-                    'id': product.id,
-                    'name': product.name,
-                    'sku': product.sku,
-                    'category': {
-                        'id': product.category.id if product.category else None,
-                        'name': product.category.name if product.category else None
-                    },
-                    'quantity_sold': item['quantity_sold'] or 0,
-                    'total_value': float(item['total_value'] or 0),
-                    'transaction_count': item['transaction_count'] or 0,
-                    'last_sale_date': item['last_sale_date']
-                })
+            top_products_list = _top_selling_products(start_date, ranking_limit(request, 25))
             
             # Métricas de ventas
-            total_sales = DocumentLine.objects.filter(
-                document__document_type__is_sales=True,
-                document__date__gte=start_date.date(),
-                document__is_active=True
-            ).aggregate(
+            total_sales = _sales_lines(start_date).aggregate(
                 total_sales=Sum('final_price'),
                 total_quantity=Sum('quantity'),
                 transaction_count=Count('document', distinct=True)
@@ -824,8 +793,8 @@ class SalesAnalysisAPIView(APIView):
             previous_start = start_date - timedelta(days=period_days)
             previous_sales = DocumentLine.objects.filter(
                 document__document_type__is_sales=True,
-                document__date__gte=previous_start.date(),
-                document__date__lt=start_date.date(),
+                document__date__gte=previous_start,
+                document__date__lt=start_date,
                 document__is_active=True
             ).aggregate(total_sales=Sum('final_price'))['total_sales'] or 0
             
@@ -858,6 +827,7 @@ class LowStockProductsAPIView(APIView):
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
 
+    @cached_response("inventory_analytics")
     def get(self, request):
         try:
             # Productos con stock bajo (por debajo del reorder_level)
@@ -911,6 +881,7 @@ class LowestStockProductsAPIView(APIView):
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
 
+    @cached_response("inventory_analytics")
     def get(self, request):
         try:
             # Top 25 productos con menor stock
@@ -960,46 +931,19 @@ class LowestStockProductsAPIView(APIView):
 
 class TopCustomersAPIView(APIView):
     """
-    Top 10 clientes por volumen de compras
+    Top clientes por volumen de compras (?period_days=90&limit=10)
     """
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
 
+    @cached_response("inventory_analytics")
     def get(self, request):
         try:
-            period_days = int(request.query_params.get('period_days', 90))
-            from datetime import datetime, timedelta
-            start_date = datetime.now() - timedelta(days=period_days)
-            
-            # Agregación de ventas por cliente (builder)
-            top_customers = Document.objects.filter(
-                document_type__is_sales=True,
-                date__gte=start_date.date(),
-                is_active=True,
-                builder__isnull=False
-            ).values('builder').annotate(
-                total_purchases=Sum('total_amount'),
-                transaction_count=Count('id'),
-                last_purchase=Max('date')
-            ).order_by('-total_purchases')[:10]
-            
-            # Enriquecer con datos del builder
-            result = []
-            for item in top_customers:
-                from ctrctsapp.models import Builder
-                builder = Builder.objects.select_related('party').get(id=item['builder'])
-                result.append({
-                    'id': builder.id,
-                    'name': builder.name,
-                    'party': {
-                        'id': builder.party.id if builder.party else None,
-                        'name': builder.party.name if builder.party else None,
-                        'rfc': builder.party.rfc if builder.party else None
-                    },
-                    'total_purchases': float(item['total_purchases'] or 0),
-                    'transaction_count': item['transaction_count'] or 0,
-                    'last_purchase': item['last_purchase']
-                })
+            _, start_date = period_start(request, 90)
+            result = _top_builders(
+                Document.objects.filter(document_type__is_sales=True, date__gte=start_date, is_active=True),
+                ranking_limit(request, 10),
+            )
             
             return Response({
                 'topCustomers': result,
@@ -1016,46 +960,19 @@ class TopCustomersAPIView(APIView):
 
 class TopSuppliersAPIView(APIView):
     """
-    Top 10 proveedores por volumen de compras
+    Top proveedores por volumen de compras (?period_days=90&limit=10)
     """
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
 
+    @cached_response("inventory_analytics")
     def get(self, request):
         try:
-            period_days = int(request.query_params.get('period_days', 90))
-            from datetime import datetime, timedelta
-            start_date = datetime.now() - timedelta(days=period_days)
-            
-            # Agregación de compras por proveedor (builder)
-            top_suppliers = Document.objects.filter(
-                document_type__is_purchase=True,
-                date__gte=start_date.date(),
-                is_active=True,
-                builder__isnull=False
-            ).values('builder').annotate(
-                total_purchases=Sum('total_amount'),
-                transaction_count=Count('id'),
-                last_purchase=Max('date')
-            ).order_by('-total_purchases')[:10]
-            
-            # Enriquecer con datos del builder
-            result = []
-            for item in top_suppliers:
-                from ctrctsapp.models import Builder
-                builder = Builder.objects.select_related('party').get(id=item['builder'])
-                result.append({
-                    'id': builder.id,
-                    'name': builder.name,
-                    'party': {
-                        'id': builder.party.id if builder.party else None,
-                        'name': builder.party.name if builder.party else None,
-                        'rfc': builder.party.rfc if builder.party else None
-                    },
-                    'total_purchases': float(item['total_purchases'] or 0),
-                    'transaction_count': item['transaction_count'] or 0,
-                    'last_purchase': item['last_purchase']
-                })
+            _, start_date = period_start(request, 90)
+            result = _top_builders(
+                Document.objects.filter(document_type__is_purchase=True, date__gte=start_date, is_active=True),
+                ranking_limit(request, 10),
+            )
             
             return Response({
                 'topSuppliers': result,
@@ -1077,6 +994,7 @@ class CustomersSuppliersComparisonAPIView(APIView):
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
 
+    @cached_response("inventory_analytics")
     def get(self, request):
         try:
             from datetime import datetime, timedelta
@@ -1229,6 +1147,28 @@ class ProductMovementsReportAPIView(APIView):
             return Response({'error': str(e)}, status=500)
 
 
+def _with_export_product_data(queryset, product_ref='pk'):
+    """
+    Anota precio por defecto y marca por defecto del producto con subconsultas,
+    en lugar de product.prices.filter(...).first() y get_default_brand() por fila.
+    Mismo criterio que esos métodos: el primero por id (la marca default primero).
+    """
+    return queryset.annotate(
+        export_default_price=Subquery(
+            ProductPrice.objects.filter(product=OuterRef(product_ref), is_default=True, is_active=True)
+            .order_by('id').values('price')[:1]
+        ),
+        export_brand_name=Subquery(
+            ProductBrand.objects.filter(products=OuterRef(product_ref))
+            .order_by('-is_default', 'id').values('name')[:1]
+        ),
+    )
+
+
+def _stock_value(quantity, default_price):
+    return float(quantity or 0) * float(default_price) if default_price is not None else 0.0
+
+
 class ProductMovementsExportAPIView(APIView):
     """
     Export product movements report to Excel
@@ -1240,109 +1180,74 @@ class ProductMovementsExportAPIView(APIView):
         try:
             from datetime import datetime, timedelta
             from django.utils import timezone
-            import openpyxl
-            from openpyxl.styles import Font, PatternFill, Alignment
-            from django.http import HttpResponse
-            
+
             # Get filters
             start_date = request.query_params.get('start_date')
             end_date = request.query_params.get('end_date')
             document_type = request.query_params.get('document_type')
             warehouse_id = request.query_params.get('warehouse_id')
-            
+
             # Default dates (last 30 days)
             if not start_date:
                 start_date = (timezone.now() - timedelta(days=30)).date()
             else:
                 start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-                
+
             if not end_date:
                 end_date = timezone.now().date()
             else:
                 end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-            
+
             # Convert dates to datetime to include the entire day
             # Use a simpler and more direct approach
             start_datetime = datetime.combine(start_date, datetime.min.time())
             end_datetime = datetime.combine(end_date, datetime.max.time())
-            
+
             # Base query with precise datetime filter
             movements = InventoryMovement.objects.filter(
                 timestamp__gte=start_datetime,
                 timestamp__lte=end_datetime
             ).select_related('product', 'warehouse', 'created_by')
-            
+
             # Apply additional filters
             if document_type:
-                # Buscar los IDs de documentos que correspondan al tipo de documento seleccionado
-                from apptransactions.models import DocumentType, Document
-                try:
-                    doc_type_obj = DocumentType.objects.get(id=document_type)
-                    
-                    # Obtener todos los documentos de este tipo
+                # Filtrar por los documentos del tipo seleccionado (subconsulta, sin cargar los ids)
+                if DocumentType.objects.filter(id=document_type).exists():
                     document_ids = Document.objects.filter(
                         document_type_id=document_type,
                         is_active=True
-                    ).values_list('id', flat=True)
-                    
-                    # Filtrar movimientos por IDs de documentos
-                    movements = movements.filter(document__in=[str(doc_id) for doc_id in document_ids])
-                except DocumentType.DoesNotExist:
-                    pass  # Si no existe el tipo de documento, no aplicar filtro
+                    ).annotate(id_text=Cast('id', models.CharField())).values('id_text')
+                    movements = movements.filter(document__in=document_ids)
             if warehouse_id:
                 movements = movements.filter(warehouse_id=warehouse_id)
-            
+
             # Order by most recent
             movements = movements.order_by('-timestamp')
-            
-            # Create Excel workbook
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "Product Movements Report"
-            
-            # Headers
-            headers = ['Date', 'Time', 'Type', 'Product Name', 'SKU', 'Quantity', 'Warehouse', 'Document', 'User', 'Reason']
-            for col, header in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col, value=header)
-                cell.font = Font(bold=True)
-                cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-                cell.alignment = Alignment(horizontal="center")
-            
-            # Data
-            for row, movement in enumerate(movements, 2):
-                ws.cell(row=row, column=1, value=movement.timestamp.date())
-                ws.cell(row=row, column=2, value=movement.timestamp.time())
-                ws.cell(row=row, column=3, value=movement.get_movement_type_display())
-                ws.cell(row=row, column=4, value=movement.product.name)
-                ws.cell(row=row, column=5, value=movement.product.sku)
-                ws.cell(row=row, column=6, value=float(movement.quantity))
-                ws.cell(row=row, column=7, value=movement.warehouse.name)
-                ws.cell(row=row, column=8, value=movement.document or 'N/A')
-                ws.cell(row=row, column=9, value=movement.created_by.username if movement.created_by else 'System')
-                ws.cell(row=row, column=10, value=movement.reason or '')
-            
-            # Auto-adjust column widths
-            for column in ws.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                ws.column_dimensions[column_letter].width = adjusted_width
-            
-            # Create response
-            response = HttpResponse(
-                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+            rows = (
+                [
+                    movement.timestamp.date(),
+                    movement.timestamp.time(),
+                    movement.get_movement_type_display(),
+                    movement.product.name,
+                    movement.product.sku,
+                    float(movement.quantity),
+                    movement.warehouse.name,
+                    movement.document or 'N/A',
+                    movement.created_by.username if movement.created_by else 'System',
+                    movement.reason or '',
+                ]
+                for movement in movements.iterator(chunk_size=EXPORT_CHUNK_SIZE)
             )
-            response['Content-Disposition'] = f'attachment; filename="product_movements_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx"'
-            
-            wb.save(response)
-            return response
-            
+            sheet = ExportSheet(
+                "Product Movements Report",
+                ['Date', 'Time', 'Type', 'Product Name', 'SKU', 'Quantity', 'Warehouse', 'Document', 'User', 'Reason'],
+                rows,
+            )
+            return xlsx_response(
+                [sheet], f'product_movements_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
+            )
+
         except Exception as e:
             return Response({'error': str(e)}, status=500)
 
@@ -1359,13 +1264,10 @@ class SalesByProductExportAPIView(APIView):
     def get(self, request):
         try:
             from datetime import datetime, timedelta
-            import openpyxl
-            from openpyxl.styles import Font, PatternFill, Alignment
-            from django.http import HttpResponse
-            
+
             period_days = int(request.query_params.get('period_days', 30))
             start_date = datetime.now() - timedelta(days=period_days)
-            
+
             # Get sales data by product
             sales_data = DocumentLine.objects.filter(
                 document__document_type__is_sales=True,
@@ -1378,50 +1280,24 @@ class SalesByProductExportAPIView(APIView):
                 total_value=Sum('final_price'),
                 transaction_count=Count('document', distinct=True)
             ).order_by('-total_value')
-            
-            # Create Excel workbook
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "Sales by Product"
-            
-            # Headers
-            headers = ['Product Name', 'SKU', 'Total Quantity', 'Total Value', 'Transactions']
-            for col, header in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col, value=header)
-                cell.font = Font(bold=True)
-                cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-                cell.alignment = Alignment(horizontal="center")
-            
-            # Data
-            for row, item in enumerate(sales_data, 2):
-                ws.cell(row=row, column=1, value=item['product_name'])
-                ws.cell(row=row, column=2, value=item['product_sku'])
-                ws.cell(row=row, column=3, value=float(item['total_quantity'] or 0))
-                ws.cell(row=row, column=4, value=float(item['total_value'] or 0))
-                ws.cell(row=row, column=5, value=item['transaction_count'] or 0)
-            
-            # Auto-adjust column widths
-            for column in ws.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                ws.column_dimensions[column_letter].width = adjusted_width
-            
-            # Create response
-            response = HttpResponse(
-                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+            rows = (
+                [
+                    item['product_name'],
+                    item['product_sku'],
+                    float(item['total_quantity'] or 0),
+                    float(item['total_value'] or 0),
+                    item['transaction_count'] or 0,
+                ]
+                for item in sales_data.iterator(chunk_size=EXPORT_CHUNK_SIZE)
             )
-            response['Content-Disposition'] = f'attachment; filename="sales_by_product_{datetime.now().strftime("%Y%m%d")}.xlsx"'
-            
-            wb.save(response)
-            return response
-            
+            sheet = ExportSheet(
+                "Sales by Product",
+                ['Product Name', 'SKU', 'Total Quantity', 'Total Value', 'Transactions'],
+                rows,
+            )
+            return xlsx_response([sheet], f'sales_by_product_{datetime.now().strftime("%Y%m%d")}.xlsx')
+
         except Exception as e:
             return Response({'error': str(e)}, status=500)
 
@@ -1436,13 +1312,10 @@ class SalesByCustomerExportAPIView(APIView):
     def get(self, request):
         try:
             from datetime import datetime, timedelta
-            import openpyxl
-            from openpyxl.styles import Font, PatternFill, Alignment
-            from django.http import HttpResponse
-            
+
             period_days = int(request.query_params.get('period_days', 30))
             start_date = datetime.now() - timedelta(days=period_days)
-            
+
             # Get sales data by customer
             sales_data = Document.objects.filter(
                 document_type__is_sales=True,
@@ -1455,49 +1328,23 @@ class SalesByCustomerExportAPIView(APIView):
                 transaction_count=Count('id'),
                 last_purchase=Max('date')
             ).order_by('-total_purchases')
-            
-            # Create Excel workbook
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "Sales by Customer"
-            
-            # Headers
-            headers = ['Customer Name', 'Total Purchases', 'Transactions', 'Last Purchase']
-            for col, header in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col, value=header)
-                cell.font = Font(bold=True)
-                cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-                cell.alignment = Alignment(horizontal="center")
-            
-            # Data
-            for row, item in enumerate(sales_data, 2):
-                ws.cell(row=row, column=1, value=item['customer_name'])
-                ws.cell(row=row, column=2, value=float(item['total_purchases'] or 0))
-                ws.cell(row=row, column=3, value=item['transaction_count'] or 0)
-                ws.cell(row=row, column=4, value=item['last_purchase'].strftime('%Y-%m-%d') if item['last_purchase'] else '')
-            
-            # Auto-adjust column widths
-            for column in ws.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                ws.column_dimensions[column_letter].width = adjusted_width
-            
-            # Create response
-            response = HttpResponse(
-                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+            rows = (
+                [
+                    item['customer_name'],
+                    float(item['total_purchases'] or 0),
+                    item['transaction_count'] or 0,
+                    item['last_purchase'].strftime('%Y-%m-%d') if item['last_purchase'] else '',
+                ]
+                for item in sales_data.iterator(chunk_size=EXPORT_CHUNK_SIZE)
             )
-            response['Content-Disposition'] = f'attachment; filename="sales_by_customer_{datetime.now().strftime("%Y%m%d")}.xlsx"'
-            
-            wb.save(response)
-            return response
-            
+            sheet = ExportSheet(
+                "Sales by Customer",
+                ['Customer Name', 'Total Purchases', 'Transactions', 'Last Purchase'],
+                rows,
+            )
+            return xlsx_response([sheet], f'sales_by_customer_{datetime.now().strftime("%Y%m%d")}.xlsx')
+
         except Exception as e:
             return Response({'error': str(e)}, status=500)
 
@@ -1513,13 +1360,10 @@ class SalesByPeriodExportAPIView(APIView):
         try:
             from datetime import datetime, timedelta
             from django.db.models.functions import TruncMonth
-            import openpyxl
-            from openpyxl.styles import Font, PatternFill, Alignment
-            from django.http import HttpResponse
-            
+
             # Get sales data by month for last 12 months
             twelve_months_ago = datetime.now() - timedelta(days=365)
-            
+
             sales_data = Document.objects.filter(
                 document_type__is_sales=True,
                 date__gte=twelve_months_ago.date(),
@@ -1530,48 +1374,18 @@ class SalesByPeriodExportAPIView(APIView):
                 total_sales=Sum('total_amount'),
                 transaction_count=Count('id')
             ).order_by('month')
-            
-            # Create Excel workbook
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "Sales by Period"
-            
-            # Headers
-            headers = ['Month', 'Total Sales', 'Transactions']
-            for col, header in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col, value=header)
-                cell.font = Font(bold=True)
-                cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-                cell.alignment = Alignment(horizontal="center")
-            
-            # Data
-            for row, item in enumerate(sales_data, 2):
-                ws.cell(row=row, column=1, value=item['month'].strftime('%Y-%m'))
-                ws.cell(row=row, column=2, value=float(item['total_sales'] or 0))
-                ws.cell(row=row, column=3, value=item['transaction_count'] or 0)
-            
-            # Auto-adjust column widths
-            for column in ws.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                ws.column_dimensions[column_letter].width = adjusted_width
-            
-            # Create response
-            response = HttpResponse(
-                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+            rows = (
+                [
+                    item['month'].strftime('%Y-%m'),
+                    float(item['total_sales'] or 0),
+                    item['transaction_count'] or 0,
+                ]
+                for item in sales_data
             )
-            response['Content-Disposition'] = f'attachment; filename="sales_by_period_{datetime.now().strftime("%Y%m%d")}.xlsx"'
-            
-            wb.save(response)
-            return response
-            
+            sheet = ExportSheet("Sales by Period", ['Month', 'Total Sales', 'Transactions'], rows)
+            return xlsx_response([sheet], f'sales_by_period_{datetime.now().strftime("%Y%m%d")}.xlsx')
+
         except Exception as e:
             return Response({'error': str(e)}, status=500)
 
@@ -1586,13 +1400,10 @@ class FinancialSummaryExportAPIView(APIView):
     def get(self, request):
         try:
             from datetime import datetime, timedelta
-            import openpyxl
-            from openpyxl.styles import Font, PatternFill, Alignment
-            from django.http import HttpResponse
-            
+
             period_days = int(request.query_params.get('period_days', 30))
             start_date = datetime.now() - timedelta(days=period_days)
-            
+
             # Get financial summary data
             sales_summary = DocumentLine.objects.filter(
                 document__document_type__is_sales=True,
@@ -1603,20 +1414,7 @@ class FinancialSummaryExportAPIView(APIView):
                 total_quantity=Sum('quantity'),
                 transaction_count=Count('document', distinct=True)
             )
-            
-            # Create Excel workbook
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "Financial Summary"
-            
-            # Headers
-            headers = ['Metric', 'Value']
-            for col, header in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col, value=header)
-                cell.font = Font(bold=True)
-                cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-                cell.alignment = Alignment(horizontal="center")
-            
+
             # Data
             data = [
                 ['Total Sales', float(sales_summary['total_sales'] or 0)],
@@ -1626,39 +1424,48 @@ class FinancialSummaryExportAPIView(APIView):
                 ['Period (Days)', period_days],
                 ['Report Date', datetime.now().strftime('%Y-%m-%d %H:%M:%S')]
             ]
-            
-            for row, (metric, value) in enumerate(data, 2):
-                ws.cell(row=row, column=1, value=metric)
-                ws.cell(row=row, column=2, value=value)
-            
-            # Auto-adjust column widths
-            for column in ws.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                ws.column_dimensions[column_letter].width = adjusted_width
-            
-            # Create response
-            response = HttpResponse(
-                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            )
-            response['Content-Disposition'] = f'attachment; filename="financial_summary_{datetime.now().strftime("%Y%m%d")}.xlsx"'
-            
-            wb.save(response)
-            return response
-            
+
+            sheet = ExportSheet("Financial Summary", ['Metric', 'Value'], data)
+            return xlsx_response([sheet], f'financial_summary_{datetime.now().strftime("%Y%m%d")}.xlsx')
+
         except Exception as e:
             return Response({'error': str(e)}, status=500)
 
 
 # ===== STOCK EXPORT VIEWS =====
 
+def _products_with_total_stock():
+    return _with_export_product_data(
+        Product.objects.filter(is_active=True).annotate(
+            total_stock=Subquery(
+                Stock.objects.filter(product=OuterRef('pk'))
+                .values('product')
+                .annotate(qty=Sum('quantity'))
+                .values('qty')[:1]
+            )
+        ).select_related('category')
+    )
+
+
+def _stock_summary_rows(products):
+    for product in products.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        # Determinar status
+        status = "Low Stock" if (product.total_stock or 0) < product.reorder_level else "OK"
+        yield [
+            product.name,
+            product.sku,
+            product.category.name if product.category else 'N/A',
+            product.export_brand_name or 'N/A',
+            product.total_stock or 0,
+            product.reorder_level,
+            status,
+            _stock_value(product.total_stock, product.export_default_price),
+        ]
+
+
+STOCK_SUMMARY_HEADERS = ['Product', 'SKU', 'Category', 'Brand', 'Total Stock', 'Reorder Level', 'Status', 'Stock Value']
+
+
 class StockByWarehouseExportAPIView(APIView):
     """
     Export stock data by warehouse to Excel
@@ -1669,82 +1476,52 @@ class StockByWarehouseExportAPIView(APIView):
     def get(self, request):
         try:
             from datetime import datetime
-            import openpyxl
-            from django.http import HttpResponse
-            from openpyxl.styles import Font, PatternFill, Alignment
-            
-            # Crear workbook
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "Stock by Warehouse"
-            
-            # Headers
-            headers = ['Warehouse', 'Product', 'SKU', 'Category', 'Brand', 'Current Stock', 'Reorder Level', 'Status', 'Stock Value']
-            for col, header in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col, value=header)
-                cell.font = Font(bold=True)
-                cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-                cell.alignment = Alignment(horizontal="center")
-            
+
             # Obtener datos de stock por almacén
-            from .models import Stock, Warehouse
-            stock_data = Stock.objects.select_related('product', 'warehouse', 'product__category').prefetch_related('product__brands').all()
-            
-            row = 2
-            for stock in stock_data:
-                product = stock.product
-                warehouse = stock.warehouse
-                
-                # Obtener precio por defecto
-                default_price = product.prices.filter(is_default=True, is_active=True).first()
-                stock_value = float(stock.quantity) * float(default_price.price) if default_price else 0.0
-                
-                # Determinar status
-                status = "Low Stock" if stock.quantity < product.reorder_level else "OK"
-                
-                data = [
-                    warehouse.name,
-                    product.name,
-                    product.sku,
-                    product.category.name if product.category else 'N/A',
-                    product.get_default_brand().name if product.get_default_brand() else 'N/A',
-                    stock.quantity,
-                    product.reorder_level,
-                    status,
-                    stock_value
-                ]
-                
-                for col, value in enumerate(data, 1):
-                    ws.cell(row=row, column=col, value=value)
-                
-                row += 1
-            
-            # Auto-adjust column widths
-            for column in ws.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                ws.column_dimensions[column_letter].width = adjusted_width
-            
-            # Create response
-            response = HttpResponse(
-                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            stock_data = _with_export_product_data(
+                Stock.objects.select_related('product', 'warehouse', 'product__category'),
+                product_ref='product_id',
+            ).order_by('warehouse__name', 'product__name')
+
+            def rows():
+                for stock in stock_data.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+                    product = stock.product
+                    # Determinar status
+                    status = "Low Stock" if stock.quantity < product.reorder_level else "OK"
+                    yield [
+                        stock.warehouse.name,
+                        product.name,
+                        product.sku,
+                        product.category.name if product.category else 'N/A',
+                        stock.export_brand_name or 'N/A',
+                        stock.quantity,
+                        product.reorder_level,
+                        status,
+                        _stock_value(stock.quantity, stock.export_default_price),
+                    ]
+
+            sheet = ExportSheet(
+                "Stock by Warehouse",
+                ['Warehouse', 'Product', 'SKU', 'Category', 'Brand', 'Current Stock', 'Reorder Level', 'Status', 'Stock Value'],
+                rows(),
             )
-            response['Content-Disposition'] = f'attachment; filename="stock_by_warehouse_{datetime.now().strftime("%Y%m%d")}.xlsx"'
-            
-            wb.save(response)
-            return response
-            
+            return xlsx_response([sheet], f'stock_by_warehouse_{datetime.now().strftime("%Y%m%d")}.xlsx')
+
         except Exception as e:
             return Response({'error': str(e)}, status=500)
 
 
+def complete_stock_export():
+    """(hojas, nombre de archivo) del inventario completo; también lo usa el worker de exportaciones."""
+    from datetime import datetime
+
+    # Obtener productos con stock total
+    products = _products_with_total_stock().order_by('name')
+
+    sheet = ExportSheet("Complete Stock", STOCK_SUMMARY_HEADERS, _stock_summary_rows(products))
+    return [sheet], f'complete_stock_{datetime.now().strftime("%Y%m%d")}.xlsx'
+
+
 class CompleteStockExportAPIView(APIView):
     """
     Export complete stock inventory to Excel
@@ -1754,81 +1531,9 @@ class CompleteStockExportAPIView(APIView):
 
     def get(self, request):
         try:
-            from datetime import datetime
-            import openpyxl
-            from django.http import HttpResponse
-            from openpyxl.styles import Font, PatternFill, Alignment
-            
-            # Crear workbook
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "Complete Stock"
-            
-            # Headers
-            headers = ['Product', 'SKU', 'Category', 'Brand', 'Total Stock', 'Reorder Level', 'Status', 'Stock Value']
-            for col, header in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col, value=header)
-                cell.font = Font(bold=True)
-                cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-                cell.alignment = Alignment(horizontal="center")
-            
-            # Obtener productos con stock total
-            products = Product.objects.filter(is_active=True).annotate(
-                total_stock=Subquery(
-                    Stock.objects.filter(product=OuterRef('pk'))
-                    .values('product')
-                    .annotate(qty=Sum('quantity'))
-                    .values('qty')[:1]
-                )
-            ).select_related('category').prefetch_related('brands').order_by('name')
-            
-            row = 2
-            for product in products:
-                # Obtener precio por defecto
-                default_price = product.prices.filter(is_default=True, is_active=True).first()
-                stock_value = float(product.total_stock or 0) * float(default_price.price) if default_price else 0.0
-                
-                # Determinar status
-                status = "Low Stock" if (product.total_stock or 0) < product.reorder_level else "OK"
-                
-                data = [
-                    product.name,
-                    product.sku,
-                    product.category.name if product.category else 'N/A',
-                    product.get_default_brand().name if product.get_default_brand() else 'N/A',
-                    product.total_stock or 0,
-                    product.reorder_level,
-                    status,
-                    stock_value
-                ]
-                
-                for col, value in enumerate(data, 1):
-                    ws.cell(row=row, column=col, value=value)
-                
-                row += 1
-            
-            # Auto-adjust column widths
-            for column in ws.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                ws.column_dimensions[column_letter].width = adjusted_width
-            
-            # Create response
-            response = HttpResponse(
-                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            )
-            response['Content-Disposition'] = f'attachment; filename="complete_stock_{datetime.now().strftime("%Y%m%d")}.xlsx"'
-            
-            wb.save(response)
-            return response
-            
+            sheets, filename = complete_stock_export()
+            return xlsx_response(sheets, filename)
+
         except Exception as e:
             return Response({'error': str(e)}, status=500)
 
@@ -1843,86 +1548,36 @@ class LowStockProductsExportAPIView(APIView):
     def get(self, request):
         try:
             from datetime import datetime
-            import openpyxl
-            from django.http import HttpResponse
-            from openpyxl.styles import Font, PatternFill, Alignment
-            
-            # Crear workbook
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "Low Stock Products"
-            
-            # Headers
-            headers = ['Product', 'SKU', 'Category', 'Brand', 'Current Stock', 'Reorder Level', 'Stock Difference', 'Status', 'Stock Value']
-            for col, header in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col, value=header)
-                cell.font = Font(bold=True)
-                cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-                cell.alignment = Alignment(horizontal="center")
-            
+
             # Obtener productos con stock bajo
-            low_stock_products = Product.objects.filter(
-                is_active=True
-            ).annotate(
-                total_stock=Subquery(
-                    Stock.objects.filter(product=OuterRef('pk'))
-                    .values('product')
-                    .annotate(qty=Sum('quantity'))
-                    .values('qty')[:1]
-                )
-            ).filter(
+            low_stock_products = _products_with_total_stock().filter(
                 total_stock__lt=F('reorder_level')
-            ).select_related('category').prefetch_related('brands').order_by('total_stock')
-            
-            row = 2
-            for product in low_stock_products:
-                # Obtener precio por defecto
-                default_price = product.prices.filter(is_default=True, is_active=True).first()
-                stock_value = float(product.total_stock or 0) * float(default_price.price) if default_price else 0.0
-                
-                # Determinar status
-                status = "Out of Stock" if (product.total_stock or 0) == 0 else "Low Stock"
-                stock_difference = (product.total_stock or 0) - product.reorder_level
-                
-                data = [
-                    product.name,
-                    product.sku,
-                    product.category.name if product.category else 'N/A',
-                    product.get_default_brand().name if product.get_default_brand() else 'N/A',
-                    product.total_stock or 0,
-                    product.reorder_level,
-                    stock_difference,
-                    status,
-                    stock_value
-                ]
-                
-                for col, value in enumerate(data, 1):
-                    ws.cell(row=row, column=col, value=value)
-                
-                row += 1
-            
-            # Auto-adjust column widths
-            for column in ws.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                ws.column_dimensions[column_letter].width = adjusted_width
-            
-            # Create response
-            response = HttpResponse(
-                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            ).order_by('total_stock')
+
+            def rows():
+                for product in low_stock_products.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+                    # Determinar status
+                    status = "Out of Stock" if (product.total_stock or 0) == 0 else "Low Stock"
+                    stock_difference = (product.total_stock or 0) - product.reorder_level
+                    yield [
+                        product.name,
+                        product.sku,
+                        product.category.name if product.category else 'N/A',
+                        product.export_brand_name or 'N/A',
+                        product.total_stock or 0,
+                        product.reorder_level,
+                        stock_difference,
+                        status,
+                        _stock_value(product.total_stock, product.export_default_price),
+                    ]
+
+            sheet = ExportSheet(
+                "Low Stock Products",
+                ['Product', 'SKU', 'Category', 'Brand', 'Current Stock', 'Reorder Level', 'Stock Difference', 'Status', 'Stock Value'],
+                rows(),
             )
-            response['Content-Disposition'] = f'attachment; filename="low_stock_products_{datetime.now().strftime("%Y%m%d")}.xlsx"'
-            
-            wb.save(response)
-            return response
-            
+            return xlsx_response([sheet], f'low_stock_products_{datetime.now().strftime("%Y%m%d")}.xlsx')
+
         except Exception as e:
             return Response({'error': str(e)}, status=500)
 
@@ -1937,125 +1592,64 @@ class StockReportExportAPIView(APIView):
     def get(self, request):
         try:
             from datetime import datetime
-            import openpyxl
-            from django.http import HttpResponse
-            from openpyxl.styles import Font, PatternFill, Alignment
-            
-            # Crear workbook
-            wb = openpyxl.Workbook()
-            
+
             # Hoja 1: Resumen de Stock
-            ws1 = wb.active
-            ws1.title = "Stock Summary"
-            
-            # Headers
-            headers = ['Product', 'SKU', 'Category', 'Brand', 'Total Stock', 'Reorder Level', 'Status', 'Stock Value']
-            for col, header in enumerate(headers, 1):
-                cell = ws1.cell(row=1, column=col, value=header)
-                cell.font = Font(bold=True)
-                cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-                cell.alignment = Alignment(horizontal="center")
-            
-            # Obtener todos los productos
-            products = Product.objects.filter(is_active=True).annotate(
-                total_stock=Subquery(
-                    Stock.objects.filter(product=OuterRef('pk'))
-                    .values('product')
-                    .annotate(qty=Sum('quantity'))
-                    .values('qty')[:1]
-                )
-            ).select_related('category').prefetch_related('brands').order_by('name')
-            
-            row = 2
-            for product in products:
-                # Obtener precio por defecto
-                default_price = product.prices.filter(is_default=True, is_active=True).first()
-                stock_value = float(product.total_stock or 0) * float(default_price.price) if default_price else 0.0
-                
-                # Determinar status
-                status = "Low Stock" if (product.total_stock or 0) < product.reorder_level else "OK"
-                
-                data = [
-                    product.name,
-                    product.sku,
-                    product.category.name if product.category else 'N/A',
-                    product.get_default_brand().name if product.get_default_brand() else 'N/A',
-                    product.total_stock or 0,
-                    product.reorder_level,
-                    status,
-                    stock_value
-                ]
-                
-                for col, value in enumerate(data, 1):
-                    ws1.cell(row=row, column=col, value=value)
-                
-                row += 1
-            
+            products = _products_with_total_stock().order_by('name')
+            summary = ExportSheet("Stock Summary", STOCK_SUMMARY_HEADERS, _stock_summary_rows(products))
+
             # Hoja 2: Stock por Almacén
-            ws2 = wb.create_sheet("Stock by Warehouse")
-            
-            # Headers
-            headers2 = ['Warehouse', 'Product', 'SKU', 'Current Stock', 'Reorder Level', 'Status']
-            for col, header in enumerate(headers2, 1):
-                cell = ws2.cell(row=1, column=col, value=header)
-                cell.font = Font(bold=True)
-                cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-                cell.alignment = Alignment(horizontal="center")
-            
-            # Obtener datos de stock por almacén
-            stock_data = Stock.objects.select_related('product', 'warehouse').all()
-            
-            row = 2
-            for stock in stock_data:
-                product = stock.product
-                warehouse = stock.warehouse
-                
-                # Determinar status
-                status = "Low Stock" if stock.quantity < product.reorder_level else "OK"
-                
-                data = [
-                    warehouse.name,
-                    product.name,
-                    product.sku,
-                    stock.quantity,
-                    product.reorder_level,
-                    status
-                ]
-                
-                for col, value in enumerate(data, 1):
-                    ws2.cell(row=row, column=col, value=value)
-                
-                row += 1
-            
-            # Auto-adjust column widths para ambas hojas
-            for ws in [ws1, ws2]:
-                for column in ws.columns:
-                    max_length = 0
-                    column_letter = column[0].column_letter
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = min(max_length + 2, 50)
-                    ws.column_dimensions[column_letter].width = adjusted_width
-            
-            # Create response
-            response = HttpResponse(
-                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            stock_data = Stock.objects.select_related('product', 'warehouse').order_by('warehouse__name', 'product__name')
+
+            def warehouse_rows():
+                for stock in stock_data.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+                    product = stock.product
+                    # Determinar status
+                    status = "Low Stock" if stock.quantity < product.reorder_level else "OK"
+                    yield [
+                        stock.warehouse.name,
+                        product.name,
+                        product.sku,
+                        stock.quantity,
+                        product.reorder_level,
+                        status,
+                    ]
+
+            by_warehouse = ExportSheet(
+                "Stock by Warehouse",
+                ['Warehouse', 'Product', 'SKU', 'Current Stock', 'Reorder Level', 'Status'],
+                warehouse_rows(),
             )
-            response['Content-Disposition'] = f'attachment; filename="stock_report_{datetime.now().strftime("%Y%m%d")}.xlsx"'
-            
-            wb.save(response)
-            return response
-            
+            return xlsx_response([summary, by_warehouse], f'stock_report_{datetime.now().strftime("%Y%m%d")}.xlsx')
+
         except Exception as e:
             return Response({'error': str(e)}, status=500)
 
 
 # ===== CUSTOMERS & SUPPLIERS EXPORT VIEWS =====
 
+def _builder_totals_rows(documents, name_field):
+    data = documents.filter(
+        is_active=True,
+        builder__isnull=False
+    ).values('builder').annotate(
+        builder_name=F(name_field),
+        party_name=F('builder__party__name'),
+        rfc=F('builder__party__rfc'),
+        total_purchases=Sum('total_amount'),
+        transaction_count=Count('id'),
+        last_purchase=Max('date')
+    ).order_by('-total_purchases')
+    for item in data.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [
+            item['builder_name'],
+            item['party_name'],
+            item['rfc'],
+            float(item['total_purchases'] or 0),
+            item['transaction_count'] or 0,
+            item['last_purchase'].strftime('%Y-%m-%d') if item['last_purchase'] else '',
+        ]
+
+
 class CustomersListExportAPIView(APIView):
     """
     Export customers list to Excel
@@ -2066,69 +1660,16 @@ class CustomersListExportAPIView(APIView):
     def get(self, request):
         try:
             from datetime import datetime
-            import openpyxl
-            from openpyxl.styles import Font, PatternFill, Alignment
-            from django.http import HttpResponse
-            from ctrctsapp.models import Builder
-            
-            # Create Excel workbook
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "Customers List"
-            
-            # Headers
-            headers = ['Customer Name', 'Party Name', 'RFC', 'Total Purchases', 'Transactions', 'Last Purchase']
-            for col, header in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col, value=header)
-                cell.font = Font(bold=True)
-                cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-                cell.alignment = Alignment(horizontal="center")
-            
+
             # Get customers data (builders with sales)
-            customers_data = Document.objects.filter(
-                document_type__is_sales=True,
-                is_active=True,
-                builder__isnull=False
-            ).values('builder').annotate(
-                customer_name=F('builder__name'),
-                party_name=F('builder__party__name'),
-                rfc=F('builder__party__rfc'),
-                total_purchases=Sum('total_amount'),
-                transaction_count=Count('id'),
-                last_purchase=Max('date')
-            ).order_by('-total_purchases')
-            
-            # Data
-            for row, item in enumerate(customers_data, 2):
-                ws.cell(row=row, column=1, value=item['customer_name'])
-                ws.cell(row=row, column=2, value=item['party_name'])
-                ws.cell(row=row, column=3, value=item['rfc'])
-                ws.cell(row=row, column=4, value=float(item['total_purchases'] or 0))
-                ws.cell(row=row, column=5, value=item['transaction_count'] or 0)
-                ws.cell(row=row, column=6, value=item['last_purchase'].strftime('%Y-%m-%d') if item['last_purchase'] else '')
-            
-            # Auto-adjust column widths
-            for column in ws.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                ws.column_dimensions[column_letter].width = adjusted_width
-            
-            # Create response
-            response = HttpResponse(
-                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            rows = _builder_totals_rows(Document.objects.filter(document_type__is_sales=True), 'builder__name')
+            sheet = ExportSheet(
+                "Customers List",
+                ['Customer Name', 'Party Name', 'RFC', 'Total Purchases', 'Transactions', 'Last Purchase'],
+                rows,
             )
-            response['Content-Disposition'] = f'attachment; filename="customers_list_{datetime.now().strftime("%Y%m%d")}.xlsx"'
-            
-            wb.save(response)
-            return response
-            
+            return xlsx_response([sheet], f'customers_list_{datetime.now().strftime("%Y%m%d")}.xlsx')
+
         except Exception as e:
             return Response({'error': str(e)}, status=500)
 
@@ -2143,73 +1684,121 @@ class SuppliersListExportAPIView(APIView):
     def get(self, request):
         try:
             from datetime import datetime
-            import openpyxl
-            from openpyxl.styles import Font, PatternFill, Alignment
-            from django.http import HttpResponse
-            from ctrctsapp.models import Builder
-            
-            # Create Excel workbook
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "Suppliers List"
-            
-            # Headers
-            headers = ['Supplier Name', 'Party Name', 'RFC', 'Total Purchases', 'Transactions', 'Last Purchase']
-            for col, header in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col, value=header)
-                cell.font = Font(bold=True)
-                cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-                cell.alignment = Alignment(horizontal="center")
-            
+
             # Get suppliers data (builders with purchases)
-            suppliers_data = Document.objects.filter(
-                document_type__is_purchase=True,
-                is_active=True,
-                builder__isnull=False
-            ).values('builder').annotate(
-                supplier_name=F('builder__name'),
-                party_name=F('builder__party__name'),
-                rfc=F('builder__party__rfc'),
-                total_purchases=Sum('total_amount'),
-                transaction_count=Count('id'),
-                last_purchase=Max('date')
-            ).order_by('-total_purchases')
-            
-            # Data
-            for row, item in enumerate(suppliers_data, 2):
-                ws.cell(row=row, column=1, value=item['supplier_name'])
-                ws.cell(row=row, column=2, value=item['party_name'])
-                ws.cell(row=row, column=3, value=item['rfc'])
-                ws.cell(row=row, column=4, value=float(item['total_purchases'] or 0))
-                ws.cell(row=row, column=5, value=item['transaction_count'] or 0)
-                ws.cell(row=row, column=6, value=item['last_purchase'].strftime('%Y-%m-%d') if item['last_purchase'] else '')
-            
-            # Auto-adjust column widths
-            for column in ws.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                ws.column_dimensions[column_letter].width = adjusted_width
-            
-            # Create response
-            response = HttpResponse(
-                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            rows = _builder_totals_rows(Document.objects.filter(document_type__is_purchase=True), 'builder__name')
+            sheet = ExportSheet(
+                "Suppliers List",
+                ['Supplier Name', 'Party Name', 'RFC', 'Total Purchases', 'Transactions', 'Last Purchase'],
+                rows,
             )
-            response['Content-Disposition'] = f'attachment; filename="suppliers_list_{datetime.now().strftime("%Y%m%d")}.xlsx"'
-            
-            wb.save(response)
-            return response
-            
+            return xlsx_response([sheet], f'suppliers_list_{datetime.now().strftime("%Y%m%d")}.xlsx')
+
         except Exception as e:
             return Response({'error': str(e)}, status=500)
 
 
+def _monthly_sales_and_purchases(since):
+    """({'YYYY-MM': {'sales', 'transactions'}}, {'YYYY-MM': purchases}) desde `since`."""
+    from django.db.models.functions import TruncMonth
+
+    sales_by_month = Document.objects.filter(
+        document_type__is_sales=True,
+        date__gte=since,
+        is_active=True
+    ).annotate(
+        month=TruncMonth('date')
+    ).values('month').annotate(
+        total_sales=Sum('total_amount'),
+        transaction_count=Count('id')
+    ).order_by('month')
+
+    purchases_by_month = Document.objects.filter(
+        document_type__is_purchase=True,
+        date__gte=since,
+        is_active=True
+    ).annotate(
+        month=TruncMonth('date')
+    ).values('month').annotate(
+        total_purchases=Sum('total_amount')
+    ).order_by('month')
+
+    sales_dict = {item['month'].strftime('%Y-%m'): {
+        'sales': float(item['total_sales'] or 0),
+        'transactions': item['transaction_count'] or 0
+    } for item in sales_by_month}
+    purchases_dict = {item['month'].strftime('%Y-%m'): float(item['total_purchases'] or 0) for item in purchases_by_month}
+    return sales_dict, purchases_dict
+
+
+def comparative_analysis_export():
+    """(hojas, nombre de archivo) del análisis comparativo; también lo usa el worker de exportaciones."""
+    from datetime import datetime, timedelta
+
+    twelve_months_ago = datetime.now() - timedelta(days=365)
+    sales_dict, purchases_dict = _monthly_sales_and_purchases(twelve_months_ago.date())
+
+    # Sheet 1: Sales vs Purchases Comparison (last 12 months)
+    comparison = []
+    previous_sales = 0
+    for i in range(12):
+        date = datetime.now() - timedelta(days=30*i)
+        month_key = date.strftime('%Y-%m')
+
+        sales = sales_dict.get(month_key, {'sales': 0})['sales']
+        purchases = purchases_dict.get(month_key, 0)
+
+        # Calculate growth rate
+        growth_rate = 0
+        if previous_sales > 0:
+            growth_rate = ((sales - previous_sales) / previous_sales) * 100
+
+        comparison.append([date.strftime('%b %Y'), sales, purchases, sales - purchases, f"{growth_rate:.1f}%"])
+        previous_sales = sales
+
+    # Sheet 2: Top Customers vs Top Suppliers
+    def top_builders(documents):
+        return documents.filter(
+            date__gte=twelve_months_ago.date(),
+            is_active=True,
+            builder__isnull=False
+        ).values('builder').annotate(
+            name=F('builder__name'),
+            total_amount=Sum('total_amount'),
+            transaction_count=Count('id'),
+            last_activity=Max('date')
+        ).order_by('-total_amount')[:10]
+
+    ranking = []
+    for kind, documents in (
+        ('Customer', Document.objects.filter(document_type__is_sales=True)),
+        ('Supplier', Document.objects.filter(document_type__is_purchase=True)),
+    ):
+        for idx, item in enumerate(top_builders(documents), 1):
+            ranking.append([
+                idx,
+                item['name'],
+                kind,
+                float(item['total_amount'] or 0),
+                item['transaction_count'] or 0,
+                item['last_activity'].strftime('%Y-%m-%d') if item['last_activity'] else ''
+            ])
+
+    sheets = [
+        ExportSheet(
+            "Sales vs Purchases",
+            ['Month', 'Total Sales', 'Total Purchases', 'Net Profit', 'Growth Rate'],
+            comparison,
+        ),
+        ExportSheet(
+            "Top Customers vs Suppliers",
+            ['Rank', 'Customer/Supplier', 'Type', 'Total Amount', 'Transactions', 'Last Activity'],
+            ranking,
+        ),
+    ]
+    return sheets, f'comparative_analysis_{datetime.now().strftime("%Y%m%d")}.xlsx'
+
+
 class ComparativeAnalysisExportAPIView(APIView):
     """
     Export comparative analysis between customers and suppliers to Excel
@@ -2219,171 +1808,9 @@ class ComparativeAnalysisExportAPIView(APIView):
 
     def get(self, request):
         try:
-            from datetime import datetime
-            import openpyxl
-            from openpyxl.styles import Font, PatternFill, Alignment
-            from django.http import HttpResponse
-            
-            # Create Excel workbook
-            wb = openpyxl.Workbook()
-            
-            # Sheet 1: Sales vs Purchases Comparison
-            ws1 = wb.active
-            ws1.title = "Sales vs Purchases"
-            
-            # Headers
-            headers = ['Month', 'Total Sales', 'Total Purchases', 'Net Profit', 'Growth Rate']
-            for col, header in enumerate(headers, 1):
-                cell = ws1.cell(row=1, column=col, value=header)
-                cell.font = Font(bold=True)
-                cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-                cell.alignment = Alignment(horizontal="center")
-            
-            # Get monthly data for last 12 months
-            from datetime import timedelta
-            from django.db.models.functions import TruncMonth
-            
-            twelve_months_ago = datetime.now() - timedelta(days=365)
-            
-            # Sales by month
-            sales_by_month = Document.objects.filter(
-                document_type__is_sales=True,
-                date__gte=twelve_months_ago.date(),
-                is_active=True
-            ).annotate(
-                month=TruncMonth('date')
-            ).values('month').annotate(
-                total_sales=Sum('total_amount')
-            ).order_by('month')
-            
-            # Purchases by month
-            purchases_by_month = Document.objects.filter(
-                document_type__is_purchase=True,
-                date__gte=twelve_months_ago.date(),
-                is_active=True
-            ).annotate(
-                month=TruncMonth('date')
-            ).values('month').annotate(
-                total_purchases=Sum('total_amount')
-            ).order_by('month')
-            
-            # Create dictionaries for easy lookup
-            sales_dict = {item['month'].strftime('%Y-%m'): float(item['total_sales'] or 0) for item in sales_by_month}
-            purchases_dict = {item['month'].strftime('%Y-%m'): float(item['total_purchases'] or 0) for item in purchases_by_month}
-            
-            # Generate data for last 12 months
-            row = 2
-            previous_sales = 0
-            for i in range(12):
-                date = datetime.now() - timedelta(days=30*i)
-                month_key = date.strftime('%Y-%m')
-                month_name = date.strftime('%b %Y')
-                
-                sales = sales_dict.get(month_key, 0)
-                purchases = purchases_dict.get(month_key, 0)
-                net_profit = sales - purchases
-                
-                # Calculate growth rate
-                growth_rate = 0
-                if previous_sales > 0:
-                    growth_rate = ((sales - previous_sales) / previous_sales) * 100
-                
-                data = [month_name, sales, purchases, net_profit, f"{growth_rate:.1f}%"]
-                for col, value in enumerate(data, 1):
-                    ws1.cell(row=row, column=col, value=value)
-                
-                previous_sales = sales
-                row += 1
-            
-            # Sheet 2: Top Customers vs Top Suppliers
-            ws2 = wb.create_sheet("Top Customers vs Suppliers")
-            
-            # Headers
-            headers2 = ['Rank', 'Customer/Supplier', 'Type', 'Total Amount', 'Transactions', 'Last Activity']
-            for col, header in enumerate(headers2, 1):
-                cell = ws2.cell(row=1, column=col, value=header)
-                cell.font = Font(bold=True)
-                cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-                cell.alignment = Alignment(horizontal="center")
-            
-            # Get top customers
-            top_customers = Document.objects.filter(
-                document_type__is_sales=True,
-                date__gte=twelve_months_ago.date(),
-                is_active=True,
-                builder__isnull=False
-            ).values('builder').annotate(
-                name=F('builder__name'),
-                total_amount=Sum('total_amount'),
-                transaction_count=Count('id'),
-                last_activity=Max('date')
-            ).order_by('-total_amount')[:10]
-            
-            # Get top suppliers
-            top_suppliers = Document.objects.filter(
-                document_type__is_purchase=True,
-                date__gte=twelve_months_ago.date(),
-                is_active=True,
-                builder__isnull=False
-            ).values('builder').annotate(
-                name=F('builder__name'),
-                total_amount=Sum('total_amount'),
-                transaction_count=Count('id'),
-                last_activity=Max('date')
-            ).order_by('-total_amount')[:10]
-            
-            row = 2
-            # Add customers
-            for idx, customer in enumerate(top_customers, 1):
-                data = [
-                    idx,
-                    customer['name'],
-                    'Customer',
-                    float(customer['total_amount'] or 0),
-                    customer['transaction_count'] or 0,
-                    customer['last_activity'].strftime('%Y-%m-%d') if customer['last_activity'] else ''
-                ]
-                for col, value in enumerate(data, 1):
-                    ws2.cell(row=row, column=col, value=value)
-                row += 1
-            
-            # Add suppliers
-            for idx, supplier in enumerate(top_suppliers, 1):
-                data = [
-                    idx,
-                    supplier['name'],
-                    'Supplier',
-                    float(supplier['total_amount'] or 0),
-                    supplier['transaction_count'] or 0,
-                    supplier['last_activity'].strftime('%Y-%m-%d') if supplier['last_activity'] else ''
-                ]
-                for col, value in enumerate(data, 1):
-                    ws2.cell(row=row, column=col, value=value)
-                row += 1
-            
-            # Auto-adjust column widths for both sheets
-            for ws in [ws1, ws2]:
-                for column in ws.columns:
-                    max_length = 0
-                    column_letter = column[0].column_letter
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = min(max_length + 2, 50)
-                    ws.column_dimensions[column_letter].width = adjusted_width
-            
-            # Create response
-            response = HttpResponse(
-                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            )
-            response['Content-Disposition'] = f'attachment; filename="comparative_analysis_{datetime.now().strftime("%Y%m%d")}.xlsx"'
-            
-            wb.save(response)
-            return response
-            
+            sheets, filename = comparative_analysis_export()
+            return xlsx_response(sheets, filename)
+
         except Exception as e:
             return Response({'error': str(e)}, status=500)
 
@@ -2397,120 +1824,49 @@ class TrendsExportAPIView(APIView):
 
     def get(self, request):
         try:
-            from datetime import datetime
-            import openpyxl
-            from openpyxl.styles import Font, PatternFill, Alignment
-            from django.http import HttpResponse
-            
-            # Create Excel workbook
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "Monthly Trends"
-            
-            # Headers
-            headers = ['Month', 'Sales', 'Purchases', 'Net Profit', 'Growth %', 'Transactions', 'Avg Transaction']
-            for col, header in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col, value=header)
-                cell.font = Font(bold=True)
-                cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-                cell.alignment = Alignment(horizontal="center")
-            
-            # Get monthly trends data
-            from datetime import timedelta
-            from django.db.models.functions import TruncMonth
-            
+            from datetime import datetime, timedelta
+
             twelve_months_ago = datetime.now() - timedelta(days=365)
-            
-            # Sales by month
-            sales_by_month = Document.objects.filter(
-                document_type__is_sales=True,
-                date__gte=twelve_months_ago.date(),
-                is_active=True
-            ).annotate(
-                month=TruncMonth('date')
-            ).values('month').annotate(
-                total_sales=Sum('total_amount'),
-                transaction_count=Count('id')
-            ).order_by('month')
-            
-            # Purchases by month
-            purchases_by_month = Document.objects.filter(
-                document_type__is_purchase=True,
-                date__gte=twelve_months_ago.date(),
-                is_active=True
-            ).annotate(
-                month=TruncMonth('date')
-            ).values('month').annotate(
-                total_purchases=Sum('total_amount')
-            ).order_by('month')
-            
-            # Create dictionaries for easy lookup
-            sales_dict = {item['month'].strftime('%Y-%m'): {
-                'sales': float(item['total_sales'] or 0),
-                'transactions': item['transaction_count'] or 0
-            } for item in sales_by_month}
-            
-            purchases_dict = {item['month'].strftime('%Y-%m'): float(item['total_purchases'] or 0) for item in purchases_by_month}
-            
+            sales_dict, purchases_dict = _monthly_sales_and_purchases(twelve_months_ago.date())
+
             # Generate data for last 12 months
-            row = 2
+            data = []
             previous_sales = 0
             for i in range(12):
                 date = datetime.now() - timedelta(days=30*i)
                 month_key = date.strftime('%Y-%m')
-                month_name = date.strftime('%b %Y')
-                
+
                 sales_data = sales_dict.get(month_key, {'sales': 0, 'transactions': 0})
                 sales = sales_data['sales']
                 transactions = sales_data['transactions']
                 purchases = purchases_dict.get(month_key, 0)
-                net_profit = sales - purchases
-                
+
                 # Calculate growth rate
                 growth_rate = 0
                 if previous_sales > 0:
                     growth_rate = ((sales - previous_sales) / previous_sales) * 100
-                
+
                 # Calculate average transaction
-                avg_transaction = sales / max(transactions, 1) if transactions > 0 else 0
-                
-                data = [
-                    month_name,
+                avg_transaction = sales / transactions if transactions > 0 else 0
+
+                data.append([
+                    date.strftime('%b %Y'),
                     sales,
                     purchases,
-                    net_profit,
+                    sales - purchases,
                     f"{growth_rate:.1f}%",
                     transactions,
                     avg_transaction
-                ]
-                for col, value in enumerate(data, 1):
-                    ws.cell(row=row, column=col, value=value)
-                
+                ])
                 previous_sales = sales
-                row += 1
-            
-            # Auto-adjust column widths
-            for column in ws.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                ws.column_dimensions[column_letter].width = adjusted_width
-            
-            # Create response
-            response = HttpResponse(
-                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+            sheet = ExportSheet(
+                "Monthly Trends",
+                ['Month', 'Sales', 'Purchases', 'Net Profit', 'Growth %', 'Transactions', 'Avg Transaction'],
+                data,
             )
-            response['Content-Disposition'] = f'attachment; filename="trends_analysis_{datetime.now().strftime("%Y%m%d")}.xlsx"'
-            
-            wb.save(response)
-            return response
-            
+            return xlsx_response([sheet], f'trends_analysis_{datetime.now().strftime("%Y%m%d")}.xlsx')
+
         except Exception as e:
             return Response({'error': str(e)}, status=500)
 
@@ -2651,13 +2007,8 @@ class InventoryMasterDataImportAPIView(APIView):
                 )
             
             # Ruta del archivo de fixtures
-            from django.conf import settings
-            fixture_path = os.path.join(
-                settings.BASE_DIR,
-                'appinventory',
-                'fixtures',
-                'masters_inventory.json'
-            )
+            from appinventory.seed import master_fixture_path, seed_master_inventory
+            fixture_path = master_fixture_path()
             
             if not os.path.exists(fixture_path):
                 return Response(
@@ -2668,40 +2019,8 @@ class InventoryMasterDataImportAPIView(APIView):
             # Importar dentro de una transacción
             with transaction.atomic():
                 try:
-                    # Usar loaddata con el fixture (Django busca en app/fixtures/ automáticamente)
-                    # Necesitamos usar la ruta absoluta o relativa a donde Django busca fixtures
-                    fixture_name = 'appinventory/fixtures/masters_inventory.json'
-                    # Intentar con el nombre del fixture primero (si está en FIXTURE_DIRS)
-                    try:
-                        call_command('loaddata', fixture_name, verbosity=0)
-                    except Exception:
-                        # Si falla, usar la ruta absoluta
-                        call_command('loaddata', fixture_path, verbosity=0)
-                    
-                    # Resetear secuencias de PostgreSQL para este schema
-                    from django.db import connection
-                    with connection.cursor() as cursor:
-                        # Resetear secuencias para todas las tablas de inventario
-                        tables = [
-                            'appinventory_unitcategory',
-                            'appinventory_unitofmeasure',
-                            'appinventory_warehouse',
-                            'appinventory_productcategory',
-                            'appinventory_productbrand',
-                            'appinventory_pricetype',
-                            'appinventory_product',
-                            'appinventory_productprice',
-                            'appinventory_productbrandassignment'
-                        ]
-                        for table in tables:
-                            try:
-                                cursor.execute(
-                                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
-                                    f"(SELECT COALESCE(MAX(id), 1) FROM {table}));"
-                                )
-                            except Exception:
-                                # Si la tabla no tiene secuencia o no existe, continuar
-                                pass
+                    # COPY por tabla + un solo ajuste de secuencias (ver appinventory/seed.py)
+                    seed_master_inventory(fixture_path)
                     
                     # Marcar como importado
                     tenant.seed_inventory_done = True
@@ -0,0 +1,92 @@
+"""
+Historial del chat por obra con paginación keyset sobre (timestamp, id).
+
+- sin parámetros: la última página (los mensajes más recientes).
+- before=<cursor>: la página anterior a ese mensaje (scroll hacia arriba).
+- after=<cursor>: lo posterior a ese mensaje.
+- since_id=<id>: delta para reconectar, todo lo que llegó después de ese id.
+
+El cursor es opaco para el cliente ("<timestamp iso>|<id>" en base64 url-safe).
+Las consultas usan el índice (work_account, timestamp, id) y nunca OFFSET, así
+que abrir un chat con miles de mensajes cuesta lo mismo que uno con cincuenta.
+"""
+
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from appschedule.models import EventChatMessage
+
+CHAT_PAGE_SIZE = 50
+CHAT_MAX_PAGE_SIZE = 200
+
+
+class CursorError(ValueError):
+    """Cursor o parámetro de paginación inválido."""
+
+
+def encode_cursor(message):
+    raw = f"{message.timestamp.isoformat()}|{message.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        timestamp, message_id = raw.rsplit('|', 1)
+        timestamp = parse_datetime(timestamp)
+        message_id = int(message_id)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise CursorError("Invalid cursor.")
+    if timestamp is None:
+        raise CursorError("Invalid cursor.")
+    return timestamp, message_id
+
+
+def _page_size(value):
+    if value in (None, ''):
+        return CHAT_PAGE_SIZE
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        raise CursorError("limit must be an integer.")
+    return max(1, min(size, CHAT_MAX_PAGE_SIZE))
+
+
+def chat_page(work_account_id, before=None, after=None, since_id=None, limit=None):
+    """
+    Devuelve (mensajes en orden cronológico, has_more). has_more indica si hay
+    más mensajes en la dirección pedida (más viejos para la última página y
+    before; más nuevos para after/since_id).
+    """
+    limit = _page_size(limit)
+    queryset = EventChatMessage.objects.filter(work_account_id=work_account_id).select_related('author')
+
+    if since_id not in (None, ''):
+        try:
+            since_id = int(since_id)
+        except (TypeError, ValueError):
+            raise CursorError("since_id must be an integer.")
+        rows = list(queryset.filter(id__gt=since_id).order_by('timestamp', 'id')[:limit + 1])
+        return rows[:limit], len(rows) > limit
+
+    if after:
+        timestamp, message_id = decode_cursor(after)
+        rows = list(
+            queryset
+            .filter(Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=message_id))
+            .order_by('timestamp', 'id')[:limit + 1]
+        )
+        return rows[:limit], len(rows) > limit
+
+    if before:
+        timestamp, message_id = decode_cursor(before)
+        queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=message_id))
+
+    rows = list(queryset.order_by('-timestamp', '-id')[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    rows.reverse()
+    return rows, has_more
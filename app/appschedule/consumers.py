@@ -1,18 +1,47 @@
+import asyncio
 import json
+import logging
+from urllib.parse import parse_qs
+
 from channels.generic.websocket import AsyncWebsocketConsumer, WebsocketConsumer
-from channels.db import database_sync_to_async
+from django.db import transaction
+from project.middleware.tenant_asgi import tenant_database_sync_to_async
 from .models import Event, EventChatMessage, EventNote
 from .serializers import EventChatMessageSerializer
+from .groups import tenant_group, window_groups
+
+logger = logging.getLogger(__name__)
+
+
+def _scope_schema(scope):
+    # TenantASGIMiddleware deja el schema del tenant en el scope
+    return scope.get('schema_name') or 'public'
 
 
 class EventConsumer(AsyncWebsocketConsumer):
     async def connect(self):
-        self.calendar_group_name = 'calendar_updates'  # Define a group name
-        await self.channel_layer.group_add(self.calendar_group_name, self.channel_name)
+        # Grupos del tenant; con ?start_at=&end_at= sólo las semanas visibles
+        self.schema_name = _scope_schema(self.scope)
+        params = parse_qs(self.scope.get('query_string', b'').decode())
+        self.calendar_groups = []
+        await self._subscribe(params.get('start_at', [None])[0], params.get('end_at', [None])[0])
         await self.accept()
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(self.calendar_group_name, self.channel_name)
+        for group in self.calendar_groups:
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def _subscribe(self, start_at, end_at):
+        try:
+            groups = window_groups(start_at, end_at, self.schema_name)
+        except ValueError:
+            groups = window_groups(None, None, self.schema_name)
+
+        for group in set(self.calendar_groups) - set(groups):
+            await self.channel_layer.group_discard(group, self.channel_name)
+        for group in set(groups) - set(self.calendar_groups):
+            await self.channel_layer.group_add(group, self.channel_name)
+        self.calendar_groups = groups
 
     async def event_updated(self, event):
         event_data = event['event_data']
@@ -32,25 +61,28 @@ class EventConsumer(AsyncWebsocketConsumer):
             'event': event_data
         }))
 
+    async def events_published(self, event):
+        # Publicación en bloque: un solo mensaje con los ids afectados
+        await self.send(text_data=json.dumps({
+            'type': 'events.published',
+            'event_ids': event['event_ids'],
+            'draft_ids': event['draft_ids'],
+        }))
+
     async def receive(self, text_data):
-        pass
-        # text_data_json = json.loads(text_data)
-        # message = text_data_json['message']
-        #
-        # # Enviar el mensaje al grupo
-        # await self.channel_layer.group_send(
-        #     self.calendar_group_name,
-        #     {
-        #         'type': 'chat.message',  # Define el tipo de evento
-        #         'message': message
-        #     }
-        # )
+        # El cliente avisa cuando cambia el rango visible del calendario
+        try:
+            data = json.loads(text_data)
+        except (TypeError, ValueError):
+            return
+        if isinstance(data, dict) and data.get('type') == 'subscribe':
+            await self._subscribe(data.get('start_at'), data.get('end_at'))
 
 
 class EventNoteConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.event_id = self.scope['url_route']['kwargs']['pk']
-        self.event_group_name = f"event_{self.event_id}_notes"
+        self.event_group_name = tenant_group(f"event_{self.event_id}_notes", _scope_schema(self.scope))
 
         # Join a group specific to the event
         await self.channel_layer.group_add(self.event_group_name, self.channel_name)
@@ -72,7 +104,7 @@ class EventNoteConsumer(AsyncWebsocketConsumer):
 class WorkAccountNoteConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.work_account_id = self.scope['url_route']['kwargs']['work_account_id']
-        self.work_account_group_name = f"work_account_{self.work_account_id}_notes"
+        self.work_account_group_name = tenant_group(f"work_account_{self.work_account_id}_notes", _scope_schema(self.scope))
 
         # Join a group specific to the work_account
         await self.channel_layer.group_add(self.work_account_group_name, self.channel_name)
@@ -91,28 +123,173 @@ class WorkAccountNoteConsumer(AsyncWebsocketConsumer):
         }))
 
 
-class EventChatConsumer(AsyncWebsocketConsumer):
+# ===== CHAT POR WEBSOCKET =====
+# El cliente puede escribir por el mismo socket en vez de un POST por mensaje:
+#   -> {"type": "auth", "token": "<token DRF>"}       (si no hay sesión en el scope)
+#   -> {"type": "chat.send", "message": "...", "client_id": "..."}
+#   <- {"type": "chat.ack", "client_id": "...", "message": {...}}   (con el id del servidor)
+#   <- {"type": "chat.error", "client_id": "...", "error": "..."}
+# Los mensajes que llegan juntos se guardan en lotes (una transacción por lote,
+# un lote a la vez y en orden); el resto del flujo (contadores de no leídos,
+# aviso al grupo) sale de los signals de EventChatMessage, igual que por HTTP.
+#
+# (author, client_id) es único: lo que quedó pendiente al cerrarse el socket se
+# guarda igual, y si el cliente lo reenvía por HTTP (no recibió el ack) el POST
+# devuelve el mensaje ya guardado en vez de duplicarlo.
+
+CHAT_BATCH_SIZE = 20
+CHAT_BATCH_DELAY = 0.05  # segundos que se espera para juntar mensajes
+
+
+class ChatIngestMixin:
+    """
+    Cada consumer fija en connect(), antes de chat_connect(), dónde se guardan
+    los mensajes: self.chat_event_id (opcional) y self.chat_work_account_id.
+    """
+    chat_event_id = None
+    chat_work_account_id = None
+
+    async def chat_connect(self):
+        self.schema_name = _scope_schema(self.scope)
+        self._chat_pending = []
+        self._chat_flush_task = None
+        self._chat_flush_lock = asyncio.Lock()
+        self._chat_closed = False
+        self.chat_user, self.chat_can_post = await self._load_poster(self.scope.get('user'))
+
+    async def chat_disconnect(self):
+        # Sin acks: el socket ya se cerró (el cliente reenvía por HTTP con el mismo client_id)
+        self._chat_closed = True
+        if self._chat_flush_task:
+            await self._chat_flush_task
+        await self._flush_chat()
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            data = json.loads(text_data or '')
+        except (TypeError, ValueError):
+            return
+        if not isinstance(data, dict):
+            return
+
+        if data.get('type') == 'auth':
+            user = await self._user_from_token(data.get('token'))
+            if user is not None:
+                self.chat_user, self.chat_can_post = await self._load_poster(user)
+            await self.send(text_data=json.dumps({
+                'type': 'auth.ok' if self.chat_can_post else 'auth.error',
+            }))
+            return
+
+        if data.get('type') != 'chat.send':
+            return
+
+        client_id = data.get('client_id')
+        text = (data.get('message') or '').strip()
+        if not self.chat_can_post:
+            await self._chat_error(client_id, 'You do not have permission to send messages.')
+            return
+        if not text:
+            await self._chat_error(client_id, 'Message is empty.')
+            return
+        if client_id is not None and (not isinstance(client_id, str) or len(client_id) > 64):
+            await self._chat_error(client_id, 'Invalid client_id.')
+            return
+
+        self._chat_pending.append((client_id, text))
+        if len(self._chat_pending) >= CHAT_BATCH_SIZE:
+            await self._flush_chat()
+        elif self._chat_flush_task is None:
+            self._chat_flush_task = asyncio.create_task(self._flush_chat_later())
+
+    async def _chat_error(self, client_id, error):
+        if self._chat_closed:
+            return
+        await self.send(text_data=json.dumps({'type': 'chat.error', 'client_id': client_id, 'error': error}))
+
+    async def _flush_chat_later(self):
+        await asyncio.sleep(CHAT_BATCH_DELAY)
+        self._chat_flush_task = None
+        await self._flush_chat()
+
+    async def _flush_chat(self):
+        # Un lote a la vez: el siguiente espera a que el anterior se guarde (orden de llegada)
+        async with self._chat_flush_lock:
+            batch, self._chat_pending = self._chat_pending, []
+            if not batch:
+                return
+            try:
+                saved = await self._save_chat_batch(batch)
+            except Exception as exc:
+                logger.exception("Error guardando mensajes de chat por websocket: %s", exc)
+                for client_id, _text in batch:
+                    await self._chat_error(client_id, 'Message could not be saved.')
+                return
+            if self._chat_closed:
+                return
+            for client_id, message in saved:
+                await self.send(text_data=json.dumps({'type': 'chat.ack', 'client_id': client_id, 'message': message}))
+
+    @tenant_database_sync_to_async
+    def _user_from_token(self, key):
+        from rest_framework.authtoken.models import Token
+
+        if not key:
+            return None
+        token = Token.objects.select_related('user').filter(key=key).first()
+        if token is None or not token.user.is_active:
+            return None
+        return token.user
+
+    @tenant_database_sync_to_async
+    def _load_poster(self, user):
+        """(usuario, puede escribir); has_perm consulta la BD, no se llama en async."""
+        can_post = bool(user and user.is_authenticated and user.has_perm('appschedule.add_eventchatmessage'))
+        return user, can_post
+
+    @tenant_database_sync_to_async
+    def _event_work_account_id(self, event_id):
+        return Event.objects.filter(pk=event_id).values_list('work_account_id', flat=True).first()
+
+    @tenant_database_sync_to_async
+    def _save_chat_batch(self, batch):
+        if not self.chat_work_account_id:
+            raise ValueError("Event does not have a work_account associated.")
+        saved = []
+        with transaction.atomic():
+            for client_id, text in batch:
+                fields = {
+                    'event_id': self.chat_event_id,
+                    'work_account_id': self.chat_work_account_id,
+                    'message': text,
+                }
+                if client_id:
+                    # Ya guardado (POST de reintento, o lote previo sin ack): se confirma el mismo
+                    message, _created = EventChatMessage.objects.get_or_create(
+                        author=self.chat_user, client_id=client_id, defaults=fields,
+                    )
+                else:
+                    message = EventChatMessage.objects.create(author=self.chat_user, **fields)
+                saved.append((client_id, message))
+        return [(client_id, EventChatMessageSerializer(message).data) for client_id, message in saved]
+
+
+class EventChatConsumer(ChatIngestMixin, AsyncWebsocketConsumer):
     async def connect(self):
         self.event_id = self.scope['url_route']['kwargs']['event_id']
-        self.room_group_name = f"schedule_{self.event_id}_chat"
+        self.room_group_name = tenant_group(f"schedule_{self.event_id}_chat", _scope_schema(self.scope))
+        # Igual que el POST: el chat es de la obra del evento
+        self.chat_event_id = int(self.event_id)
+        self.chat_work_account_id = await self._event_work_account_id(self.chat_event_id)
+        await self.chat_connect()
 
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
         await self.accept()
 
     async def disconnect(self, close_code):
+        await self.chat_disconnect()
         await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
 
-    # Receive message from WebSocket
-    async def receive(self, text_data):
-        pass
-        # text_data_json = json.loads(text_data)
-        # message = text_data_json["message"]
-        #
-        # # Send message to room group
-        # await self.channel_layer.group_send(
-        #     self.room_group_name, {"type": "chat.message", "message": message}
-        # )
-
     async def chat_updated(self, event):
         data = event['data']
         await self.send(text_data=json.dumps({
@@ -121,15 +298,18 @@ class EventChatConsumer(AsyncWebsocketConsumer):
         }))
 
 
-class WorkAccountChatConsumer(AsyncWebsocketConsumer):
+class WorkAccountChatConsumer(ChatIngestMixin, AsyncWebsocketConsumer):
     async def connect(self):
         self.work_account_id = self.scope['url_route']['kwargs']['work_account_id']
-        self.room_group_name = f"work_account_{self.work_account_id}_chat"
+        self.room_group_name = tenant_group(f"work_account_{self.work_account_id}_chat", _scope_schema(self.scope))
+        self.chat_work_account_id = int(self.work_account_id)
+        await self.chat_connect()
 
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
         await self.accept()
 
     async def disconnect(self, close_code):
+        await self.chat_disconnect()
         await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
 
     async def chat_updated(self, event):
@@ -143,7 +323,7 @@ class UnreadNotificationConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.user = self.scope["user"]
         self.user_id = self.scope["url_route"]["kwargs"]["user_id"]
-        self.group_name = f"user_{self.user_id}_unread"
+        self.group_name = tenant_group(f"user_{self.user_id}_unread", _scope_schema(self.scope))
 
         print(f"[WS-CONNECT] User {self.user.username} joined {self.group_name}")
         await self.channel_layer.group_add(self.group_name, self.channel_name)
@@ -155,6 +335,16 @@ class UnreadNotificationConsumer(AsyncWebsocketConsumer):
     async def unread_updated(self, event):
         await self.send(text_data=json.dumps({
             "type": "unread.updated",
-            "event_id": event["event_id"],
+            "work_account_id": event["work_account_id"],
             "count": event["count"]
-        }))
\ No newline at end of file
+        }))
+
+    async def export_progress(self, event):
+        # Avance de exportaciones en segundo plano (appcore.exports)
+        await self.send(text_data=json.dumps({
+            "type": "export.progress",
+            "job_id": event["job_id"],
+            "kind": event["kind"],
+            "status": event["status"],
+            "progress": event["progress"],
+        }))
@@ -0,0 +1,81 @@
+"""
+Matriz del schedule: categoría -> crew -> una lista de celdas por día.
+
+Los eventos ocupan [date, end_dt) (end_dt no inclusive, igual que en el
+calendario), y al menos el día `date`, como en period_expression(). Cada evento se recorta a la ventana [start_date, end_date) con
+aritmética de fechas y se reparte sólo en los índices de día que ocupa, así que
+el costo es proporcional a los eventos y a las celdas que llenan, no a
+eventos × días de la ventana.
+
+Lo usan el PDF y el Excel del schedule; cada uno decide qué poner en la celda
+con `cell(event, day, is_start)` (None = no mostrar ese día).
+"""
+
+from collections import OrderedDict
+from datetime import timedelta
+
+
+class ScheduleGrid:
+
+    def __init__(self, start_date, end_date):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.size = max((end_date - start_date).days, 0)
+        self.days = [start_date + timedelta(days=i) for i in range(self.size)]
+        self.categories = OrderedDict()
+
+    def slots(self, category, crew):
+        """Fila de la crew (se crea vacía si no existe)."""
+        crews = self.categories.setdefault(category, OrderedDict())
+        row = crews.get(crew)
+        if row is None:
+            row = crews[crew] = [[] for _ in range(self.size)]
+        return row
+
+    def span(self, first_day, end_day):
+        """Índices [lo, hi) de la ventana que cubre [first_day, end_day)."""
+        lo = max((first_day - self.start_date).days, 0)
+        hi = min((end_day - self.start_date).days, self.size)
+        return lo, hi
+
+    def add(self, category, crew, event, cell):
+        # Igual que period_expression(): un evento con end_dt <= date (o sin end_dt) ocupa su día
+        end_day = event.date + timedelta(days=1)
+        if event.end_dt and event.end_dt > end_day:
+            end_day = event.end_dt
+        lo, hi = self.span(event.date, end_day)
+        if lo >= hi:
+            return
+        row = self.slots(category, crew)
+        for i in range(lo, hi):
+            value = cell(event, self.days[i], self.days[i] == event.date)
+            if value is not None:
+                row[i].append(value)
+
+
+def build_schedule_grid(events, start_date, end_date, cell, crews=(), uncategorized=None):
+    """
+    Construye el ScheduleGrid de `events` (con crew y crew__category cargados).
+
+    - crews: crews a mostrar aunque no tengan eventos (en ese orden).
+    - uncategorized: nombre de categoría para crews sin categoría; None = omitirlas.
+    """
+    grid = ScheduleGrid(start_date, end_date)
+
+    for crew in crews:
+        if crew.category:
+            grid.slots(crew.category.name, crew.name)
+
+    for event in events:
+        crew = event.crew
+        if crew is None:
+            continue
+        if crew.category:
+            category = crew.category.name
+        elif uncategorized is not None:
+            category = uncategorized
+        else:
+            continue
+        grid.add(category, crew.name, event, cell)
+
+    return grid
@@ -0,0 +1,81 @@
+"""
+Nombres de grupos de Channels por tenant.
+
+Todos los grupos llevan el schema como prefijo ("<schema>.<grupo>"): un cambio
+en un tenant sólo llega a los sockets de ese tenant. Quien envía toma el schema
+de la conexión (connection.schema_name, la petición ya pasó por el middleware
+de django-tenants); el consumer lo toma de scope['schema_name'], que llena
+TenantASGIMiddleware.
+
+El calendario además se parte por semana ISO: un socket que indica su rango
+visible (start_at/end_at) se suscribe sólo a las semanas de ese rango, y cada
+cambio se envía al grupo general del tenant (sockets sin rango) y a las semanas
+que ocupa el evento.
+"""
+
+from datetime import timedelta
+
+from django.db import connection
+from django.utils.dateparse import parse_date
+
+CALENDAR = 'calendar_updates'
+# Un rango más largo que esto se suscribe al grupo general del tenant
+MAX_WINDOW_WEEKS = 8
+
+
+def current_schema():
+    return getattr(connection, 'schema_name', None) or 'public'
+
+
+def tenant_group(name, schema=None):
+    return f"{schema or current_schema()}.{name}"
+
+
+def _week_key(day):
+    year, week, _ = day.isocalendar()
+    return f"{year}w{week:02d}"
+
+
+def _weeks(start, end):
+    """Semanas ISO que toca [start, end] (ambos inclusive)."""
+    if end < start:
+        start, end = end, start
+    monday = start - timedelta(days=start.weekday())
+    weeks = []
+    while monday <= end:
+        weeks.append(_week_key(monday))
+        monday += timedelta(days=7)
+    return weeks
+
+
+def calendar_week_group(week_key, schema=None):
+    return tenant_group(f"{CALENDAR}.{week_key}", schema)
+
+
+def calendar_groups(spans, schema=None):
+    """Grupos a notificar para eventos que ocupan `spans` [(date, end_dt), ...]."""
+    schema = schema or current_schema()
+    groups = [tenant_group(CALENDAR, schema)]
+    seen = set()
+    for start, end in spans:
+        if not start or not end:
+            continue
+        for week in _weeks(start, end):
+            if week not in seen:
+                seen.add(week)
+                groups.append(calendar_week_group(week, schema))
+    return groups
+
+
+def window_groups(start_at, end_at, schema):
+    """
+    Grupos a los que se suscribe un socket con rango visible [start_at, end_at].
+    Sin rango válido (o muy largo) usa el grupo general del tenant.
+    """
+    start = parse_date(start_at) if isinstance(start_at, str) else start_at
+    end = parse_date(end_at) if isinstance(end_at, str) else end_at
+    if start and end:
+        weeks = _weeks(start, end)
+        if len(weeks) <= MAX_WINDOW_WEEKS:
+            return [calendar_week_group(week, schema) for week in weeks]
+    return [tenant_group(CALENDAR, schema)]
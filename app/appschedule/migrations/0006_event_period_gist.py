@@ -0,0 +1,37 @@
+# Generated by Django 5.0.3 on 2026-10-18 14:10
+
+import django.contrib.postgres.fields.ranges
+import django.contrib.postgres.indexes
+import django.db.models.expressions
+import django.db.models.functions.comparison
+from django.db import migrations
+
+
+def period_expression():
+    return django.db.models.expressions.Func(
+        django.db.models.expressions.F('date'),
+        django.db.models.functions.comparison.Greatest(
+            django.db.models.expressions.F('date'), django.db.models.expressions.F('end_dt')
+        ),
+        django.db.models.expressions.Value('[]'),
+        function='daterange',
+        output_field=django.contrib.postgres.fields.ranges.DateRangeField(),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appschedule', '0005_eventimage_work_account_alter_eventimage_event_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=django.contrib.postgres.indexes.GistIndex(period_expression(), name='appschedule_event_period_gist'),
+        ),
+        migrations.AddIndex(
+            model_name='eventdraft',
+            index=django.contrib.postgres.indexes.GistIndex(period_expression(), name='appschedule_draft_period_gist'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.0.3 on 2026-10-18 14:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Participantes actuales: quien escribió en el chat de la obra o tiene algún
+# mensaje marcado como leído. Sus pendientes = mensajes de otros sin ReadStatus.
+SEED_COUNTERS = """
+INSERT INTO appschedule_chatunreadcounter (work_account_id, user_id, unread, updated_at)
+SELECT p.work_account_id, p.user_id,
+       (SELECT COUNT(*)
+          FROM appschedule_eventchatmessage m
+         WHERE m.work_account_id = p.work_account_id
+           AND m.author_id <> p.user_id
+           AND NOT EXISTS (SELECT 1 FROM appschedule_eventchatreadstatus r
+                            WHERE r.message_id = m.id AND r.user_id = p.user_id)),
+       NOW()
+  FROM (SELECT work_account_id, author_id AS user_id
+          FROM appschedule_eventchatmessage
+         WHERE work_account_id IS NOT NULL
+        UNION
+        SELECT m.work_account_id, r.user_id
+          FROM appschedule_eventchatreadstatus r
+          JOIN appschedule_eventchatmessage m ON m.id = r.message_id
+         WHERE m.work_account_id IS NOT NULL) p
+ON CONFLICT (work_account_id, user_id) DO NOTHING;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appschedule', '0006_event_period_gist'),
+        ('apptransactions', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatUnreadCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unread', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_unread_counters', to=settings.AUTH_USER_MODEL)),
+                ('work_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_unread_counters', to='apptransactions.workaccount')),
+            ],
+            options={
+                'verbose_name': 'Chat Unread Counter',
+                'verbose_name_plural': 'Chat Unread Counters',
+                'constraints': [models.UniqueConstraint(fields=('work_account', 'user'), name='uniq_chat_unread_work_account_user')],
+            },
+        ),
+        migrations.RunSQL(SEED_COUNTERS, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.0.3 on 2026-10-18 15:05
+
+from django.db import migrations, models
+
+
+# Cursor = último mensaje marcado como leído por (usuario, obra). Si había
+# huecos (mensajes sin ReadStatus debajo del último leído) quedan como leídos.
+SEED_CURSORS = """
+INSERT INTO appschedule_chatunreadcounter (work_account_id, user_id, unread, last_read_id, last_read_at, updated_at)
+SELECT m.work_account_id, r.user_id, 0, MAX(m.id), MAX(r.read_at), NOW()
+  FROM appschedule_eventchatreadstatus r
+  JOIN appschedule_eventchatmessage m ON m.id = r.message_id
+ WHERE m.work_account_id IS NOT NULL
+ GROUP BY m.work_account_id, r.user_id
+ON CONFLICT (work_account_id, user_id)
+DO UPDATE SET last_read_id = GREATEST(appschedule_chatunreadcounter.last_read_id, EXCLUDED.last_read_id),
+              last_read_at = EXCLUDED.last_read_at;
+
+UPDATE appschedule_chatunreadcounter c
+   SET unread = (SELECT COUNT(*)
+                   FROM appschedule_eventchatmessage m
+                  WHERE m.work_account_id = c.work_account_id
+                    AND m.id > c.last_read_id
+                    AND m.author_id <> c.user_id);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appschedule', '0007_chatunreadcounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatunreadcounter',
+            name='last_read_id',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='chatunreadcounter',
+            name='last_read_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='eventchatmessage',
+            index=models.Index(fields=['work_account', 'id'], name='appschedule_chat_wa_id_idx'),
+        ),
+        migrations.RunSQL(SEED_CURSORS, migrations.RunSQL.noop),
+        migrations.DeleteModel(
+            name='EventChatReadStatus',
+        ),
+    ]
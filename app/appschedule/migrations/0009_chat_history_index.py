@@ -0,0 +1,17 @@
+# Generated by Django 5.0.3 on 2026-10-18 15:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appschedule', '0008_chat_read_cursor'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='eventchatmessage',
+            index=models.Index(fields=['work_account', 'timestamp', 'id'], name='appschedule_chat_wa_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.0.3 on 2026-10-18 16:40
+
+import django.contrib.postgres.fields.ranges
+import django.contrib.postgres.indexes
+import django.db.models.expressions
+import django.db.models.fields
+import django.db.models.functions.comparison
+from django.db import migrations
+
+
+def period_expression():
+    return django.db.models.expressions.Func(
+        django.db.models.expressions.F('date'),
+        django.db.models.functions.comparison.Greatest(
+            django.db.models.expressions.F('end_dt'),
+            django.db.models.expressions.Func(
+                django.db.models.expressions.F('date'),
+                template='(%(expressions)s + 1)',
+                output_field=django.db.models.fields.DateField(),
+            ),
+        ),
+        django.db.models.expressions.Value('[)'),
+        function='daterange',
+        output_field=django.contrib.postgres.fields.ranges.DateRangeField(),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appschedule', '0009_chat_history_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='event',
+            name='appschedule_event_period_gist',
+        ),
+        migrations.RemoveIndex(
+            model_name='eventdraft',
+            name='appschedule_draft_period_gist',
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=django.contrib.postgres.indexes.GistIndex(period_expression(), name='appschedule_event_period_gist'),
+        ),
+        migrations.AddIndex(
+            model_name='eventdraft',
+            index=django.contrib.postgres.indexes.GistIndex(period_expression(), name='appschedule_draft_period_gist'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.3 on 2026-10-18 17:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appschedule', '0010_event_period_half_open'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventchatmessage',
+            name='client_id',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='eventchatmessage',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(('client_id__isnull', False)),
+                fields=('author', 'client_id'),
+                name='uniq_chat_author_client_id',
+            ),
+        ),
+    ]
@@ -1,5 +1,11 @@
-from django.db import models
-from django.db.models import Q
+import datetime
+
+from django.contrib.postgres.fields import DateRangeField
+from django.contrib.postgres.indexes import GistIndex
+from django.db import connection, models
+from django.db.models import F, Func, Q, Value
+from django.db.models.functions import Greatest
+from django.utils.dateparse import parse_date
 from django.contrib.auth.models import User
 from crewsapp.models import Crew
 from ctrctsapp.models import Builder, HouseModel, Job
@@ -8,7 +14,76 @@ from django.utils.deconstruct import deconstructible
 from django.core.exceptions import ValidationError
 import os
 
-    
+
+
+# ===== RANGOS DE CALENDARIO =====
+# Un evento ocupa el rango semiabierto [date, end_dt): end_dt no es inclusive,
+# como en el calendario (un evento de un día tiene end_dt = date + 1, ver los
+# serializers) y en la matriz del PDF/Excel (grid.py). Las consultas del
+# calendario (lista, PDF, Excel, filtros de drafts) piden los eventos que se
+# cruzan con una ventana [start, end), también semiabierta: en vez de comparar
+# date/end_dt en varias ramas OR, se compara
+# daterange(date, end_dt, '[)') && daterange(start, end, '[)'), que usa el
+# índice GiST sobre la misma expresión.
+
+def period_expression():
+    """
+    daterange(date, end_dt, '[)'). GREATEST(end_dt, date + 1) protege filas con
+    end_dt <= date, que de otro modo darían un rango vacío (no se cruza con nada).
+    """
+    next_day = Func(F('date'), template='(%(expressions)s + 1)', output_field=models.DateField())
+    return Func(
+        F('date'), Greatest(F('end_dt'), next_day), Value('[)'),
+        function='daterange', output_field=DateRangeField(),
+    )
+
+
+def _as_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return parse_date(str(value))
+
+
+class CalendarQuerySet(models.QuerySet):
+
+    def overlapping(self, start, end=None):
+        """
+        Eventos cuyo rango [date, end_dt) se cruza con la ventana [start, end)
+        (end no inclusive). Sin `end`, o con end == start, la ventana es el día
+        `start`.
+        """
+        start = _as_date(start)
+        end = _as_date(end) if end is not None else start
+        if start is None or end is None:
+            raise ValueError("start/end must be dates in YYYY-MM-DD format")
+        if end < start:
+            start, end = end, start
+        if end == start:
+            end = start + datetime.timedelta(days=1)
+        window = Func(Value(start), Value(end), Value('[)'),
+                      function='daterange', output_field=DateRangeField())
+        return self.alias(period=period_expression()).filter(period__overlap=window)
+
+
+class CalendarPeriodMixin:
+    """Recuerda el rango cargado de la BD para avisar también a la ventana anterior."""
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_period = (instance.__dict__.get('date'), instance.__dict__.get('end_dt'))
+        return instance
+
+    def calendar_spans(self):
+        spans = [(self.date, self.end_dt)]
+        loaded = getattr(self, '_loaded_period', None)
+        if loaded and all(loaded) and loaded not in spans:
+            spans.append(loaded)
+        return spans
+
+
 class AbsenceReason(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True, null=True)
@@ -23,7 +98,7 @@ class AbsenceReason(models.Model):
         # ordering = ['-date', 'title']
 
 
-class Event(models.Model):
+class Event(CalendarPeriodMixin, models.Model):
     """
     A model representing an event with details related to a construction job.
     """
@@ -49,6 +124,8 @@ class Event(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     deleted = models.BooleanField(default=False)
 
+    objects = CalendarQuerySet.as_manager()
+
     def __str__(self):
         return self.title
     
@@ -80,12 +157,14 @@ class Event(models.Model):
         if qs_ed.exists() or qs_e.exists():
             raise ValidationError("Duplicate Event Detected")
 
-    def save(self, *args, **kwargs):
+    def normalize(self):
+        """Ajustes de save(); bulk_create/bulk_update no pasan por save()."""
         # Sincronizar campos desde work_account si está presente
         if self.work_account and not self.is_absence:
-            self.builder = self.work_account.builder
-            self.job = self.work_account.job
-            self.house_model = self.work_account.house_model
+            # Por id: no carga builder/job/house_model (una consulta por evento al publicar)
+            self.builder_id = self.work_account.builder_id
+            self.job_id = self.work_account.job_id
+            self.house_model_id = self.work_account.house_model_id
             self.lot = self.work_account.lot
             self.address = self.work_account.address
             # Sincronizar título desde work_account.title si no es ausencia
@@ -94,6 +173,9 @@ class Event(models.Model):
         
         if self.title:
             self.title = self.title.upper()
+
+    def save(self, *args, **kwargs):
+        self.normalize()
         super().save(*args, **kwargs)
 
     class Meta:
@@ -108,6 +190,7 @@ class Event(models.Model):
         indexes = [
             models.Index(fields=['date', 'end_dt']),
             models.Index(fields=['work_account', 'is_absence']),
+            GistIndex(period_expression(), name='appschedule_event_period_gist'),
         ]
         # ordering = ['-date', 'title']
         # Constraint está definido para PostgreSQL 😏
@@ -125,7 +208,7 @@ class Event(models.Model):
         #]
 
 
-class EventDraft(models.Model):
+class EventDraft(CalendarPeriodMixin, models.Model):
     """
     A model representing an event draft with details related to a construction job.
     """
@@ -151,6 +234,8 @@ class EventDraft(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
 
+    objects = CalendarQuerySet.as_manager()
+
     def __str__(self):
         return self.title
     
@@ -203,6 +288,7 @@ class EventDraft(models.Model):
         indexes = [
             models.Index(fields=['date', 'end_dt']),
             models.Index(fields=['work_account', 'is_absence']),
+            GistIndex(period_expression(), name='appschedule_draft_period_gist'),
         ]
         # ordering = ['-date', 'title']
         # Constraint está definido para PostgreSQL 😏
@@ -250,6 +336,8 @@ class EventChatMessage(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     message = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
+    # Id que genera el cliente por mensaje: un reenvío (socket y luego POST) no lo duplica
+    client_id = models.CharField(max_length=64, null=True, blank=True)
 
     def __str__(self):
         return f"{self.author.username}: {self.message[:50]}"
@@ -260,22 +348,135 @@ class EventChatMessage(models.Model):
             models.CheckConstraint(
                 check=Q(event__isnull=False) | Q(work_account__isnull=False),
                 name='event_chat_message_requires_event_or_work_account'
-            )
+            ),
+            models.UniqueConstraint(
+                fields=['author', 'client_id'],
+                condition=Q(client_id__isnull=False),
+                name='uniq_chat_author_client_id'
+            ),
+        ]
+        indexes = [
+            # Conteo de no leídos: work_account = X AND id > cursor
+            models.Index(fields=['work_account', 'id'], name='appschedule_chat_wa_id_idx'),
+            # Historial keyset: work_account = X ORDER BY timestamp, id
+            models.Index(fields=['work_account', 'timestamp', 'id'], name='appschedule_chat_wa_ts_idx'),
         ]
 
 
-class EventChatReadStatus(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
-    message = models.ForeignKey('EventChatMessage', on_delete=models.CASCADE, related_name='read_statuses', null=False)
-    read_at = models.DateTimeField(auto_now=True)
+class ChatUnreadCounterManager(models.Manager):
+
+    def message_posted(self, work_account_id, author_id):
+        """
+        Mensaje nuevo en el chat de la obra: el autor queda suscrito y todos los
+        demás participantes +1, con dos sentencias sin importar cuántos usuarios
+        haya. Devuelve [(user_id, unread), ...] de los participantes a avisar.
+
+        El cursor del autor no se mueve aquí: lo mueve su cliente con mark_read()
+        y el último id que muestra.
+        """
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {table} (work_account_id, user_id, unread, last_read_id, updated_at)
+                VALUES (%s, %s, 0, 0, NOW())
+                ON CONFLICT (work_account_id, user_id) DO NOTHING
+            """, [work_account_id, author_id])
+            cursor.execute(f"""
+                UPDATE {table}
+                SET unread = unread + 1, updated_at = NOW()
+                WHERE work_account_id = %s AND user_id <> %s
+                RETURNING user_id, unread
+            """, [work_account_id, author_id])
+            return cursor.fetchall()
+
+    def mark_read(self, user_id, work_account_id, last_id):
+        """
+        Mueve el cursor del usuario hasta `last_id`, el último mensaje que su
+        cliente muestra (lo devuelve la lista de mensajes), y lo suscribe al
+        chat si no lo estaba. No se toma MAX(id): un mensaje con id menor aún
+        sin confirmar quedaría leído sin que nadie lo viera.
+
+        El cursor nunca retrocede ni pasa del último mensaje de la obra; el
+        contador queda en los mensajes de otros posteriores al cursor.
+        Devuelve ese contador.
+        """
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        messages = connection.ops.quote_name(EventChatMessage._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {table} (work_account_id, user_id, unread, last_read_id, last_read_at, updated_at)
+                VALUES (%s, %s, 0,
+                        LEAST(%s, COALESCE((SELECT MAX(id) FROM {messages} WHERE work_account_id = %s), 0)),
+                        NOW(), NOW())
+                ON CONFLICT (work_account_id, user_id)
+                DO UPDATE SET last_read_id = GREATEST({table}.last_read_id, EXCLUDED.last_read_id),
+                              last_read_at = NOW(),
+                              updated_at = NOW()
+                RETURNING last_read_id
+            """, [work_account_id, user_id, last_id, work_account_id])
+            cursor_id = cursor.fetchone()[0]
+            cursor.execute(f"""
+                UPDATE {table}
+                SET unread = (
+                    SELECT COUNT(*) FROM {messages} m
+                    WHERE m.work_account_id = %s AND m.id > %s AND m.author_id <> %s
+                )
+                WHERE work_account_id = %s AND user_id = %s
+                RETURNING unread
+            """, [work_account_id, cursor_id, user_id, work_account_id, user_id])
+            return cursor.fetchone()[0]
+
+    def unread_counts(self, user_id, work_account_ids):
+        """
+        {work_account_id: mensajes de otros con id > cursor} (sin cursor = todos).
+        Conteo por rango sobre el índice (work_account, id) de los mensajes.
+        """
+        work_account_ids = list(work_account_ids)
+        if not work_account_ids:
+            return {}
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        messages = connection.ops.quote_name(EventChatMessage._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT m.work_account_id, COUNT(*)
+                FROM {messages} m
+                LEFT JOIN {table} c ON c.work_account_id = m.work_account_id AND c.user_id = %s
+                WHERE m.work_account_id = ANY(%s)
+                  AND m.id > COALESCE(c.last_read_id, 0)
+                  AND m.author_id <> %s
+                GROUP BY m.work_account_id
+            """, [user_id, work_account_ids, user_id])
+            return dict(cursor.fetchall())
+
+
+class ChatUnreadCounter(models.Model):
+    """
+    Cursor de lectura y contador de no leídos por (usuario, obra). Una fila por
+    participante del chat (quien escribió o abrió el chat); sólo ellos reciben
+    el aviso por websocket.
+
+    Los mensajes con id <= last_read_id están leídos: el espacio es
+    O(usuarios × obras) y no O(usuarios × mensajes).
+    """
+    work_account = models.ForeignKey('apptransactions.WorkAccount', on_delete=models.CASCADE, related_name='chat_unread_counters')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_unread_counters')
+    unread = models.PositiveIntegerField(default=0)
+    last_read_id = models.PositiveBigIntegerField(default=0)
+    last_read_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ChatUnreadCounterManager()
 
     class Meta:
-        unique_together = ('user', 'message')
-        verbose_name = "Event Chat Read Status"
-        verbose_name_plural = "Event Chat Read Statuses"
+        verbose_name = "Chat Unread Counter"
+        verbose_name_plural = "Chat Unread Counters"
+        constraints = [
+            # work_account primero: el +1 filtra por obra
+            models.UniqueConstraint(fields=['work_account', 'user'], name='uniq_chat_unread_work_account_user'),
+        ]
 
     def __str__(self):
-        return f"{self.user.username} read message {self.message.id} at {self.read_at}"
+        return f"{self.user_id}@{self.work_account_id}: {self.unread}"
 
 
 @deconstructible
@@ -0,0 +1,107 @@
+"""
+Publicación de drafts en bloque.
+
+publish_drafts() convierte un conjunto de drafts (ya bloqueados por el
+llamador) en eventos con operaciones por conjunto:
+
+- drafts con event_id: bulk_update del evento existente.
+- drafts sin event_id: un solo INSERT ... ON CONFLICT (crew, date, title)
+  DO UPDATE (bulk_create con update_conflicts), la misma clave natural que
+  usaba update_or_create.
+- los drafts se borran con un solo queryset.delete().
+
+Ni bulk_create ni bulk_update disparan post_save, así que no sale un mensaje
+por evento: al confirmar la transacción se envía un único 'events.published'
+a los grupos de calendario del tenant con los ids que cambiaron. El post_delete
+de cada draft pasa por el outbox de signals.py y sale en el mismo envío.
+
+Es el único camino de publicación: también lo usan create/update de
+EventViewSet con `_post` (un draft).
+"""
+
+from django.db import transaction
+from django.utils import timezone
+
+from appschedule.groups import calendar_groups
+from appschedule.models import Event, EventDraft
+
+NATURAL_KEY = ('crew', 'date', 'title')
+_EXCLUDED = {'event', 'updated_at', 'created_at', 'pk', 'id'}
+
+
+def draft_field_names():
+    """Campos concretos que el draft copia al evento."""
+    event_fields = {f.name for f in Event._meta.get_fields() if getattr(f, 'concrete', False)}
+    return [
+        f.name for f in EventDraft._meta.get_fields()
+        if getattr(f, 'concrete', False) and f.name not in _EXCLUDED and f.name in event_fields
+    ]
+
+
+def draft_to_defaults(draft, fields=None):
+    return {name: getattr(draft, name) for name in (fields or draft_field_names())}
+
+
+def publish_drafts(drafts):
+    """
+    Publica `drafts` (lista de EventDraft con crew y work_account cargados) y
+    devuelve (event_ids, draft_ids). Debe llamarse dentro de transaction.atomic().
+    """
+    drafts = list(drafts)
+    if not drafts:
+        return [], []
+
+    fields = draft_field_names()
+    now = timezone.now()
+
+    by_event_id = {d.event_id: d for d in drafts if d.event_id}
+    existing = Event.objects.in_bulk(list(by_event_id))
+
+    to_update = []
+    to_upsert = {}
+    for draft in drafts:
+        event = existing.get(draft.event_id) if draft.event_id else None
+        if event is None:
+            # Sin evento (o el evento ya no existe): clave natural
+            event = Event()
+        for name, value in draft_to_defaults(draft, fields).items():
+            setattr(event, name, value)
+        event.normalize()
+
+        if event.pk:
+            event.updated_at = now
+            to_update.append(event)
+        else:
+            # Dos drafts con la misma clave: gana el último, como con update_or_create
+            to_upsert[(event.crew_id, event.date, event.title)] = event
+
+    if to_update:
+        Event.objects.bulk_update(to_update, fields + ['updated_at'])
+
+    created = list(to_upsert.values())
+    if created:
+        Event.objects.bulk_create(
+            created,
+            update_conflicts=True,
+            unique_fields=list(NATURAL_KEY),
+            update_fields=[name for name in fields if name not in NATURAL_KEY] + ['updated_at'],
+        )
+
+    draft_ids = [d.pk for d in drafts]
+    EventDraft.objects.filter(pk__in=draft_ids).delete()
+
+    event_ids = [e.pk for e in to_update] + [e.pk for e in created]
+    spans = {span for obj in drafts + to_update for span in obj.calendar_spans()}
+    groups = calendar_groups(spans)
+    transaction.on_commit(lambda: notify_published(groups, event_ids, draft_ids))
+    return event_ids, draft_ids
+
+
+def notify_published(groups, event_ids, draft_ids):
+    from appschedule.signals import _notify_groups
+
+    _notify_groups(groups, {
+        'type': 'events.published',
+        'event_ids': event_ids,
+        'draft_ids': draft_ids,
+    })
@@ -209,14 +209,27 @@ class EventChatMessageSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = EventChatMessage
-        fields = ['id', 'event', 'work_account', 'author', 'message', 'timestamp']
+        fields = ['id', 'event', 'work_account', 'author', 'message', 'timestamp', 'client_id']
         read_only_fields = ['id', 'timestamp', 'author']
-        extra_kwargs = {'event': {'write_only': True}, 'work_account': {'write_only': True}}
+        extra_kwargs = {
+            'event': {'write_only': True},
+            'work_account': {'write_only': True},
+            'client_id': {'required': False, 'allow_null': True},
+        }
+        # La unicidad (author, client_id) la resuelve create(): un reenvío devuelve el mensaje ya guardado
+        validators = []
 
     def create(self, validated_data):
         event = validated_data.pop('event', None)
         work_account = validated_data.pop('work_account', None)
         author = self.context['request'].user
+        client_id = validated_data.pop('client_id', None)
+        if client_id:
+            message, _created = EventChatMessage.objects.get_or_create(
+                author=author, client_id=client_id,
+                defaults={'event': event, 'work_account': work_account, **validated_data},
+            )
+            return message
         return EventChatMessage.objects.create(event=event, work_account=work_account, author=author, **validated_data)
     
 class AbsenceReasonSerializer(serializers.ModelSerializer):
@@ -1,6 +1,9 @@
+import asyncio
 import logging
 import os
+import threading
 
+from django.db import transaction
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.conf import settings
@@ -12,101 +15,193 @@ try:
     from redis.exceptions import ConnectionError as RedisConnectionError  # type: ignore
 except ImportError:  # pragma: no cover - el paquete redis es opcional
     RedisConnectionError = Exception
-from appschedule.models import Event, EventDraft, EventNote, EventChatMessage, EventChatReadStatus, EventImage
-from appschedule.serializers import EventSerializer, EventDraftSerializer, EventNoteSerializer, EventChatMessageSerializer
+from appschedule.groups import calendar_groups, tenant_group
+from appschedule.models import (
+    ChatUnreadCounter, Event, EventDraft, EventNote, EventChatMessage, EventImage
+)
+from appschedule.serializers import EventNoteSerializer, EventChatMessageSerializer
 
 
 logger = logging.getLogger(__name__)
 
 
-def _notify_group(group_name: str, payload: dict) -> None:
-    """// Envía mensajes a un grupo de Channels sin romper si Redis falla."""
+def _channel_layer():
     if not getattr(settings, 'ENABLE_WEBSOCKET_NOTIFICATIONS', False):
-        return
+        return None
 
     channel_layer = get_channel_layer()
     if channel_layer is None:
         logger.debug("Channel layer no disponible; se omite notificación.")
+    return channel_layer
+
+
+def _send_many(messages) -> None:
+    """// Envía [(grupo, payload), ...] en un solo salto a async, sin romper si Redis falla."""
+    channel_layer = _channel_layer()
+    if channel_layer is None or not messages:
         return
 
+    async def send_all():
+        await asyncio.gather(*(channel_layer.group_send(group, payload) for group, payload in messages))
+
     try:
-        async_to_sync(channel_layer.group_send)(group_name, payload)
+        async_to_sync(send_all)()
     except RedisConnectionError as exc:
         logger.warning("Redis ausente, notificación omitida: %s", exc)
     except Exception as exc:  # pragma: no cover - defensivo
         logger.exception("Error enviando notificación websocket: %s", exc)
 
 
+def _notify_group(group_name: str, payload: dict) -> None:
+    """// Envía mensajes a un grupo (ya con prefijo de tenant) sin romper si Redis falla."""
+    _send_many([(group_name, payload)])
+
+
+def _notify_groups(group_names, payload: dict) -> None:
+    _send_many([(group, payload) for group in group_names])
+
+
+# ===== OUTBOX =====
+# Los signals no envían nada en el momento: encolan (grupo, tipo, objeto) ->
+# función que arma el payload. Al confirmar la transacción se envía todo de
+# una vez; varias escrituras del mismo objeto en la transacción se fusionan en
+# un solo mensaje (gana la última) y el payload se arma una sola vez, con el
+# estado final. Si la transacción se revierte no se envía nada.
+#
+# Cada escritura registra su propio on_commit(flush) en el bloque atómico
+# donde ocurre, así Django descarta sólo los de un savepoint revertido. Los
+# callbacks corren en orden de registro: el primero que sobrevive envía el
+# lote completo y lo retira del hilo; los siguientes no encuentran nada.
+#
+# Si se revierte la transacción (o un savepoint) sus callbacks desaparecen
+# pero las entradas siguen en el lote del hilo: antes de encolar se quitan
+# las entradas cuyo callback ya no está pendiente, para no enviar en la
+# próxima transacción mensajes armados con filas que nunca se confirmaron.
+
+class _Outbox(threading.local):
+    batch = None
+
+
+_outbox = _Outbox()
+
+
+class _Batch(dict):
+    """(grupo, tipo, clave) -> (build, callback de on_commit)."""
+    # (posición en run_on_commit, callback) del último on_commit registrado
+    last = None
+
+
+def _flush(batch):
+    if _outbox.batch is not batch:
+        return  # ya lo envió un callback anterior del mismo lote
+    _outbox.batch = None
+    messages = []
+    for (group, _type, _key), (build, _callback) in batch.items():
+        try:
+            messages.append((group, build()))
+        except Exception as exc:  # pragma: no cover - defensivo
+            logger.exception("Error armando notificación websocket: %s", exc)
+    _send_many(messages)
+
+
+def _prune_rolled_back(batch, connection):
+    """Quita del lote las entradas cuyo on_commit descartó un rollback."""
+    pending = connection.run_on_commit
+    position, callback = batch.last
+    # Caso común: nada se quitó de la lista hasta nuestro último callback
+    if position < len(pending) and pending[position][1] is callback:
+        return
+    alive = {id(entry[1]) for entry in pending}
+    for key in [key for key, (_build, cb) in batch.items() if id(cb) not in alive]:
+        del batch[key]
+
+
+def queue_broadcast(group: str, msg_type: str, key, build) -> None:
+    """Encola build() -> payload para enviarse a `group` al confirmar la transacción."""
+    if _channel_layer() is None:
+        return
+
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        _send_many([(group, build())])
+        return
+
+    batch = _outbox.batch
+    if batch is None:
+        batch = _outbox.batch = _Batch()
+    else:
+        _prune_rolled_back(batch, connection)
+
+    def callback():
+        _flush(batch)
+
+    batch.pop((group, msg_type, key), None)  # reubicar al final: respeta el orden de la última escritura
+    batch[(group, msg_type, key)] = (build, callback)
+    transaction.on_commit(callback)
+    batch.last = (len(connection.run_on_commit) - 1, callback)
+
+
+def queue_calendar_broadcast(instance, msg_type, build) -> None:
+    """Calendario: grupo general del tenant + semanas del rango nuevo y del anterior."""
+    for group in calendar_groups(instance.calendar_spans()):
+        queue_broadcast(group, msg_type, instance.pk, build)
+
+
+def _event_delta(instance, deleted=False):
+    """Payload compacto: el calendario sólo necesita saber qué cambió para recargar."""
+    if deleted:
+        return {'id': instance.id, 'deleted': True}
+    return {
+        'id': instance.id,
+        'crew': instance.crew_id,
+        'date': str(instance.date),
+        'end_dt': str(instance.end_dt),
+        'deleted': getattr(instance, 'deleted', False),
+    }
+
+
 @receiver(post_save, sender=Event)
 def event_saved(sender, instance, **kwargs):
-    serializer = EventSerializer(instance)
-
-    event_data = serializer.data
-    _notify_group(
-        "calendar_updates",
-        {
-            'type': 'event.updated',
-            'event_data': event_data,
-        }
-    )
+    queue_calendar_broadcast(instance, 'event.updated', lambda: {
+        'type': 'event.updated',
+        'event_data': _event_delta(instance),
+    })
 
 
 @receiver(post_delete, sender=Event)
 def event_deleted(sender, instance, **kwargs):
-    event_data = {
-        'id': instance.id,
-    }
-    _notify_group(
-        "calendar_updates",
-        {
-            'type': 'event.updated',
-            'event_data': event_data,
-        }
-    )
+    event_data = _event_delta(instance, deleted=True)
+    queue_calendar_broadcast(instance, 'event.updated', lambda: {
+        'type': 'event.updated',
+        'event_data': event_data,
+    })
 
 
 @receiver(post_save, sender=EventDraft)
 def event_draft_saved(sender, instance, **kwargs):
-    serializer = EventDraftSerializer(instance)
-
-    event_data = serializer.data
-    _notify_group(
-        "calendar_updates",
-        {
-            'type': 'event_draft.updated',
-            'event_data': event_data,
-        }
-    )
+    queue_calendar_broadcast(instance, 'event_draft.updated', lambda: {
+        'type': 'event_draft.updated',
+        'event_data': _event_delta(instance),
+    })
 
 
 @receiver(post_delete, sender=EventDraft)
 def event_draft_deleted(sender, instance, **kwargs):
-    event_data = {
-        'id': instance.id,
-    }
-    _notify_group(
-        "calendar_updates",
-        {
-            'type': 'event_draft.updated',
-            'event_data': event_data,
-        }
-    )
+    event_data = _event_delta(instance, deleted=True)
+    queue_calendar_broadcast(instance, 'event_draft.updated', lambda: {
+        'type': 'event_draft.updated',
+        'event_data': event_data,
+    })
 
 @receiver(post_save, sender=EventNote)
 def event_note_saved(sender, instance, **kwargs):
-    serializer = EventNoteSerializer(instance)
-
-    event_data = serializer.data
     # Usar work_account_id para el grupo de WebSocket
     work_account_id = instance.work_account_id if instance.work_account_id else None
     if work_account_id:
-        _notify_group(
-            f"work_account_{work_account_id}_notes",
-            {
-                'type': 'note.updated',
-                'event_data': event_data,
-            }
-        )
+        queue_broadcast(tenant_group(f"work_account_{work_account_id}_notes"), 'note.updated', instance.pk, lambda: {
+            'type': 'note.updated',
+            'event_data': EventNoteSerializer(instance).data,
+        })
 
 
 @receiver(post_save, sender=EventChatMessage)
@@ -114,37 +209,38 @@ def event_chatmessage_saved(sender, instance, created, **kwargs):
     if not created:
         return
 
-    # Crear automáticamente el ReadStatus para el autor
-    EventChatReadStatus.objects.update_or_create(
-        user=instance.author,
-        message=instance,
-        defaults={"read_at": instance.timestamp}
-    )
-
-    serializer = EventChatMessageSerializer(instance)
-    event_data = serializer.data
-
     # Usar work_account_id para el grupo de WebSocket si está disponible
-    work_account_id = instance.work_account_id if instance.work_account_id else None
-    if work_account_id:
-        _notify_group(
-            f"work_account_{work_account_id}_chat",
-            {
-                'type': 'chat.updated',
-                'data': event_data,
-                'author_id': instance.author.id
-            }
-        )
-    # Fallback a event_id para compatibilidad
+    # (fallback a event_id para compatibilidad)
+    if instance.work_account_id:
+        group = tenant_group(f"work_account_{instance.work_account_id}_chat")
     elif instance.event_id:
-        _notify_group(
-            f"schedule_{instance.event_id}_chat",
-            {
-                'type': 'chat.updated',
-                'data': event_data,
-                'author_id': instance.author.id
-            }
-        )
+        group = tenant_group(f"schedule_{instance.event_id}_chat")
+    else:
+        return
+
+    # Cada mensaje nuevo es un objeto distinto: no se fusiona, sólo se difiere al commit
+    queue_broadcast(group, 'chat.updated', instance.pk, lambda: {
+        'type': 'chat.updated',
+        'data': EventChatMessageSerializer(instance).data,
+        'author_id': instance.author_id
+    })
+
+    if instance.work_account_id:
+        _notify_unread(instance)
+
+
+def _notify_unread(message):
+    """El autor queda leído hasta su mensaje; +1 por participante y aviso sólo a ellos."""
+    counters = ChatUnreadCounter.objects.message_posted(message.work_account_id, message.author_id)
+    for user_id, unread in counters:
+        # Varios mensajes en la misma transacción: sólo el último contador por usuario
+        queue_broadcast(tenant_group(f"user_{user_id}_unread"), 'unread.updated', message.work_account_id,
+                        lambda unread=unread: {
+                            "type": "unread.updated",
+                            "work_account_id": message.work_account_id,
+                            "count": unread,
+                            "from_user_id": message.author_id,
+                        })
 
 
 @receiver(post_delete, sender=EventImage)
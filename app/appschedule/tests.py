@@ -1,3 +1,125 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+
+from apptransactions.models import WorkAccount
+from ctrctsapp.models import Builder
+from appschedule.groups import tenant_group
+from appschedule.models import ChatUnreadCounter, EventChatMessage
+
+
+class ChatUnreadCounterTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create(username='author')
+        self.reader = User.objects.create(username='reader')
+        self.outsider = User.objects.create(username='outsider')
+        builder = Builder.objects.create(name='Builder')
+        self.work_account = WorkAccount.objects.create(title='Lot 1', builder=builder)
+        self.other_account = WorkAccount.objects.create(title='Lot 2', builder=builder)
+
+    def _messages(self, author, count, work_account=None):
+        # bulk_create: sin post_save, para probar el manager por separado del signal
+        return EventChatMessage.objects.bulk_create([
+            EventChatMessage(work_account=work_account or self.work_account, author=author, message=f'msg {i}')
+            for i in range(count)
+        ])
+
+    def _counter(self, user):
+        return ChatUnreadCounter.objects.get(work_account=self.work_account, user=user)
+
+    def test_message_posted_notifies_only_participants(self):
+        ChatUnreadCounter.objects.mark_read(self.reader.id, self.work_account.id, 0)
+        self._messages(self.author, 1)
+
+        counters = ChatUnreadCounter.objects.message_posted(self.work_account.id, self.author.id)
+
+        self.assertEqual(counters, [(self.reader.id, 1)])
+        # El autor queda suscrito; su cursor lo mueve su cliente con mark_read
+        author_counter = self._counter(self.author)
+        self.assertEqual(author_counter.unread, 0)
+        self.assertEqual(author_counter.last_read_id, 0)
+        self.assertFalse(ChatUnreadCounter.objects.filter(user=self.outsider).exists())
+
+    def test_mark_read_moves_cursor_to_client_last_id(self):
+        ChatUnreadCounter.objects.mark_read(self.reader.id, self.work_account.id, 0)
+        first, second = self._messages(self.author, 2)
+        ChatUnreadCounter.objects.message_posted(self.work_account.id, self.author.id)
+
+        # El cliente sólo muestra el primero: el segundo sigue sin leer
+        unread = ChatUnreadCounter.objects.mark_read(self.reader.id, self.work_account.id, first.id)
+
+        self.assertEqual(unread, 1)
+        counter = self._counter(self.reader)
+        self.assertEqual(counter.last_read_id, first.id)
+        self.assertEqual(counter.unread, 1)
+        self.assertIsNotNone(counter.last_read_at)
+
+        ChatUnreadCounter.objects.mark_read(self.reader.id, self.work_account.id, second.id)
+        self.assertEqual(self._counter(self.reader).unread, 0)
+
+    def test_mark_read_never_moves_back_nor_past_last_message(self):
+        first, second = self._messages(self.author, 2)
+
+        ChatUnreadCounter.objects.mark_read(self.reader.id, self.work_account.id, second.id + 1000)
+        self.assertEqual(self._counter(self.reader).last_read_id, second.id)
+
+        ChatUnreadCounter.objects.mark_read(self.reader.id, self.work_account.id, first.id)
+        self.assertEqual(self._counter(self.reader).last_read_id, second.id)
+
+    def test_unread_counts_uses_cursor_and_ignores_own_messages(self):
+        self._messages(self.author, 2)
+        self._messages(self.reader, 1)
+        self._messages(self.author, 1, work_account=self.other_account)
+        accounts = [self.work_account.id, self.other_account.id]
+
+        # Sin cursor: todos los mensajes de otros
+        self.assertEqual(
+            ChatUnreadCounter.objects.unread_counts(self.reader.id, accounts),
+            {self.work_account.id: 2, self.other_account.id: 1},
+        )
+
+        seen = EventChatMessage.objects.filter(work_account=self.work_account).latest('id')
+        ChatUnreadCounter.objects.mark_read(self.reader.id, self.work_account.id, seen.id)
+        self._messages(self.author, 1)
+
+        self.assertEqual(
+            ChatUnreadCounter.objects.unread_counts(self.reader.id, accounts),
+            {self.work_account.id: 1, self.other_account.id: 1},
+        )
+        self.assertEqual(ChatUnreadCounter.objects.unread_counts(self.reader.id, []), {})
+
+    def test_saving_a_message_updates_counters(self):
+        ChatUnreadCounter.objects.mark_read(self.reader.id, self.work_account.id, 0)
+
+        EventChatMessage.objects.create(work_account=self.work_account, author=self.author, message='hola')
+
+        self.assertEqual(self._counter(self.reader).unread, 1)
+        self.assertEqual(self._counter(self.author).unread, 0)
+
+
+class ChatOutboxRollbackTests(TransactionTestCase):
+    # Transacciones reales: el on_commit de un rollback se descarta y el del commit corre
+
+    def setUp(self):
+        self.author = User.objects.create(username='author')
+        builder = Builder.objects.create(name='Builder')
+        self.work_account = WorkAccount.objects.create(title='Lot 1', builder=builder)
+        self.other_account = WorkAccount.objects.create(title='Lot 2', builder=builder)
+
+    def test_rolled_back_message_is_not_sent_with_the_next_commit(self):
+        with mock.patch('appschedule.signals._channel_layer', return_value=object()), \
+                mock.patch('appschedule.signals._send_many') as send_many:
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    EventChatMessage.objects.create(work_account=self.work_account, author=self.author, message='lost')
+                    raise RuntimeError('rollback')
+
+            with transaction.atomic():
+                EventChatMessage.objects.create(work_account=self.other_account, author=self.author, message='kept')
+
+        send_many.assert_called_once()
+        messages = send_many.call_args.args[0]
+        self.assertEqual([group for group, _payload in messages], [tenant_group(f'work_account_{self.other_account.id}_chat')])
+        self.assertEqual(messages[0][1]['data']['message'], 'kept')
@@ -1,5 +1,6 @@
 from django_filters.rest_framework import DjangoFilterBackend
 from django.shortcuts import get_object_or_404
+from django.conf import settings
 from rest_framework.permissions import ( 
     IsAuthenticated, DjangoModelPermissions, 
     DjangoModelPermissionsOrAnonReadOnly, IsAuthenticated
@@ -16,17 +17,14 @@ from django.db.models import (
 from django.db import connection, transaction                 # OAHP 9/2/2025 fixed validation error
 from django.forms.models import model_to_dict                 # OAHP 9/2/2025 fixed validation error
 from django.db.models.functions import TruncWeek, Coalesce  # OAHP <-
-from appschedule.models import Event, EventChatMessage, EventChatReadStatus             # OAHP
 from django.utils import timezone
 from django.utils.timezone import now            # OAHP
-from asgiref.sync import async_to_sync            # OAHP
-from django.contrib.auth import get_user_model   # OAHP
 from rest_framework.views import APIView
 from rest_framework.pagination import PageNumberPagination
 
 from .models import (
     Event, EventDraft, EventNote, EventChatMessage, Crew, AbsenceReason,
-    EventChatReadStatus, EventImage
+    EventImage, ChatUnreadCounter
 )
 from ctrctsapp.models import Contract
 from crewsapp.models import Category, Job
@@ -35,24 +33,18 @@ from .serializers import (
     AbsenceReasonSerializer, EventImageSerializer
 )
 from .filters import EventDraftFilter
+from .chat_history import CursorError, chat_page, encode_cursor
+from .grid import build_schedule_grid
+from . import publishing
 
-import base64
 from django.utils.dateparse import parse_date
-from django.template.loader import render_to_string
-from collections import defaultdict
 from datetime import timedelta, datetime
-from weasyprint import (
-    CSS,
-    HTML,
-)
-from weasyprint.text.fonts import FontConfiguration
-from channels.layers import get_channel_layer
 
 from django.http import HttpResponse
-import openpyxl
-from openpyxl import Workbook
-from openpyxl.utils import get_column_letter
 from openpyxl.styles import Font, Border, Side, Alignment, PatternFill, PatternFill
+from utils.xlsx_export import ExportSheet, StyledRow, xlsx_response
+from utils.branding import tenant_logo_url
+from utils.pdf import cached_pdf, content_key, pdf_response, render_pdf
 # Image
 from rest_framework.parsers import MultiPartParser, FormParser
 
@@ -90,51 +82,23 @@ class EventViewSet(viewsets.ModelViewSet):
         return EventDraft.objects.select_related('crew').all()
     
     # OAHO 9/2/2025 idempotencia + locking + transacciones
-    def _event_concrete_fields(self):
-        # campos concretos del modelo Event para mapear defaults
-        return {f.name for f in Event._meta.get_fields() if getattr(f, "concrete", False)}
-
-    def _draft_to_defaults(self, draft):
-        excluded = {'event', 'updated_at', 'created_at', 'pk', 'id'}
-        event_fields = self._event_concrete_fields()
-        defaults = {}
-        for f in EventDraft._meta.get_fields():
-            if getattr(f, 'concrete', False) and f.name not in excluded and f.name in event_fields:
-                defaults[f.name] = getattr(draft, f.name)
-        return defaults
-
-    def _publish_draft(self, draft):
+    def _publish_draft(self, draft_id):
         """
-        Publica un draft en modo idempotente:
-        - Si hay draft.event_id => update_or_create por ID
-        - Si no hay => usa clave natural (crew, date, title) para evitar duplicados
-          (Se puede ajustar con lot/address/category, etc.)
+        Publica un draft por el mismo camino que publish_drafts (un solo
+        código de publicación): evento existente por event_id o clave natural
+        (crew, date, title) si no tiene.
         """
-        defaults = self._draft_to_defaults(draft)
-
-        if draft.event_id:
-            event, _created = Event.objects.update_or_create(
-                id=draft.event_id,
-                defaults=defaults
-            )
-        else:
-            # Clave natural mínima (ajústala si tienes otra combinación estable)
-            natural_key = dict(
-                crew=draft.crew,
-                date=draft.date,
-                title=draft.title
-            )
-            event, _created = Event.objects.update_or_create(
-                **natural_key,
-                defaults=defaults
-            )
-
-        logger.info("_publish_draft event_id=%s created=%s draft_id=%s crew=%s date=%s title=%s",
-                    event.id, _created, draft.id, draft.crew.name if draft.crew else None, 
+        with transaction.atomic():
+            draft = (EventDraft.objects
+                     .select_for_update(of=('self',))
+                     .select_related('crew', 'work_account')
+                     .get(pk=draft_id))
+            event_ids, _draft_ids = publishing.publish_drafts([draft])
+
+        logger.info("_publish_draft event_ids=%s draft_id=%s crew=%s date=%s title=%s",
+                    event_ids, draft_id, draft.crew.name if draft.crew else None,
                     draft.date, draft.title)
-
-        draft.delete()
-        return event
+        return event_ids
 
     def create(self, request, *args, **kwargs):
         to_publish = request.data.pop('_post', False)
@@ -146,8 +110,7 @@ class EventViewSet(viewsets.ModelViewSet):
         headers = self.get_success_headers(serializer.data)
 
         if to_publish:
-            draft = self.queryset.get(pk=serializer.data['id'])
-            self._publish_draft(draft)
+            self._publish_draft(serializer.data['id'])
             return Response({'message': 'Draft published and deleted'}, status=status.HTTP_201_CREATED,
                             headers=headers)
         else:
@@ -167,7 +130,7 @@ class EventViewSet(viewsets.ModelViewSet):
             instance._prefetched_objects_cache = {}
 
         if to_publish:
-            self._publish_draft(instance)
+            self._publish_draft(instance.pk)
             return Response({'message': 'Draft updated, published and deleted'}, status=status.HTTP_200_OK)
         else:
             return Response(serializer.data, status=status.HTTP_200_OK)
@@ -205,20 +168,17 @@ class EventViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        logger.info("publish_drafts user=%s range=[%s,%s) count_before=%s",
-                    request.user.id, start_date_str, end_date_str,
-                    EventDraft.objects.filter(date__gte=start_date, end_dt__lt=end_date).count())
-
-        published = 0
         with transaction.atomic():
             # Lock de fila para evitar doble publicación concurrente
-            qs = (EventDraft.objects
-                  .select_for_update(skip_locked=True)
-                  .filter(date__gte=start_date, end_dt__lt=end_date))
+            drafts = (EventDraft.objects
+                      .select_for_update(skip_locked=True, of=('self',))
+                      .select_related('crew', 'work_account')
+                      .filter(date__gte=start_date, end_dt__lt=end_date))
+            event_ids, draft_ids = publishing.publish_drafts(drafts)
 
-            for draft in qs:
-                self._publish_draft(draft)
-                published += 1
+        published = len(draft_ids)
+        logger.info("publish_drafts user=%s range=[%s,%s) published=%s events=%s",
+                    request.user.id, start_date_str, end_date_str, published, len(event_ids))
 
         return Response({'published': published}, status=status.HTTP_200_OK)
 
@@ -234,16 +194,13 @@ class EventsListView(APIView):
             raise ValidationError('start_at must be provided')
         if not end_at:
             raise ValidationError('end_at must be provided')
-        q = Q()
-        q &= (Q(date__lte=start_at,
-                end_dt__gte=start_at) |  # Empieza antes o en el inicio y termina después o en el inicio
-              Q(date__gte=start_at, date__lt=end_at) |  # Empieza dentro del rango
-              Q(date__lte=start_at, end_dt__lt=end_at))  # Termina dentro del rango
-        q &= (Q(date__lte=end_at, end_dt__gte=end_at) |  # Empieza antes o en el fin y termina después o en el fin
-              Q(date__gte=start_at, date__lte=end_at) |  # Empieza dentro del rango
-              Q(end_dt__gte=start_at, end_dt__lte=end_at))  # Termina dentro del rango
-
-        events = Event.objects.select_related('crew').filter(q, deleted=False)
+        start_date = parse_date(start_at)
+        end_date = parse_date(end_at)
+        if not start_date or not end_date:
+            raise ValidationError('start_at and end_at must be in YYYY-MM-DD format')
+
+        # Cruce de rangos [date, end_dt) && [start_at, end_at) (índice GiST)
+        events = Event.objects.select_related('crew').overlapping(start_date, end_date).filter(deleted=False)
         
         # Excluir los eventos que ya tienen draft (solo para usuarios con permiso)
         if request.user.has_perm('appschedule.add_eventdraft'):
@@ -251,14 +208,14 @@ class EventsListView(APIView):
             if len(exclude_list) > 0:
                 events = events.exclude(id__in=exclude_list)
 
-        serializer_event = EventSerializer(events.distinct(), many=True)
+        serializer_event = EventSerializer(events, many=True)
         response = {
             'events': serializer_event.data,
         }
         
         # Agregar drafts si el usuario tiene permiso
         if request.user.has_perm('appschedule.add_eventdraft'):
-            drafts = EventDraft.objects.select_related('crew').filter(q).distinct()
+            drafts = EventDraft.objects.select_related('crew').overlapping(start_date, end_date)
             serializer_draft = EventDraftSerializer(drafts, many=True)
             response['drafts'] = serializer_draft.data
             
@@ -319,8 +276,6 @@ class EventNoteViewSet(viewsets.ViewSet):
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
-User = get_user_model()
-
 class EventChatViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = EventChatMessageSerializer
@@ -335,11 +290,27 @@ class EventChatViewSet(viewsets.ViewSet):
         if not work_account:
             return Response({"error": "Event does not have a work_account associated."}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Filtrar mensajes por work_account
-        queryset = EventChatMessage.objects.filter(work_account=work_account).order_by('timestamp')
-        serializer = self.serializer_class(queryset, many=True)
+        # Página keyset de los mensajes de la obra (ver chat_history)
+        params = request.query_params
+        try:
+            messages, has_more = chat_page(
+                work_account.id,
+                before=params.get('before'),
+                after=params.get('after'),
+                since_id=params.get('since_id'),
+                limit=params.get('limit'),
+            )
+        except CursorError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(serializer.data)
+        serializer = self.serializer_class(messages, many=True)
+        return Response({
+            'results': serializer.data,
+            'has_more': has_more,
+            'before': encode_cursor(messages[0]) if messages else params.get('before'),
+            'after': encode_cursor(messages[-1]) if messages else params.get('after'),
+            'last_id': max((m.id for m in messages), default=None),
+        })
 
     def create(self, request, event_id=None):
         if not event_id:
@@ -353,40 +324,61 @@ class EventChatViewSet(viewsets.ViewSet):
         
         serializer = self.serializer_class(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
-        message = serializer.save(work_account=work_account, event=event)
+        # Los contadores de no leídos y los avisos salen del post_save (signals.py)
+        serializer.save(work_account=work_account, event=event)
 
-        # Notify other users via WebSocket based on latest read message
-        channel_layer = get_channel_layer()
-        other_users = User.objects.exclude(id=request.user.id)
+        return Response(serializer.data, status=201)
 
-        for user in other_users:
-            # Get the latest message that the user has read
-            last_read_entry = EventChatReadStatus.objects.filter(user=user).order_by('-message__timestamp').first()
 
-            unread_count = (
-                EventChatMessage.objects
-                .filter(work_account=work_account)
-                .exclude(author=user)  # No contar sus propios mensajes como no leídos
-            )
 
-            if last_read_entry:
-                unread_count = unread_count.filter(timestamp__gt=last_read_entry.message.timestamp)
+def _schedule_pdf_cell(event, day, is_start):
+    if event.is_absence and event.absence_reason:
+        absence_text = f"🛑 Absence: {event.absence_reason.name}"
+        if event.description:
+            absence_text += f" – {event.description}"
+        return absence_text
+    return event if is_start else "Finishing up work"
 
-            count = unread_count.count()
 
-            group_name = f"user_{user.id}_unread"
-            async_to_sync(channel_layer.group_send)(
-                group_name,
-                {
-                    "type": "unread.updated",
-                    "event_id": event.id,
-                    "count": count,
-                    "from_user_id": request.user.id,
-                }
-            )
+def render_schedule_pdf(start_date, end_date, logo_url):
+    """PDF del schedule entre start_date y end_date (no inclusive)."""
+    # Consulta eventos cruzados en el rango
+    events = (Event.objects.select_related('crew', 'crew__category', 'absence_reason')
+              .overlapping(start_date, end_date).filter(deleted=False))
 
-        return Response(serializer.data, status=201)
+    # Todos los crews activos agrupados por categoría (aunque no tengan eventos)
+    all_crews = Crew.objects.select_related('category').filter(status=True)
+    grid = build_schedule_grid(events, start_date, end_date, _schedule_pdf_cell, crews=all_crews)
 
+    context = {
+        'categorized_events': grid.categories,
+        'date_range': f"{start_date.strftime('%b %d')} – {(end_date - timedelta(days=1)).strftime('%b %d, %Y')}",
+        'days': grid.days,
+        'logo_url': logo_url
+    }
+
+    return render_pdf('schedule_pdf.html', context)
+
+
+def schedule_pdf_key(start_date, end_date, logo_url):
+    """
+    Clave de cache del schedule: eventos que tocan el rango (updated_at cubre
+    cualquier edición), con los nombres relacionados que se imprimen, y crews
+    activos con su categoría.
+    """
+    events = (
+        Event.objects
+        .overlapping(start_date, end_date)
+        .filter(deleted=False)
+        .order_by('id')
+        .values_list('id', 'updated_at', 'title', 'absence_reason__name', 'crew__name', 'crew__category__name')
+    )
+    crews = (
+        Crew.objects.filter(status=True)
+        .order_by('id')
+        .values_list('id', 'name', 'category__name')
+    )
+    return content_key(start_date, end_date, logo_url, list(events), list(crews))
 
 
 @permission_classes([IsAuthenticated])
@@ -402,93 +394,17 @@ def download_schedule_pdf(request):
     start_date = parse_date(start_at)
     end_date = parse_date(end_at)
 
-    # end_date se toma como tope, no inclusive
-    days = []
-    current = start_date
-    while current < end_date:
-        days.append(current)
-        current += timedelta(days=1)
-
-    # print("🗖 Days to render:")
-    for d in days:
-        d.strftime('%A, %b %d')
-
-    # Consulta eventos cruzados en el rango
-    q = Q()
-    q &= (Q(date__lte=start_date, end_dt__gte=start_date) |
-          Q(date__gte=start_date, date__lt=end_date) |
-          Q(date__lte=start_date, end_dt__lt=end_date))
-    q &= (Q(date__lte=end_date, end_dt__gte=end_date) |
-          Q(date__gte=start_date, date__lte=end_date) |
-          Q(end_dt__gte=start_date, end_dt__lte=end_date))
-
-    events = Event.objects.select_related('crew', 'crew__category').filter(q, deleted=False)
+    if not start_date or not end_date:
+        return Response({'error': 'start_at and end_at must be YYYY-MM-DD'}, status=400)
 
-    # Todos los crews activos agrupados por categoría
-    all_crews = Crew.objects.select_related('category').filter(status=True)
-    categorized_events = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
-
-    for crew in all_crews:
-        if crew.category:
-            categorized_events[crew.category.name][crew.name]  # inicializar aunque no tenga eventos
-
-    for event in events:
-        if not event.crew or not event.crew.category:
-            continue
-
-        crew_name = event.crew.name
-        category_name = event.crew.category.name
-
-        # Expande cualquier evento, marcando inicio y fin
-        current = event.date
-        while current < event.end_dt:
-            if start_date <= current <= end_date:
-                if event.is_absence and event.absence_reason:
-                    absence_text = f"🛑 Absence: {event.absence_reason.name}"
-                    if event.description:
-                        absence_text += f" – {event.description}"
-                    categorized_events[category_name][crew_name][current].append(absence_text)
-                else:
-                    if current == event.date:
-                        categorized_events[category_name][crew_name][current].append(event)
-                    else:
-                        categorized_events[category_name][crew_name][current].append("Finishing up work")
-            current += timedelta(days=1)
-
-    categorized_events_clean = {
-        cat: {
-            crew: dict(days)
-            for crew, days in crews.items()
-        }
-        for cat, crews in categorized_events.items()
-    }
-
-    domain = request.get_host()
-    if 'phoenixelectricandair' in domain:
-        tenant_logo = 'media/tenant_logos/Logo-phoenix-w.png'
-    elif '192.168.0.248:8000' in domain or 'division16llc' in domain:
-        tenant_logo = 'media/tenant_logos/Logo-division-w.png'
-    else:
-        tenant_logo = 'media/tenant_logos/default-logo.png'
-
-    logo_url = request.build_absolute_uri('/' + tenant_logo)
-
-    context = {
-        'categorized_events': categorized_events_clean,
-        'date_range': f"{start_date.strftime('%b %d')} – {(end_date - timedelta(days=1)).strftime('%b %d, %Y')}",
-        'days': days,
-        'logo_url': logo_url
-    }
-
-    html = render_to_string('schedule_pdf.html', context)
-    font_config = FontConfiguration()
-    pdf_file = HTML(string=html).write_pdf(font_config=font_config)
-
-    return Response({
-        'file': base64.b64encode(pdf_file),
-        'filename': f'schedule_{start_at}_to_{end_at}.pdf',
-        'file_type': 'application/pdf'
-    }, status=200)
+    logo_url = tenant_logo_url(request)
+    # Los rangos los elige el cliente: el directorio se poda a los más usados
+    pdf = cached_pdf(
+        'schedule', f'{start_date}_{end_date}', schedule_pdf_key(start_date, end_date, logo_url),
+        lambda: render_schedule_pdf(start_date, end_date, logo_url),
+        max_files=settings.PDF_CACHE_SCHEDULE_MAX_FILES,
+    )
+    return pdf_response(request, pdf, f'schedule_{start_at}_to_{end_at}.pdf')
 
 
 class MyEventsView(APIView):
@@ -516,16 +432,24 @@ class MyEventsView(APIView):
 
         queryset = Event.objects.select_related('crew', 'crew__category').filter(q).distinct()
 
-        # Subquery para contar mensajes NO leídos por usuario
+        # Cursor de lectura del usuario en el chat de la obra (0 = nunca lo abrió)
+        read_cursor = ChatUnreadCounter.objects.filter(
+            user=user, work_account=OuterRef('work_account')
+        ).values('last_read_id')[:1]
+
+        # Mensajes NO leídos: conteo por rango id > cursor (índice work_account, id)
         unread_subquery = EventChatMessage.objects.filter(
-            event=OuterRef('pk')
+            work_account=OuterRef('work_account'),
+            id__gt=OuterRef('read_cursor'),
         ).exclude(
-            read_statuses__user=user
-        ).values('event').annotate(
+            author=user
+        ).values('work_account').annotate(
             count=Count('id')
         ).values('count')[:1]
 
         queryset = queryset.annotate(
+            read_cursor=Coalesce(Subquery(read_cursor), Value(0))
+        ).annotate(
             unread_count=Subquery(unread_subquery, output_field=IntegerField())
         ).annotate(
             unread_count_fixed=Coalesce('unread_count', Value(0))
@@ -558,76 +482,43 @@ def export_schedule_excel(request):
     except:
         return HttpResponse("Invalid dates", status=400)
 
-    # Filtro robusto para eventos cruzados
-    q = Q()
-    q &= (Q(date__lte=start_date, end_dt__gte=start_date) |
-          Q(date__gte=start_date, date__lte=end_date))
-    q &= (Q(date__lte=end_date, end_dt__gte=end_date) |
-          Q(end_dt__gte=start_date, end_dt__lte=end_date))
-
-    events = Event.objects.filter(q, deleted=False).select_related("crew", "crew__category").order_by("crew__name")
+    # Eventos cruzados con el rango
+    events = (Event.objects.overlapping(start_date, end_date).filter(deleted=False)
+              .select_related("crew", "crew__category").order_by("crew__name"))
+
+    def cell(event, day, is_start):
+        info = f"{event.title}"
+        if event.extended_service:
+            info += " ⚡Ext"
+        if event.description:
+            info += f" - {event.description}"
+        return info
+
+    grid = build_schedule_grid(events, start_date, end_date, cell, uncategorized="Uncategorized")
+    days = grid.days
+
+    # Crear workbook (una hoja por categoría)
+    header = ["Crew"] + [d.strftime("%Y-%m-%d") for d in days]
+    header_style = {
+        "font": Font(bold=True),
+        "alignment": Alignment(horizontal='center', vertical='center'),
+        "fill": PatternFill(start_color="F3F3F3", end_color="F3F3F3", fill_type="solid"),
+    }
+    row_style = {"alignment": Alignment(wrap_text=True, vertical='top')}
 
-    # Construir días
-    days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days)]
+    def crew_rows(crews):
+        for crew_name, slots in crews.items():
+            yield [crew_name] + ["\n".join(cells) for cells in slots]
 
-    # Agrupar eventos por categoría, crew y día (ajustando end_dt - 1 día)
-    categorized_events = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
-    
-    for event in events:
-        category = event.crew.category.name if hasattr(event.crew, "category") and event.crew.category else "Uncategorized"
-        crew_name = event.crew.name
-        adjusted_end = event.end_dt - timedelta(days=1)  # Aquí - 1 dia
-        event_range = [event.date + timedelta(days=i) for i in range((adjusted_end - event.date).days + 1)]
-        for day in days:
-            if day in event_range:
-                info = f"{event.title}"
-                if event.extended_service:
-                    info += " ⚡Ext"
-                if event.description:
-                    info += f" - {event.description}"
-                categorized_events[category][crew_name][day].append(info)
-
-    # Crear workbook
-    wb = openpyxl.Workbook()
-    wb.remove(wb.active)  # borrar la hoja vacía por defecto
-
-    for category, crews in categorized_events.items():
-        ws = wb.create_sheet(title=category[:31])  # máximo 31 caracteres
-        header = ["Crew"] + [d.strftime("%Y-%m-%d") for d in days]
-        ws.append(header)
-
-        # Aplicar negrita al header
-        for col in range(1, len(header) + 1):
-            cell = ws.cell(row=1, column=col)
-            cell.font = Font(bold=True)
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.fill = PatternFill(start_color="F3F3F3", end_color="F3F3F3", fill_type="solid")
-
-        for crew_name, events_by_day in crews.items():
-            row = [crew_name]
-            for d in days:
-                daily_events = events_by_day[d]
-                cell_text = "\n".join(daily_events) if daily_events else ""
-                row.append(cell_text)
-            ws.append(row)
-
-        # Ajustar estilos
-        for row in ws.iter_rows(min_row=2, max_row=ws.max_row):
-            for cell in row:
-                cell.alignment = Alignment(wrap_text=True, vertical='top')
-        
-        for col in range(1, len(header) + 1):
-            ws.column_dimensions[get_column_letter(col)].width = 20
+    sheets = [
+        ExportSheet(category, header, crew_rows(crews),
+                    header_style=header_style, row_style=row_style, widths=[20] * len(header))
+        for category, crews in grid.categories.items()
+    ]
 
     # Devolver el archivo
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-    )
     filename = f"schedule_{start_date}_to_{(end_date - timedelta(days=1))}.xlsx"
-    print(filename)
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    wb.save(response)
-    return response
+    return xlsx_response(sheets, filename)
 
 class AbsenceReasonViewSet(viewsets.ModelViewSet):
     queryset = AbsenceReason.objects.filter(is_active=True)
@@ -791,67 +682,43 @@ class WeeklySupervisorStatsExcelView(APIView):
             weeks_per_category[category].add(week_str)
 
         # Crear archivo Excel
-        wb = Workbook()
-        wb.remove(wb.active)
-
         bold = Font(bold=True)
         center = Alignment(horizontal="center", vertical="center")
         border = Border(
             left=Side(style="thin"), right=Side(style="thin"),
             top=Side(style="thin"), bottom=Side(style="thin")
         )
+        emphasis = {"font": bold, "alignment": center, "border": border}
 
-        for category, supervisor_data in categorized_data.items():
-            ws = wb.create_sheet(title=category[:31])
-            sorted_weeks = sorted(weeks_per_category[category])
-            supervisors = sorted(supervisor_data.keys())
-
-            # Header
-            ws.append(["Week"] + supervisors)
-            for cell in ws[1]:
-                cell.font = bold
-                cell.alignment = center
-                cell.border = border
-
+        def category_rows(supervisor_data, sorted_weeks, supervisors):
             # Data por semana
             for week in sorted_weeks:
-                row = [week]
-                for supervisor in supervisors:
-                    row.append(supervisor_data[supervisor].get(week, 0))
-                ws.append(row)
+                yield [week] + [supervisor_data[supervisor].get(week, 0) for supervisor in supervisors]
 
             # Fila separadora
-            sep_row = ["" for _ in range(len(supervisors) + 1)]
-            ws.append(sep_row)
+            yield ["" for _ in range(len(supervisors) + 1)]
 
             # Totales por supervisor
-            total_row = ["TOTAL"]
-            for supervisor in supervisors:
-                total = sum(supervisor_data[supervisor].values())
-                total_row.append(total)
-            ws.append(total_row)
-
-            # Estilo a la fila TOTAL
-            last_row_idx = ws.max_row
-            for cell in ws[last_row_idx]:
-                cell.font = bold
-                cell.alignment = center
-                cell.border = border
-
-            # Ancho de columnas
-            for col in ws.columns:
-                max_len = max(len(str(cell.value or "")) for cell in col)
-                col_letter = col[0].column_letter
-                ws.column_dimensions[col_letter].width = max_len + 2
+            yield StyledRow(
+                ["TOTAL"] + [sum(supervisor_data[supervisor].values()) for supervisor in supervisors],
+                **emphasis
+            )
+
+        sheets = []
+        for category, supervisor_data in categorized_data.items():
+            sorted_weeks = sorted(weeks_per_category[category])
+            supervisors = sorted(supervisor_data.keys())
+            sheets.append(ExportSheet(
+                category,
+                ["Week"] + supervisors,
+                category_rows(supervisor_data, sorted_weeks, supervisors),
+                header_style=emphasis,
+                max_width=None,
+            ))
 
         # Retorno de archivo como respuesta HTTP
-        response = HttpResponse(
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
         filename = f"supervisor_report_{today}.xlsx"
-        response["Content-Disposition"] = f'attachment; filename="{filename}"'
-        wb.save(response)
-        return response
+        return xlsx_response(sheets, filename)
     
 
 @api_view(['GET'])
@@ -871,15 +738,17 @@ def unread_chat_counts(request):
         
     # print(f"OjO  Usuario {user.username} tiene acceso a {len(jobs)} comunidades")
     
-    unread_counts = (
-        EventChatMessage.objects
-        .filter(event__in=event_queryset)
-        .exclude(read_statuses__user=user)
-        .values('event')
-        .annotate(count=Count('id'))
+    # Conteo por obra (el chat es por work_account) y se reparte a sus eventos
+    event_accounts = dict(
+        event_queryset.filter(work_account__isnull=False).values_list('id', 'work_account_id')
     )
+    counts = ChatUnreadCounter.objects.unread_counts(user.id, set(event_accounts.values()))
 
-    result = {item['event']: item['count'] for item in unread_counts}
+    result = {
+        event_id: counts[work_account_id]
+        for event_id, work_account_id in event_accounts.items()
+        if counts.get(work_account_id)
+    }
     return Response(result)
 
 
@@ -889,12 +758,14 @@ def mark_chat_read(request, event_id):
     user = request.user
     event = get_object_or_404(Event, pk=event_id)
 
-    unread_messages = EventChatMessage.objects.filter(
-        event=event
-    ).exclude(read_statuses__user=user)
+    # El cursor es el último mensaje que muestra el cliente (last_id de la lista)
+    try:
+        last_id = int(request.data.get('last_id'))
+    except (TypeError, ValueError):
+        return Response({"error": "last_id is required."}, status=status.HTTP_400_BAD_REQUEST)
 
-    for msg in unread_messages:
-        EventChatReadStatus.objects.get_or_create(user=user, message=msg)
+    if event.work_account_id:
+        ChatUnreadCounter.objects.mark_read(user.id, event.work_account_id, last_id)
 
     return Response({"status": "read updated"})
 
@@ -7,6 +7,7 @@ from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
 from appinventory.models import Product, UnitOfMeasure, Warehouse, PriceType, ProductBrand
+from apptransactions.posting import is_posting_deferred
 from ctrctsapp.models import Builder, Job, HouseModel
 
 User = get_user_model()
@@ -219,10 +220,11 @@ class Document(models.Model):
         if self.document_type.is_purchase and (not self.builder or not self.builder.is_supplier()):
             raise ValidationError("Selected builder is not a supplier.")
 
-    def calculate_totals(self):
+    def calculate_totals(self, lines=None):
+        # `lines` permite reutilizar líneas ya cargadas (ver apptransactions.posting)
         total = 0
         total_discount = 0
-        for line in self.lines.all():
+        for line in (self.lines.all() if lines is None else lines):
             total += line.final_price or 0
             discount = line.unit_price * line.quantity * (line.discount_percentage / 100)
             total_discount += discount
@@ -298,8 +300,8 @@ class DocumentLine(models.Model):
 
         super().save(*args, **kwargs)
 
-        # Recalcular totales del documento
-        if self.document:
+        # Recalcular totales del documento (salvo que la contabilización esté diferida)
+        if self.document and not is_posting_deferred():
             self.document.calculate_totals()
 
     def __str__(self):
@@ -0,0 +1,226 @@
+"""
+Motor de contabilización de inventario a nivel de documento.
+
+En lugar de que cada DocumentLine.save() dispare su propio InventoryMovement,
+un Stock.get_or_create y un recálculo de totales, este módulo reconcilia el
+documento completo de una sola vez:
+
+- Compara los movimientos existentes del documento con los que deberían
+  existir según sus líneas actuales (y su estado is_active).
+- Elimina los movimientos obsoletos con un solo DELETE y crea los nuevos con
+  un solo bulk_create.
+- Agrega el impacto neto por (producto, almacén) y lo aplica con un único
+  upsert ``quantity = quantity + delta`` (Stock.objects.add_quantities).
+- Recalcula los totales del documento una única vez.
+
+check_stock_availability() valida en bloque las salidas antes de contabilizar.
+
+Todo ocurre dentro de una transacción, de modo que el costo escala con la
+cantidad de SKUs distintos y no con la cantidad de líneas.
+
+Uso típico (ver DocumentSerializer):
+
+    with deferred_posting():
+        ...  # crear/actualizar/eliminar líneas
+        post_document(doc)
+"""
+
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q
+
+from appinventory.conversions import get_conversion_table
+from appinventory.models import InventoryMovement, Stock
+
+logger = logging.getLogger(__name__)
+
+_state = threading.local()
+
+
+@contextmanager
+def deferred_posting():
+    """
+    Suspende la contabilización por línea (señales de DocumentLine y
+    recálculo de totales en DocumentLine.save) mientras dure el bloque.
+    Quien lo use es responsable de llamar a post_document() al final.
+    """
+    depth = getattr(_state, "depth", 0)
+    _state.depth = depth + 1
+    try:
+        yield
+    finally:
+        _state.depth = depth
+
+
+def is_posting_deferred():
+    """Indica si el hilo actual está dentro de un bloque deferred_posting()."""
+    return getattr(_state, "depth", 0) > 0
+
+
+def _same_effect(movement, wanted):
+    return (
+        movement.product_id == wanted.product_id
+        and movement.warehouse_id == wanted.warehouse_id
+        and movement.unit_id == wanted.unit_id
+        and movement.quantity == wanted.quantity
+        and movement.movement_type == wanted.movement_type
+    )
+
+
+def check_stock_availability(document, lines, released_line_ids=None):
+    """
+    Valida en bloque la disponibilidad de stock para las líneas de salida.
+
+    Agrupa lo solicitado (en unidad de referencia) por (producto, almacén),
+    lee el stock disponible en una sola consulta con SELECT ... FOR UPDATE
+    sobre esas filas (debe llamarse dentro de una transacción, que mantiene el
+    bloqueo hasta contabilizar) y devuelve todos los faltantes a la vez como
+    {índice_de_línea: error}. Un dict vacío significa que hay stock suficiente.
+
+    El stock ya descontado por este documento para `released_line_ids`
+    (por defecto, las líneas recibidas que ya existen) cuenta como disponible.
+    """
+    doc_type = document.document_type
+    if doc_type.stock_movement != -1 or doc_type.allow_negative_sales or not document.is_active:
+        return {}
+
+    lines = list(lines)
+    if released_line_ids is None:
+        released_line_ids = [line.id for line in lines if line.id]
+
+    conversions = get_conversion_table()
+    line_qtys = conversions.convert_many((line.product_id, line.unit_id, line.quantity) for line in lines)
+
+    errors = {}
+    requested = defaultdict(Decimal)
+    first_index = {}
+    for index, (line, qty) in enumerate(zip(lines, line_qtys)):
+        if not line.warehouse_id:
+            errors[index] = {"warehouse": "Se requiere almacén para validar stock."}
+            continue
+        key = (line.product_id, line.warehouse_id)
+        requested[key] += qty
+        first_index.setdefault(key, index)
+
+    available = Stock.objects.lock_available(requested)
+
+    if document.pk and released_line_ids:
+        released = [
+            movement for movement in InventoryMovement.objects.filter(line_id__in=released_line_ids)
+            if (movement.product_id, movement.warehouse_id) in requested
+        ]
+        released_qtys = conversions.convert_many(
+            (movement.product_id, movement.unit_id, movement.quantity) for movement in released
+        )
+        for movement, qty in zip(released, released_qtys):
+            key = (movement.product_id, movement.warehouse_id)
+            available[key] = available.get(key, Decimal("0")) - qty * movement.movement_type
+
+    for key, requested_ref in requested.items():
+        available_ref = available.get(key, Decimal("0"))
+        if available_ref >= requested_ref:
+            continue
+        index = first_index[key]
+        product_name = lines[index].product.name
+        errors[index] = {
+            "quantity": {
+                "error_type": "insufficient_stock",
+                "product_name": product_name,
+                "available": str(available_ref),
+                "requested": str(requested_ref),
+                "document_type": doc_type.type_code,
+                "message": f"{product_name}: Stock insuficiente. Disponible: {available_ref}, solicitado(ref): {requested_ref}. El tipo de documento '{doc_type.type_code}' no permite ventas sin stock."
+            }
+        }
+    return errors
+
+
+@transaction.atomic
+def post_document(document, reason_suffix=""):
+    """
+    Reconcilia los movimientos de inventario, el stock y los totales de un
+    documento con el estado actual de sus líneas.
+
+    Es idempotente: llamarlo dos veces seguidas no produce cambios en la
+    segunda llamada. Un documento anulado (is_active=False) queda sin
+    movimientos y con su impacto en stock revertido.
+    """
+    doc_type = document.document_type
+    movement_type = doc_type.stock_movement
+    reason = f"{doc_type.description} #{document.id}{reason_suffix}"
+
+    lines = list(document.lines.all())
+
+    existing = defaultdict(list)
+    for movement in (
+        InventoryMovement.objects
+        .filter(Q(line_id__in=[line.id for line in lines]) | Q(document=str(document.id), line_id__isnull=False))
+    ):
+        existing[movement.line_id].append(movement)
+
+    # Conversión a unidad de referencia de todas las filas en una pasada
+    existing_movements = [movement for movements in existing.values() for movement in movements]
+    qtys = get_conversion_table().convert_many(
+        [(line.product_id, line.unit_id, line.quantity) for line in lines]
+        + [(movement.product_id, movement.unit_id, movement.quantity) for movement in existing_movements]
+    )
+    line_qtys = dict(zip([line.id for line in lines], qtys))
+    movement_qtys = dict(zip([movement.id for movement in existing_movements], qtys[len(lines):]))
+
+    deltas = defaultdict(Decimal)
+    stale_ids = []
+    new_movements = []
+
+    def discard(movements):
+        for movement in movements:
+            stale_ids.append(movement.id)
+            qty = movement_qtys[movement.id]
+            deltas[(movement.product_id, movement.warehouse_id)] -= qty * movement.movement_type
+
+    for line in lines:
+        current = existing.pop(line.id, [])
+
+        wanted = None
+        if document.is_active and line.warehouse_id and movement_type != 0:
+            wanted = InventoryMovement(
+                line_id=line.id,
+                product_id=line.product_id,
+                warehouse_id=line.warehouse_id,
+                quantity=line.quantity,  # Cantidad original sin convertir
+                movement_type=movement_type,
+                unit_id=line.unit_id,
+                reason=reason,
+                document=str(document.id),
+                created_by_id=document.created_by_id,
+            )
+
+        if wanted and len(current) == 1 and _same_effect(current[0], wanted):
+            continue
+
+        discard(current)
+        if wanted:
+            new_movements.append(wanted)
+            qty = line_qtys[line.id]
+            deltas[(wanted.product_id, wanted.warehouse_id)] += qty * movement_type
+
+    # Movimientos de líneas que ya no existen en el documento
+    for movements in existing.values():
+        discard(movements)
+
+    if stale_ids:
+        InventoryMovement.objects.filter(id__in=stale_ids).delete()
+    if new_movements:
+        InventoryMovement.objects.bulk_create(new_movements)
+    Stock.objects.add_quantities(deltas)
+
+    document.calculate_totals(lines)
+
+    logger.info(
+        "Documento %s contabilizado: %s movimiento(s) nuevos, %s eliminados, %s par(es) de stock",
+        document.id, len(new_movements), len(stale_ids), len([d for d in deltas.values() if d]),
+    )
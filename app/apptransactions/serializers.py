@@ -1,5 +1,4 @@
 
-from decimal import Decimal
 import logging
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
@@ -9,7 +8,8 @@ from apptransactions.models import (
     DocumentType, PartyType, PartyCategory, Party, Document, DocumentLine,
     WorkAccount, TransactionFavorite
 )
-from appinventory.models import Stock, PriceType
+from appinventory.models import PriceType
+from apptransactions.posting import check_stock_availability, deferred_posting, is_posting_deferred, post_document
 
 logger = logging.getLogger(__name__)
 
@@ -130,48 +130,32 @@ def _validate_stock_out(line: "DocumentLine"):
     doc = line.document
     if not doc or not doc.document_type:
         return
-    if doc.document_type.stock_movement != -1:
-        return  # sólo salidas
 
-    warehouse = line.warehouse or doc.warehouse
-    if not warehouse:
-        raise serializers.ValidationError({"warehouse": "Se requiere almacén para validar stock."})
-    
-    # Stock disponible en referencia (Stock ya está en unidad de referencia)
-    from django.db.models import Sum
-    available = (
-        Stock.objects
-        .filter(product=line.product, warehouse=warehouse)
-        .aggregate(total=Sum("quantity"))["total"] or Decimal("0")
-    )
-
-    if line.quantity is None or line.quantity <= 0:
+    if doc.document_type.stock_movement == -1 and (line.quantity is None or line.quantity <= 0):
         raise serializers.ValidationError({"quantity": "La cantidad debe ser > 0."})
 
-    # Convertir solicitado a unidad de referencia
-    try:
-        from appinventory.helpers import convert_to_reference_unit
-        requested_ref = convert_to_reference_unit(line.product, line.unit, line.quantity) if line.unit else line.quantity
-    except Exception as e:
-        raise serializers.ValidationError({"unit": f"Error al convertir la cantidad: {e}"})
-
-    # Verificar si se permite venta negativa
-    if Decimal(available) < Decimal(requested_ref):
-        # Si el documento permite ventas negativas, solo mostrar advertencia
-        if doc.document_type.allow_negative_sales:
-            return  # Permitir la transacción
-            
-        # Si no permite ventas negativas, rechazar la transacción
-        raise serializers.ValidationError({
-            "quantity": {
-                "error_type": "insufficient_stock",
-                "product_name": line.product.name,
-                "available": str(available),
-                "requested": str(requested_ref),
-                "document_type": doc.document_type.type_code,
-                "message": f"{line.product.name}: Stock insuficiente. Disponible: {available}, solicitado(ref): {requested_ref}. El tipo de documento '{doc.document_type.type_code}' no permite ventas sin stock."
-            }
-        })
+    # Mismo servicio que usa DocumentSerializer para todas las líneas juntas
+    errors = check_stock_availability(doc, [line])
+    if errors:
+        raise serializers.ValidationError(errors[0])
+
+
+def _validate_lines_stock_out(doc, lines_data, released_line_ids=None):
+    """Valida el stock de todas las líneas anidadas en una sola pasada (ver posting)."""
+    temp_lines = [
+        DocumentLine(
+            id=ld.get('id'),
+            document=doc,
+            product=ld.get('product'),
+            quantity=ld.get('quantity'),
+            unit=ld.get('unit'),
+            warehouse=ld.get('warehouse'),
+        )
+        for ld in lines_data
+    ]
+    errors = check_stock_availability(doc, temp_lines, released_line_ids)
+    if errors:
+        raise serializers.ValidationError({"lines": [errors.get(idx, {}) for idx in range(len(temp_lines))]})
 
 # DocumentLine
 class DocumentLineSerializer(serializers.ModelSerializer):
@@ -221,7 +205,9 @@ class DocumentLineSerializer(serializers.ModelSerializer):
         # Aplicamos cambios temporales para validar stock
         for k, v in validated_data.items():
             setattr(instance, k, v)
-        _validate_stock_out(instance)
+        # Dentro de DocumentSerializer el stock ya se validó para todas las líneas juntas
+        if not is_posting_deferred():
+            _validate_stock_out(instance)
         try:
             instance.full_clean()
         except DjangoValidationError as e:
@@ -296,6 +282,7 @@ class DocumentSerializer(serializers.ModelSerializer):
         return attrs
 
     @transaction.atomic
+    @deferred_posting()
     def create(self, validated_data):
         lines_data = validated_data.pop("lines", None)
         
@@ -438,25 +425,8 @@ class DocumentSerializer(serializers.ModelSerializer):
             if any(all_line_errors):
                 raise serializers.ValidationError({"lines": all_line_errors})
             
-            # Ahora validar stock para TODAS las líneas después de que el documento esté creado
-            stock_errors = []
-            for idx, ld in enumerate(lines_data):
-                try:
-                    # Crear una instancia temporal para validar stock
-                    temp_line = DocumentLine(
-                        document=doc,
-                        product=ld.get('product'),
-                        quantity=ld.get('quantity'),
-                        unit=ld.get('unit'),
-                        warehouse=ld.get('warehouse')
-                    )
-                    _validate_stock_out(temp_line)
-                except Exception as e:
-                    stock_errors.append(str(e))
-            
-            # Si hay errores de stock, lanzar todos los errores juntos
-            if stock_errors:
-                raise serializers.ValidationError({"lines": stock_errors})
+            # Ahora validar stock para TODAS las líneas juntas (una consulta, con bloqueo de filas)
+            _validate_lines_stock_out(doc, lines_data, released_line_ids=[])
             
             # Si todas las líneas son válidas, crear todas las líneas
             for idx, ld in enumerate(lines_data):
@@ -476,11 +446,12 @@ class DocumentSerializer(serializers.ModelSerializer):
                 line_ser.is_valid(raise_exception=True)  # ✅ Validar antes de guardar
                 line_instance = line_ser.save()
 
-        # Recalcular totales
-        doc.calculate_totals()
+        # Contabilizar inventario y recalcular totales una sola vez para todo el documento
+        post_document(doc)
         return doc
 
     @transaction.atomic
+    @deferred_posting()
     def update(self, instance, validated_data):
         lines_data = validated_data.pop("lines", None)
 
@@ -579,6 +550,10 @@ class DocumentSerializer(serializers.ModelSerializer):
             if any(all_line_errors):
                 raise serializers.ValidationError({"lines": all_line_errors})
 
+            # Validar stock de todas las líneas juntas; lo ya descontado por las
+            # líneas actuales del documento (editadas o eliminadas) vuelve a estar disponible
+            _validate_lines_stock_out(instance, lines_data, released_line_ids=list(existing.keys()))
+
             # Si todas las líneas son válidas, crear/actualizar todas las líneas
             for ld in lines_data:
                 line_id = ld.get("id")
@@ -616,8 +591,8 @@ class DocumentSerializer(serializers.ModelSerializer):
             if to_delete:
                 DocumentLine.objects.filter(id__in=to_delete).delete()
 
-        # Recalcular totales
-        instance.calculate_totals()
+        # Contabilizar inventario y recalcular totales una sola vez para todo el documento
+        post_document(instance)
         return instance
 
 
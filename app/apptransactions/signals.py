@@ -10,17 +10,19 @@ Funcionalidades:
 - Manejo automático de entradas/salidas de productos en almacenes
 - Soporte para anulación/reactivación de documentos (is_active)
 - Consistencia de datos mediante transacciones atómicas
+- Contabilización por documento (apptransactions.posting) para altas/ediciones masivas
 
 Autor: Sistema Chalan-Pro
 Versión: 2.0 - Con soporte para actualizaciones correctas de stock
 """
 
-from decimal import Decimal
 from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.db import transaction
 from apptransactions.models import DocumentLine, Document
 from appinventory.models import InventoryMovement, Stock
+from apptransactions.posting import is_posting_deferred, post_document
+from utils.tenant_cache import bump_version_on_commit
 
 
 @receiver(post_save, sender=DocumentLine, dispatch_uid="docline_create_inventory_movement")
@@ -34,7 +36,12 @@ def create_inventory_movement(sender, instance, created, **kwargs):
     - Verifica el estado is_active del documento padre
     """
     print("2 🧼 apptransactions\\signals.py -> create_inventory_movement()")
-    
+
+    if is_posting_deferred():
+        return  # post_document() contabilizará todas las líneas del documento juntas
+
+    bump_version_on_commit("inventory_analytics")
+
     def handle_movement():
         try:
             # ✅ Verificar si el documento está activo
@@ -59,24 +66,18 @@ def create_inventory_movement(sender, instance, created, **kwargs):
                 print(f"♻️ Actualizando movimiento existente para línea {instance.id}")
                 
                 # ✅ PASO 1: Revertir el impacto anterior en el stock
-                # Obtener el stock actual
-                old_stock, _ = Stock.objects.get_or_create(
-                    product=movement.product,
-                    warehouse=movement.warehouse,
-                    defaults={'quantity': Decimal('0.00')}
-                )
-                
                 # Calcular cantidad convertida del movimiento anterior
-                from appinventory.helpers import convert_to_reference_unit
-                old_converted_qty = convert_to_reference_unit(
-                    movement.product, 
-                    movement.unit, 
+                from appinventory.conversions import to_reference_quantity
+                old_converted_qty = to_reference_quantity(
+                    movement.product_id,
+                    movement.unit_id,
                     movement.quantity
                 )
                 
-                # Revertir el cambio anterior
-                old_stock.quantity -= old_converted_qty * movement.movement_type
-                old_stock.save()
+                # Revertir el cambio anterior (upsert atómico, sin leer el stock)
+                Stock.objects.add_quantities({
+                    (movement.product_id, movement.warehouse_id): -old_converted_qty * movement.movement_type
+                })
                 print(f"🔄 Stock revertido: -{old_converted_qty * movement.movement_type} para {movement.product.name}")
                 
                 # ✅ PASO 2: Actualizar el movimiento con los nuevos valores
@@ -123,6 +124,11 @@ def delete_inventory_movement(sender, instance, **kwargs):
     Elimina movimientos de inventario cuando se elimina una línea de documento.
     El delete() del InventoryMovement automáticamente revertirá el stock.
     """
+    if is_posting_deferred():
+        return  # post_document() descarta los movimientos de líneas eliminadas
+
+    bump_version_on_commit("inventory_analytics")
+
     def handle_deletion():
         try:
             InventoryMovement.objects.filter(line_id=instance.id).delete()
@@ -164,9 +170,17 @@ def handle_document_active_status(sender, instance, created, **kwargs):
     - Documento anulado (is_active=False): Elimina todos los InventoryMovements asociados
     - Documento reactivado (is_active=True): Recrea todos los InventoryMovements
     """
+    # Totales, anulación, builder...: cualquier cambio invalida la analítica cacheada
+    bump_version_on_commit("inventory_analytics")
+
     if created:
         return  # Documento nuevo, las líneas se manejan en su propio signal
-    
+
+    if is_posting_deferred():
+        # post_document() reconciliará el documento completo, incluido is_active
+        _document_previous_state.pop(instance.pk, None)
+        return
+
     def handle_status_change():
         try:
             # Obtener el estado anterior
@@ -182,49 +196,15 @@ def handle_document_active_status(sender, instance, created, **kwargs):
                 return
             
             if not instance.is_active:
-                # 🗑️ DOCUMENTO ANULADO: Eliminar todos los movimientos
+                # 🗑️ DOCUMENTO ANULADO: post_document elimina los movimientos y revierte el stock
                 print(f"📄 Anulando documento {instance.id} - Revirtiendo stock de todas las líneas")
-                
-                for line in instance.lines.all():
-                    movements = InventoryMovement.objects.filter(line_id=line.id)
-                    count = movements.count()
-                    if count > 0:
-                        # El delete() automáticamente revierte el stock
-                        movements.delete()
-                        print(f"   🗑️ Eliminados {count} movimiento(s) de línea {line.id}")
-                
+                post_document(instance)
                 print(f"✅ Documento {instance.id} anulado - Stock revertido correctamente")
                 
             else:
-                # ✅ DOCUMENTO REACTIVADO: Recrear todos los movimientos
+                # ✅ DOCUMENTO REACTIVADO: post_document recrea los movimientos y aplica el stock
                 print(f"📄 Reactivando documento {instance.id} - Aplicando stock de todas las líneas")
-                
-                for line in instance.lines.all():
-                    warehouse = line.warehouse
-                    doc_type = instance.document_type
-                    movement_type = doc_type.stock_movement
-                    
-                    if warehouse and movement_type != 0:
-                        # Verificar si ya existe un movimiento (por seguridad)
-                        existing = InventoryMovement.objects.filter(line_id=line.id).first()
-                        if existing:
-                            print(f"   ⚠️ Ya existe movimiento para línea {line.id}, omitiendo")
-                            continue
-                        
-                        movement = InventoryMovement(
-                            line_id=line.id,
-                            product=line.product,
-                            warehouse=warehouse,
-                            quantity=line.quantity,
-                            movement_type=movement_type,
-                            unit=line.unit,
-                            reason=f"{doc_type.description} #{instance.id} (Reactivado)",
-                            document=str(instance.id),
-                            created_by=instance.created_by
-                        )
-                        movement.save()  # Esto actualiza el stock automáticamente
-                        print(f"   ✅ Movimiento recreado para línea {line.id}")
-                
+                post_document(instance, reason_suffix=" (Reactivado)")
                 print(f"✅ Documento {instance.id} reactivado - Stock aplicado correctamente")
                 
         except Exception as e:
@@ -0,0 +1,71 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from apptransactions.models import Document, DocumentLine, DocumentType
+from apptransactions.posting import deferred_posting, post_document
+from appinventory.models import Product, Warehouse, InventoryMovement, Stock
+from decimal import Decimal
+
+User = get_user_model()
+
+
+class DocumentPostingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='poster')
+        self.warehouse = Warehouse.objects.create(name='Main Warehouse')
+        self.product_a = Product.objects.create(name='Widget A', sku='WA-1')
+        self.product_b = Product.objects.create(name='Widget B', sku='WB-1')
+        self.doc_type = DocumentType.objects.create(
+            type_code='IN', description='Entrada de inventario', stock_movement=1)
+        self.document = Document.objects.create(
+            document_type=self.doc_type, created_by=self.user)
+
+    def _add_lines(self, *specs):
+        with deferred_posting():
+            return [
+                DocumentLine.objects.create(
+                    document=self.document, product=product, quantity=qty,
+                    unit=None, unit_price=Decimal('2.00'), warehouse=self.warehouse)
+                for product, qty in specs
+            ]
+
+    def _stock(self, product):
+        return Stock.objects.get(product=product, warehouse=self.warehouse).quantity
+
+    def test_post_document_aggregates_lines_per_product(self):
+        self._add_lines((self.product_a, 3), (self.product_a, 4), (self.product_b, 5))
+        self.assertFalse(InventoryMovement.objects.exists())
+
+        post_document(self.document)
+
+        self.assertEqual(InventoryMovement.objects.filter(document=str(self.document.id)).count(), 3)
+        self.assertEqual(self._stock(self.product_a), Decimal('7'))
+        self.assertEqual(self._stock(self.product_b), Decimal('5'))
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.total_amount, Decimal('24.00'))
+
+    def test_post_document_is_idempotent_and_reconciles_changes(self):
+        line_a, line_b = self._add_lines((self.product_a, 3), (self.product_b, 5))
+        post_document(self.document)
+        post_document(self.document)
+        self.assertEqual(self._stock(self.product_a), Decimal('3'))
+
+        line_b_id = line_b.id
+        with deferred_posting():
+            line_a.quantity = 10
+            line_a.save()
+            line_b.delete()
+        post_document(self.document)
+
+        self.assertEqual(self._stock(self.product_a), Decimal('10'))
+        self.assertEqual(self._stock(self.product_b), Decimal('0'))
+        self.assertFalse(InventoryMovement.objects.filter(line_id=line_b_id).exists())
+
+    def test_post_document_reverts_stock_for_inactive_document(self):
+        self._add_lines((self.product_a, 3))
+        post_document(self.document)
+
+        self.document.is_active = False
+        post_document(self.document)
+
+        self.assertEqual(self._stock(self.product_a), Decimal('0'))
+        self.assertFalse(InventoryMovement.objects.filter(document=str(self.document.id)).exists())
@@ -0,0 +1,66 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from rest_framework import serializers
+from apptransactions.models import Document, DocumentLine, DocumentType
+from apptransactions.posting import check_stock_availability
+from apptransactions.serializers import _validate_stock_out
+from appinventory.models import Product, Warehouse, Stock
+from decimal import Decimal
+
+User = get_user_model()
+
+
+class StockAvailabilityTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='seller')
+        self.warehouse = Warehouse.objects.create(name='Main Warehouse')
+        self.product = Product.objects.create(name='Widget A', sku='WA-1')
+        Stock.objects.create(product=self.product, warehouse=self.warehouse, quantity=Decimal('5'))
+        self.doc_type = DocumentType.objects.create(
+            type_code='OUT', description='Salida de inventario', stock_movement=-1)
+        self.document = Document.objects.create(
+            document_type=self.doc_type, created_by=self.user)
+
+    def _line(self, qty, warehouse=True):
+        return DocumentLine(
+            document=self.document, product=self.product, quantity=Decimal(qty),
+            unit=None, unit_price=Decimal('2.00'),
+            warehouse=self.warehouse if warehouse else None)
+
+    def test_insufficient_stock_returns_structured_error(self):
+        errors = check_stock_availability(self.document, [self._line('8')])
+
+        error = errors[0]['quantity']
+        self.assertEqual(error['error_type'], 'insufficient_stock')
+        self.assertEqual(error['available'], '5.00')
+        self.assertEqual(error['requested'], '8.00')
+        self.assertEqual(error['document_type'], 'OUT')
+
+    def test_lines_of_the_same_product_are_added_up(self):
+        self.assertEqual(check_stock_availability(self.document, [self._line('3')]), {})
+
+        errors = check_stock_availability(self.document, [self._line('3'), self._line('3')])
+
+        self.assertEqual(list(errors), [0])
+        self.assertEqual(errors[0]['quantity']['requested'], '6.00')
+
+    def test_negative_sales_are_allowed_when_document_type_permits(self):
+        self.doc_type.allow_negative_sales = True
+        self.doc_type.save()
+
+        self.assertEqual(check_stock_availability(self.document, [self._line('8')]), {})
+        _validate_stock_out(self._line('8'))  # no lanza
+
+    def test_line_without_warehouse_is_rejected(self):
+        errors = check_stock_availability(self.document, [self._line('1', warehouse=False)])
+
+        self.assertEqual(errors, {0: {'warehouse': 'Se requiere almacén para validar stock.'}})
+
+    def test_validate_stock_out_raises_first_error(self):
+        with self.assertRaises(serializers.ValidationError) as ctx:
+            _validate_stock_out(self._line('8'))
+        self.assertEqual(ctx.exception.detail['quantity']['error_type'], 'insufficient_stock')
+
+        with self.assertRaises(serializers.ValidationError) as ctx:
+            _validate_stock_out(self._line('1', warehouse=False))
+        self.assertIn('warehouse', ctx.exception.detail)
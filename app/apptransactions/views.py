@@ -1,6 +1,6 @@
-import base64
 from datetime import datetime
 from django.db.models import Q, Prefetch
+from django.utils import timezone
 from django.utils.dateparse import parse_datetime
 from django.shortcuts import render, get_object_or_404
 from django.db import IntegrityError
@@ -11,9 +11,6 @@ from rest_framework.decorators import action, api_view, permission_classes
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
 from rest_framework.permissions import IsAuthenticated, DjangoModelPermissions, AllowAny
-from django.template.loader import render_to_string
-from weasyprint import HTML
-from weasyprint.text.fonts import FontConfiguration
 from .models import (
     DocumentType, PartyType, PartyCategory, Party, Document, DocumentLine,
     PriceType, WorkAccount, TransactionFavorite
@@ -24,6 +21,8 @@ from .serializers import (
     TransactionFavoriteSerializer, TransactionFavoriteImportSerializer
 )
 from rest_framework.authentication import TokenAuthentication
+from utils.branding import tenant_logo_url
+from utils.pdf import cached_pdf, content_key, pdf_response, render_pdf
 
 
 class DocumentTypeViewSet(viewsets.ModelViewSet):
@@ -100,8 +99,10 @@ class WorkAccountViewSet(viewsets.ModelViewSet):
             drafts_qs = EventDraft.objects.filter(work_account=work_account, is_absence=False)
 
             # Bulk update: keep context fields synced too
+            # update() no toca auto_now: updated_at a mano (clave del PDF del schedule)
             updated_event_count = events_qs.update(
                 title=(work_account.title or '').upper(),
+                updated_at=timezone.now(),
                 builder=work_account.builder,
                 job=work_account.job,
                 house_model=work_account.house_model,
@@ -111,6 +112,7 @@ class WorkAccountViewSet(viewsets.ModelViewSet):
 
             updated_draft_count = drafts_qs.update(
                 title=(work_account.title or '').upper(),
+                updated_at=timezone.now(),
                 builder=work_account.builder,
                 job=work_account.job,
                 house_model=work_account.house_model,
@@ -385,6 +387,68 @@ class TransactionFavoriteViewSet(viewsets.ModelViewSet):
             )
 
 
+def transaction_pdf_queryset():
+    """Documento con todas las relaciones que usa transaction_pdf.html."""
+    return Document.objects.select_related(
+        'document_type', 
+        'builder', 
+        'created_by',
+        'work_account',
+        'work_account__builder',
+        'work_account__job',
+        'work_account__house_model'
+    ).prefetch_related(
+        Prefetch(
+            'lines',
+            queryset=DocumentLine.objects.select_related(
+                'product', 
+                'unit', 
+                'price_type', 
+                'brand',
+                'warehouse'
+            )
+        )
+    )
+
+
+def render_transaction_pdf(document, logo_url):
+    """Devuelve (bytes del PDF, nombre de archivo) de un documento."""
+    # Preparar el contexto para el template
+    context = {
+        'document': document,
+        'logo_url': logo_url,
+    }
+    pdf_file = render_pdf('transaction_pdf.html', context)
+    return pdf_file, f'{document.document_type.type_code}_{document.id}.pdf'
+
+
+# Campos de otras tablas que imprime transaction_pdf.html: renombrar un
+# producto, una obra o un builder también cambia el PDF
+TRANSACTION_PDF_RELATED = (
+    'document_type__type_code', 'document_type__description', 'builder__name',
+    'created_by__username', 'created_by__first_name', 'created_by__last_name',
+    'work_account__title', 'work_account__address', 'work_account__city', 'work_account__state',
+    'work_account__zipcode', 'work_account__lot', 'work_account__builder__name',
+    'work_account__job__name', 'work_account__house_model__name',
+)
+TRANSACTION_PDF_LINE_RELATED = ('product__name', 'unit__code', 'price_type__name', 'brand__name')
+
+
+def transaction_pdf_key(document, logo_url):
+    """Clave de cache: columnas del documento y de sus líneas, más los nombres relacionados que se imprimen."""
+    document_fields = [field.attname for field in Document._meta.concrete_fields]
+    line_fields = [field.attname for field in DocumentLine._meta.concrete_fields]
+    return content_key(
+        list(Document.objects.filter(pk=document.pk).values_list(*document_fields, *TRANSACTION_PDF_RELATED)),
+        list(
+            DocumentLine.objects.filter(document_id=document.pk)
+            .order_by('id')
+            .values_list(*line_fields, *TRANSACTION_PDF_LINE_RELATED)
+        ),
+        logo_url,
+    )
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def download_transaction_pdf(request, document_id):
@@ -394,64 +458,15 @@ def download_transaction_pdf(request, document_id):
     """
     try:
         # Obtener el documento con todas las relaciones necesarias
-        document = get_object_or_404(
-            Document.objects.select_related(
-                'document_type', 
-                'builder', 
-                'created_by',
-                'work_account',
-                'work_account__builder',
-                'work_account__job',
-                'work_account__house_model'
-            ).prefetch_related(
-                Prefetch(
-                    'lines',
-                    queryset=DocumentLine.objects.select_related(
-                        'product', 
-                        'unit', 
-                        'price_type', 
-                        'brand',
-                        'warehouse'
-                    )
-                )
-            ),
-            id=document_id
-        )
-
-        # Determinar el logo basado en el dominio (similar al contrato)
-        domain = request.get_host()
-        if 'phoenixelectricandair' in domain:
-            tenant_logo = 'media/tenant_logos/Logo-phoenix-w.png'
-        elif '192.168.0.248:8000' in domain or 'division16llc' in domain:
-            tenant_logo = 'media/tenant_logos/Logo-division-w.png'
-        else:
-            tenant_logo = 'media/tenant_logos/default-logo.png'
-
-        logo_url = request.build_absolute_uri('/' + tenant_logo)
-
-        # Preparar el contexto para el template
-        context = {
-            'document': document,
-            'logo_url': logo_url,
-        }
+        document = get_object_or_404(transaction_pdf_queryset(), id=document_id)
+        logo_url = tenant_logo_url(request)
 
-        # Configurar fuentes
-        font_config = FontConfiguration()
-
-        # Renderizar el HTML
-        html = render_to_string('transaction_pdf.html', context)
-
-        # Generar el PDF
-        pdf_file = HTML(string=html).write_pdf(font_config=font_config)
-
-        # Preparar la respuesta
-        response = {
-            'file': base64.b64encode(pdf_file).decode('utf-8'),
-            'filename': f'{document.document_type.type_code}_{document.id}.pdf',
-            'file_type': 'application/pdf'
-        }
-
-        return Response(response, status=status.HTTP_200_OK)
+        # Reimprimir un documento sin cambios sólo lee el PDF cacheado
+        pdf = cached_pdf(
+            'transaction', document.id, transaction_pdf_key(document, logo_url),
+            lambda: render_transaction_pdf(document, logo_url)[0],
+        )
+        return pdf_response(request, pdf, f'{document.document_type.type_code}_{document.id}.pdf')
 
     except Document.DoesNotExist:
         return JsonResponse(
@@ -462,4 +477,4 @@ def download_transaction_pdf(request, document_id):
         return JsonResponse(
             {"error": f"Error al generar PDF: {str(e)}"}, 
             status=500
-        )
\ No newline at end of file
+        )
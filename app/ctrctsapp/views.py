@@ -1,4 +1,3 @@
-import base64
 import logging
 import json
 import math
@@ -38,12 +37,8 @@ from django.http import JsonResponse, HttpResponse
 from django.template.loader import render_to_string
 from .utils import geocode_address
 from utils.datatable import handle_datatable_query
-
-from weasyprint import (
-    CSS,
-    HTML,
-)
-from weasyprint.text.fonts import FontConfiguration
+from utils.branding import tenant_logo_url
+from utils.pdf import cached_pdf, content_key, pdf_response, render_pdf
 
 logger = logging.getLogger(__name__)
 
@@ -647,6 +642,39 @@ def lighting_circuits(sqft):
   num = sqft * 3 / 120 / 15
   return math.ceil(num)  # Siempre redondea hacia arriba
 
+def render_contract_pdf(contract, details, logo_url):
+    mid_index = details.count() // 2  # Integer division
+    left_details = details[:mid_index]
+    right_details = details[mid_index:]
+
+    # Prepare the data to return
+    context = {
+        'contract': contract,
+        'left_details': left_details,
+        'right_details': right_details,
+        'lighting_circuits': lighting_circuits(contract.sqft),
+        'logo_url': logo_url,
+    }
+    return render_pdf('contract_pdf.html', context)
+
+
+def contract_pdf_key(contract, details, logo_url):
+    """
+    Clave de cache: columnas del contrato (incluye last_updated y needs_reprint)
+    con los nombres de builder, modelo y job que se imprimen, y de los detalles.
+    """
+    contract_fields = [field.attname for field in Contract._meta.concrete_fields]
+    detail_fields = [field.attname for field in ContractDetails._meta.concrete_fields]
+    return content_key(
+        list(
+            Contract.objects.filter(pk=contract.pk)
+            .values_list(*contract_fields, 'builder__name', 'house_model__name', 'job__name')
+        ),
+        list(details.order_by('id').values_list(*detail_fields)),
+        logo_url,
+    )
+
+
 @api_view(['GET'])
 def download_contract_pdf(request, contract_id):
     try:
@@ -656,44 +684,15 @@ def download_contract_pdf(request, contract_id):
             details = contract.contract_details.filter(cdtrim__gt=0)
         else:  # If type is "Rough"
             details = contract.contract_details.filter(cdrough__gt=0)
-            
-        mid_index = details.count() // 2  # Integer division
-        left_details = details[:mid_index]
-        right_details = details[mid_index:]
-        
-        domain = request.get_host()
-        if 'phoenixelectricandair' in domain:
-            tenant_logo = 'media/tenant_logos/Logo-phoenix-w.png'
-        elif '192.168.0.248:8000' in domain or 'division16llc' in domain:
-            tenant_logo = 'media/tenant_logos/Logo-division-w.png'
-        else:
-            tenant_logo = 'media/tenant_logos/default-logo.png'
-
-        logo_url = request.build_absolute_uri('/' + tenant_logo)
 
-        # Prepare the data to return
-        context = {
-            'contract': contract,
-            'left_details': left_details,
-            'right_details': right_details,
-            'lighting_circuits': lighting_circuits(contract.sqft),
-            'logo_url': logo_url,
-        }
-        font_config = FontConfiguration()
+        logo_url = tenant_logo_url(request)
 
-        html = render_to_string('contract_pdf.html', context)
-
-        pdf_file = HTML(string=html).write_pdf(font_config=font_config)
-        
-        # Convert bytes to base64 string (not bytes object)
-        pdf_base64 = base64.b64encode(pdf_file).decode('utf-8')
-        
-        response_data = {
-            'file': pdf_base64,
-            'filename': f'contract_{contract.pk}.pdf',
-            'file_type': 'application/pdf'
-        }
-        return Response(response_data, status=status.HTTP_200_OK)
+        # Reimprimir un contrato sin cambios sólo lee el PDF cacheado
+        pdf = cached_pdf(
+            'contract', contract.pk, contract_pdf_key(contract, details, logo_url),
+            lambda: render_contract_pdf(contract, details, logo_url),
+        )
+        return pdf_response(request, pdf, f'contract_{contract.pk}.pdf')
     except Contract.DoesNotExist:
         logger.error(f"Contract with id {contract_id} not found")
         return JsonResponse({"error": "Contract not found"}, status=404)
@@ -2,7 +2,6 @@ import os
 import django
 from channels.routing import ProtocolTypeRouter, URLRouter
 from django.core.asgi import get_asgi_application
-from channels.auth import AuthMiddlewareStack
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings")
 
@@ -12,27 +11,18 @@ django_asgi_app = get_asgi_application()
 
 # Import routing after Django is initialized
 from appschedule import routing
-from project.middleware.tenant_asgi import TenantASGIMiddleware
-from django.conf import settings
+from project.middleware.tenant_asgi import TenantASGIMiddleware, TenantAuthMiddlewareStack
 
-# Para desarrollo local, simplificar el stack de WebSocket
-# En producción, usar TenantASGIMiddleware para multi-tenant
-if settings.DEBUG:
-    # Desarrollo local: stack simple sin middleware de tenant (más fácil de debuggear)
-    websocket_stack = AuthMiddlewareStack(
+# TenantASGIMiddleware también en desarrollo: los grupos de Channels llevan el
+# schema del tenant como prefijo y sin él los sockets no recibirían nada.
+# TenantAuthMiddlewareStack: sesión y usuario se leen en el schema del tenant.
+websocket_stack = TenantASGIMiddleware(
+    TenantAuthMiddlewareStack(
         URLRouter(
             routing.websocket_urlpatterns
         )
     )
-else:
-    # Producción: stack completo con middleware de tenant
-    websocket_stack = TenantASGIMiddleware(
-        AuthMiddlewareStack(
-            URLRouter(
-                routing.websocket_urlpatterns
-            )
-        )
-    )
+)
 
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
@@ -1,83 +1,38 @@
 """
-Middleware para actualizar dinámicamente CSRF_TRUSTED_ORIGINS
-basado en los dominios de tenants en la base de datos.
+CsrfViewMiddleware que además confía en los orígenes de los dominios de tenants.
 """
-from django.conf import settings
-from django.utils.deprecation import MiddlewareMixin
-import logging
+from urllib.parse import urlsplit
 
-logger = logging.getLogger(__name__)
+from django.middleware.csrf import CsrfViewMiddleware, RejectRequest
 
+from tenants.hosts import is_tenant_domain, is_trusted_origin
 
-class DynamicCSRFMiddleware(MiddlewareMixin):
+
+class DynamicCSRFMiddleware(CsrfViewMiddleware):
     """
-    Middleware que actualiza CSRF_TRUSTED_ORIGINS dinámicamente
-    basado en los dominios de tenants activos en la base de datos.
-    
-    Esto permite que nuevos tenants creados después del inicio del servidor
-    sean automáticamente incluidos en CSRF_TRUSTED_ORIGINS sin necesidad de reiniciar.
-    
-    IMPORTANTE: Este middleware DEBE ejecutarse ANTES de CsrfViewMiddleware
-    para que los orígenes estén disponibles antes de la validación de CSRF.
+    Reemplaza a django.middleware.csrf.CsrfViewMiddleware.
+
+    CSRF_TRUSTED_ORIGINS sólo tiene los orígenes fijos de settings; los de los
+    tenants se verifican con el índice de tenants.hosts cuando Django no
+    encuentra el origen en su lista (https://<dominio> y, en desarrollo,
+    http://<dominio>:<puerto>). Ya no se agregan orígenes a settings en cada
+    petición.
     """
-    
-    # Cache para evitar consultas excesivas a la BD
-    _last_domain_check = None
-    _domain_cache_ttl = 300  # 5 minutos
-    
-    def process_request(self, request):
-        """
-        Actualiza CSRF_TRUSTED_ORIGINS si es necesario.
-        Solo verifica cada 5 minutos para evitar sobrecarga.
-        Funciona tanto en desarrollo como en producción.
-        """
-        # Verificar si necesitamos actualizar el cache
-        import time
-        current_time = time.time()
-        
-        if (self._last_domain_check is None or 
-            current_time - self._last_domain_check > self._domain_cache_ttl):
-            
-            try:
-                # Importar desde tenants.models (schema público) donde están los dominios
-                from tenants.models import Domain
-                
-                # Obtener todos los dominios activos
-                active_domains = Domain.objects.filter(
-                    tenant__is_active=True
-                ).values_list('domain', flat=True).distinct()
-                
-                # Determinar qué orígenes agregar según el entorno
-                origins_added = 0
-                for domain in active_domains:
-                    origins_to_add = []
-                    
-                    if settings.DEBUG:
-                        # En desarrollo: agregar variantes HTTP con puertos comunes
-                        common_ports = ['8000', '3000', '8080']
-                        for port in common_ports:
-                            origins_to_add.append(f'http://{domain}:{port}')
-                        # También HTTPS
-                        origins_to_add.append(f'https://{domain}')
-                    else:
-                        # En producción: solo HTTPS (sin puerto)
-                        origins_to_add.append(f'https://{domain}')
-                    
-                    # Agregar si no está presente
-                    for origin in origins_to_add:
-                        if origin not in settings.CSRF_TRUSTED_ORIGINS:
-                            settings.CSRF_TRUSTED_ORIGINS.append(origin)
-                            origins_added += 1
-                            logger.debug(f"Agregado origen a CSRF_TRUSTED_ORIGINS: {origin}")
-                
-                if origins_added > 0:
-                    logger.info(f"Actualizados {origins_added} orígenes CSRF dinámicamente ({'desarrollo' if settings.DEBUG else 'producción'})")
-                
-                self._last_domain_check = current_time
-                
-            except Exception as e:
-                # Silenciar errores para no afectar el funcionamiento normal
-                logger.debug(f"Error al actualizar CSRF dinámicamente: {e}")
-        
-        return None
 
+    def _origin_verified(self, request):
+        if super()._origin_verified(request):
+            return True
+        return is_trusted_origin(request.META['HTTP_ORIGIN'])
+
+    def _check_referer(self, request):
+        try:
+            super()._check_referer(request)
+        except RejectRequest as reject:
+            # Sólo peticiones HTTPS sin Origin llegan aquí: Referer https://<dominio>/...
+            try:
+                referer = urlsplit(request.META.get('HTTP_REFERER') or '')
+                port = referer.port
+            except ValueError:
+                raise reject
+            if referer.scheme != 'https' or port is not None or not is_tenant_domain(referer.hostname):
+                raise
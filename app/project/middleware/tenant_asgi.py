@@ -1,14 +1,61 @@
 """
 Middleware ASGI para identificar el tenant en conexiones WebSocket con django-tenants.
 Este middleware debe ejecutarse antes de que se procese la conexión WebSocket.
+
+El schema no se fija en una conexión de BD al conectar: cada llamada a la BD
+de un consumer corre en algún hilo del pool de database_sync_to_async, con la
+conexión de ese hilo. El tenant viaja en scope['schema_name'] (y en la
+variable de contexto current_schema de la tarea de la conexión) y
+tenant_database_sync_to_async fija el search_path en la conexión que
+realmente ejecuta cada llamada.
 """
-from django_tenants.utils import get_tenant_model, get_public_schema_name
-from django.db import connection
+from contextvars import ContextVar
+from functools import wraps
+
+from django_tenants.utils import get_public_schema_name, schema_context
+from channels.auth import AuthMiddleware, get_user
 from channels.db import database_sync_to_async
+from channels.sessions import CookieMiddleware, SessionMiddleware
+from tenants.resolver import cached_tenant, resolve_tenant, MISSING
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Schema de la conexión WebSocket en curso (cada conexión es su propia tarea asyncio)
+current_schema = ContextVar('tenant_schema', default=None)
+
+
+def tenant_database_sync_to_async(func):
+    """
+    database_sync_to_async que ejecuta `func` con el schema de current_schema
+    en la conexión del hilo que la corre (y lo restaura al terminar). Sirve
+    para funciones y métodos, igual que database_sync_to_async.
+    """
+    @wraps(func)
+    def run_in_schema(*args, **kwargs):
+        # Corre dentro de la copia del contexto del llamador: current_schema es visible
+        schema_name = current_schema.get()
+        if schema_name is None:
+            return func(*args, **kwargs)
+        with schema_context(schema_name):
+            return func(*args, **kwargs)
+    return database_sync_to_async(run_in_schema)
+
+
+class TenantAuthMiddleware(AuthMiddleware):
+    """AuthMiddleware de Channels leyendo sesión y usuario en el schema del tenant."""
+
+    async def resolve_scope(self, scope):
+        scope["user"]._wrapped = await _get_user(scope)
+
+
+# get_user de Channels ya es un database_sync_to_async; se envuelve su función
+_get_user = tenant_database_sync_to_async(get_user.func)
+
+
+def TenantAuthMiddlewareStack(inner):
+    return CookieMiddleware(SessionMiddleware(TenantAuthMiddleware(inner)))
+
 
 class TenantASGIMiddleware:
     """
@@ -17,8 +64,9 @@ class TenantASGIMiddleware:
     Este middleware:
     1. Extrae el hostname del scope de la conexión WebSocket
     2. Normaliza el hostname (remueve puerto)
-    3. Identifica el tenant usando django-tenants
-    4. Configura el schema del tenant en la conexión de base de datos
+    3. Identifica el tenant (caché de tenants.resolver)
+    4. Deja el schema en scope['schema_name'] (grupos de Channels por tenant)
+       y en current_schema (tenant_database_sync_to_async)
     """
     
     def __init__(self, app):
@@ -38,20 +86,30 @@ class TenantASGIMiddleware:
                 # Normalizar hostname (remover puerto)
                 normalized_hostname = self._normalize_hostname(hostname)
                 
-                # Identificar y configurar el tenant (usar database_sync_to_async para consultas DB)
-                tenant = await self._get_tenant_from_hostname_async(normalized_hostname)
+                # Identificar el tenant: del caché sin salir del event loop; sólo si
+                # no está se consulta la BD (database_sync_to_async)
+                tenant = cached_tenant(normalized_hostname, subdomain_fallback=True)
+                if tenant is MISSING:
+                    tenant = await self._get_tenant_from_hostname_async(normalized_hostname)
                 
                 if tenant:
-                    # Configurar el schema del tenant en la conexión
-                    await self._set_tenant_async(tenant)
+                    # Los consumers arman sus grupos de Channels con este schema
+                    scope = dict(scope, schema_name=tenant.schema_name)
                     logger.info(f'✅ Tenant configurado para WebSocket: {tenant.schema_name} (hostname: {normalized_hostname})')
                 else:
                     # Si no se encuentra tenant, usar schema público
-                    await self._set_schema_to_public_async()
+                    scope = dict(scope, schema_name=get_public_schema_name())
                     logger.warning(f'⚠️ No se encontró tenant para hostname: {normalized_hostname}, usando schema público')
-        else:
-            # Log para peticiones HTTP que no son WebSocket
-            logger.debug(f'🔍 HTTP request - path: {scope.get("path")}, method: {scope.get("method")}')
+            
+            # Cada llamada a la BD de esta conexión aplica el schema en su propio hilo
+            token = current_schema.set(scope.get('schema_name') or get_public_schema_name())
+            try:
+                return await self.app(scope, receive, send)
+            finally:
+                current_schema.reset(token)
+        
+        # Log para peticiones HTTP que no son WebSocket
+        logger.debug(f'🔍 HTTP request - path: {scope.get("path")}, method: {scope.get("method")}')
         
         # Continuar con el siguiente middleware/aplicación
         return await self.app(scope, receive, send)
@@ -101,37 +159,15 @@ class TenantASGIMiddleware:
     
     def _get_tenant_from_hostname(self, hostname):
         """
-        Identifica el tenant basándose en el hostname usando django-tenants.
+        Identifica el tenant basándose en el hostname (caché de tenants.resolver).
         Versión síncrona para usar con database_sync_to_async.
         """
         if not hostname:
             return None
         
         try:
-            # Buscar el dominio en la base de datos
-            # django-tenants busca por dominio exacto o subdominio
-            from django_tenants.utils import get_tenant_domain_model
-            DomainModel = get_tenant_domain_model()
-            
-            # Buscar dominio exacto
-            domain = DomainModel.objects.filter(domain=hostname).first()
-            
-            if domain:
-                return domain.tenant
-            
-            # Si no se encuentra dominio exacto, intentar buscar por subdominio
-            # Esto es útil si el hostname incluye el subdominio completo
-            # Por ejemplo: 'globo_dyned2.chalan-pro.net' -> buscar 'globo_dyned2'
-            parts = hostname.split('.')
-            if len(parts) > 1:
-                # Intentar con el primer subdominio
-                subdomain = parts[0]
-                domain = DomainModel.objects.filter(domain__icontains=subdomain).first()
-                if domain:
-                    return domain.tenant
-            
-            return None
-            
+            # Dominio exacto y, si no hay, el primer subdominio (ver tenants.resolver)
+            return resolve_tenant(hostname, subdomain_fallback=True)
         except Exception as e:
             logger.error(f'❌ Error al identificar tenant para hostname {hostname}: {e}')
             return None
@@ -140,14 +176,4 @@ class TenantASGIMiddleware:
     def _get_tenant_from_hostname_async(self, hostname):
         """Wrapper asíncrono para _get_tenant_from_hostname"""
         return self._get_tenant_from_hostname(hostname)
-    
-    @database_sync_to_async
-    def _set_tenant_async(self, tenant):
-        """Configura el tenant de forma asíncrona"""
-        connection.set_tenant(tenant)
-    
-    @database_sync_to_async
-    def _set_schema_to_public_async(self):
-        """Configura el schema público de forma asíncrona"""
-        connection.set_schema_to_public()
 
@@ -0,0 +1,20 @@
+"""
+TenantMainMiddleware de django-tenants con la resolución del tenant cacheada.
+"""
+from django_tenants.middleware.main import TenantMainMiddleware
+
+from tenants.resolver import resolve_tenant
+
+
+class CachedTenantMainMiddleware(TenantMainMiddleware):
+    """
+    Igual que TenantMainMiddleware, pero el tenant sale de tenants.resolver:
+    en una petición normal no hay consulta a tenants_domain.
+    """
+
+    def get_tenant(self, domain_model, hostname):
+        tenant = resolve_tenant(hostname)
+        if tenant is None:
+            # Mismo contrato que el original (no_tenant_found / 404)
+            raise domain_model.DoesNotExist()
+        return tenant
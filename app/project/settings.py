@@ -99,6 +99,11 @@ TENANT_BASE_DOMAIN = os.environ.get('TENANT_BASE_DOMAIN', 'chalan-pro.net')
 PUBLIC_SCHEMA_URLCONF = 'project.urls_public'
 # Dominio por defecto para desarrollo local
 TENANT_SUBFOLDER_PREFIX = ''
+# Schema plantilla ya migrado; los tenants nuevos se crean clonándolo
+# (tenants/provisioning.py). Se crea/migra con: python manage.py migrate_tenants
+TENANT_BASE_SCHEMA = os.environ.get('TENANT_BASE_SCHEMA', 'tenant_template')
+# Schemas migrados y sin tenant que el onboarding toma al instante (manage.py fill_tenant_pool)
+TENANT_SCHEMA_POOL_SIZE = int(os.environ.get('TENANT_SCHEMA_POOL_SIZE', '5'))
 
 # Para desarrollo local, definir subdominios comunes (se usan en múltiples lugares)
 # Lista de subdominios comunes para desarrollo local - definida fuera del bloque if para que esté disponible
@@ -126,6 +131,12 @@ if DEBUG:
         if domain not in ALLOWED_HOSTS:
             ALLOWED_HOSTS.append(domain)
 
+# Validación del Host: la hace DynamicAllowedHostsMiddleware con el índice de tenants/hosts.py
+# (estos patrones + dominios de tenants activos, en un conjunto y un trie de sufijos).
+# Django recibe '*' para no recorrer una lista que crecería con cada tenant.
+STATIC_ALLOWED_HOSTS = ALLOWED_HOSTS
+ALLOWED_HOSTS = ['*']
+
 # Configuración para desarrollo local
 # Permitir acceso al schema public si no se encuentra tenant
 SHOW_PUBLIC_IF_NO_TENANT_FOUND = True
@@ -191,19 +202,19 @@ INSTALLED_APPS = list(SHARED_APPS) + [app for app in TENANT_APPS if app not in S
 MIDDLEWARE = [
     # Middleware personalizado para normalizar hostname (remover puerto) - DEBE ir ANTES de TenantMainMiddleware
     'project.middleware.tenant_hostname.TenantHostnameNormalizerMiddleware',
-    # Middleware para actualizar ALLOWED_HOSTS dinámicamente - DEBE ir ANTES de SecurityMiddleware
+    # Valida el Host (STATIC_ALLOWED_HOSTS + dominios de tenants) - DEBE ir ANTES de TenantMainMiddleware
     'project.middleware.dynamic_allowed_hosts.DynamicAllowedHostsMiddleware',
     # django-tenants middleware DEBE ir después del normalizador para detectar el tenant
-    'django_tenants.middleware.main.TenantMainMiddleware',
-    # Middleware para actualizar CSRF_TRUSTED_ORIGINS dinámicamente (debe ir antes de CsrfViewMiddleware)
-    'project.middleware.dynamic_csrf.DynamicCSRFMiddleware',
+    # (subclase con la resolución hostname -> tenant cacheada, tenants/resolver.py)
+    'project.middleware.tenant_main.CachedTenantMainMiddleware',
     'project.DisableCSRF.DisableCSRF',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Debe ir después de SecurityMiddleware
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
+    # CsrfViewMiddleware que también confía en los orígenes de los dominios de tenants
+    'project.middleware.dynamic_csrf.DynamicCSRFMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -211,9 +222,8 @@ MIDDLEWARE = [
 
 # Si usas sesiones de autenticación (en lugar de TokenAuthentication), habilita CSRF
 # CSRF Trusted Origins
-# Los dominios se cargan DINÁMICAMENTE desde la BD (tabla public.tenants_domain)
-# Ver: tenants/apps.py (TenantsConfig.ready) y project/middleware/dynamic_csrf.py
-# No es necesario agregar dominios manualmente - se cargan automáticamente al iniciar Django
+# Los orígenes de los dominios de tenants (tabla public.tenants_domain) no se agregan aquí:
+# los verifica project/middleware/dynamic_csrf.py con el índice de tenants/hosts.py
 # CSRF Trusted Origins - Incluir dominios de producción
 default_csrf_origins = 'http://localhost:8080,http://192.168.0.248:8080,http://192.168.0.248:3000,http://localhost:8000,http://192.168.0.248:8000,http://localhost:3000,https://www.chalanpro.net,https://chalanpro.net,https://api.chalanpro.net,https://www.api.chalanpro.net,https://chalan-backend.onrender.com,https://chalan-frontend.onrender.com'
 csrf_origins_env = os.environ.get('CSRF_TRUSTED_ORIGINS', default_csrf_origins)
@@ -259,10 +269,7 @@ if DEBUG:
             if origin not in CSRF_TRUSTED_ORIGINS:
                 CSRF_TRUSTED_ORIGINS.append(origin)
     
-    # Los dominios se cargarán dinámicamente desde la BD usando:
-    # 1. TenantsConfig.ready() - cuando Django inicializa (en tenants/apps.py)
-    # 2. DynamicCSRFMiddleware - actualización en tiempo real durante requests
-    # Esto elimina la necesidad de agregar dominios manualmente
+    # Los dominios de tenants los verifica DynamicCSRFMiddleware (tenants/hosts.py)
 
 
 # Permitir todas las solicitudes desde el frontend
@@ -304,6 +311,9 @@ CORS_ALLOW_HEADERS = list(default_headers) + [
     'Content-Type'
 ]
 
+# Content-Disposition: el frontend lee el nombre de archivo de los PDFs binarios
+CORS_EXPOSE_HEADERS = ['Content-Disposition']
+
 CORS_ALLOW_METHODS = (
     'DELETE',
     'GET',
@@ -501,6 +511,66 @@ else:
 
 ENABLE_WEBSOCKET_NOTIFICATIONS = os.environ.get('ENABLE_WEBSOCKET_NOTIFICATIONS', 'True') == 'True'
 
+# Cache - Redis si hay REDIS_URL, archivos si CACHE_DIR (útil en pruebas), memoria local si no
+# Usado por utils/tenant_cache.py (dashboard y analítica, claves por schema del tenant)
+CACHE_DIR = os.environ.get('CACHE_DIR')
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        },
+    }
+elif CACHE_DIR:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": CACHE_DIR,
+        },
+    }
+else:
+    # Sólo para un proceso: las versiones de utils/tenant_cache (analítica, tabla de
+    # conversión, enrutamiento de tenants) viven en cada worker y un cambio hecho en
+    # uno no invalida a los demás hasta el TTL. Con varios workers usar REDIS_URL o CACHE_DIR.
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        },
+    }
+
+# Segundos que se reutiliza una respuesta de dashboard/analítica (invalidada antes por señales)
+ANALYTICS_CACHE_TTL = int(os.environ.get('ANALYTICS_CACHE_TTL', '300'))
+# Cada proceso relee las versiones compartidas de sus caches locales (utils.tenant_cache.recent_version)
+# a lo sumo una vez cada tantos segundos: un cambio tarda eso en llegar a los demás workers
+SHARED_VERSION_CHECK_INTERVAL = int(os.environ.get('SHARED_VERSION_CHECK_INTERVAL', '1'))
+
+# Exportaciones en segundo plano (appcore.exports / manage.py run_export_jobs)
+# Un trabajo 'running' sin latido (heartbeat_at) durante el timeout se considera abandonado y se reintenta
+EXPORT_JOB_TIMEOUT = int(os.environ.get('EXPORT_JOB_TIMEOUT', '900'))
+EXPORT_JOB_HEARTBEAT = int(os.environ.get('EXPORT_JOB_HEARTBEAT', '30'))
+EXPORT_JOB_MAX_ATTEMPTS = int(os.environ.get('EXPORT_JOB_MAX_ATTEMPTS', '3'))
+# Archivos generados; fuera de MEDIA_ROOT porque /media/ es público (se descargan por /api/.../<id>/download/)
+EXPORT_ROOT = os.environ.get('EXPORT_ROOT', str(BASE_DIR / 'exports'))
+
+# Cache en disco de PDFs (contratos, transacciones, schedule); fuera de MEDIA_ROOT porque /media/ es público
+PDF_CACHE_DIR = os.environ.get('PDF_CACHE_DIR', str(BASE_DIR / 'pdf_cache'))
+# Subir este valor al cambiar los templates de PDF invalida todo el cache
+PDF_CACHE_VERSION = os.environ.get('PDF_CACHE_VERSION', '1')
+# PDFs del schedule por tenant (rangos arbitrarios): se conservan los más usados
+PDF_CACHE_SCHEDULE_MAX_FILES = int(os.environ.get('PDF_CACHE_SCHEDULE_MAX_FILES', '50'))
+
+# Segundos que cada proceso reutiliza la tabla de conversión de unidades (appinventory.conversions)
+UNIT_CONVERSION_CACHE_TTL = int(os.environ.get('UNIT_CONVERSION_CACHE_TTL', '60'))
+
+# Resolución hostname -> tenant cacheada por proceso (HTTP y WebSocket, tenants/resolver.py)
+# Las señales la vacían en el proceso que cambia el dominio y, tras el commit, cambian una
+# versión compartida: los demás la descartan en SHARED_VERSION_CHECK_INTERVAL; el TTL es respaldo
+TENANT_RESOLVER_CACHE_TTL = int(os.environ.get('TENANT_RESOLVER_CACHE_TTL', '60'))
+TENANT_RESOLVER_CACHE_SIZE = int(os.environ.get('TENANT_RESOLVER_CACHE_SIZE', '1024'))
+# Índice de hosts/orígenes de tenants (tenants/hosts.py); la misma versión compartida lo reconstruye antes
+TENANT_HOST_INDEX_TTL = int(os.environ.get('TENANT_HOST_INDEX_TTL', '300'))
+
 LOG_DIR = os.path.join(BASE_DIR, "logs")
 os.makedirs(LOG_DIR, exist_ok=True)
 
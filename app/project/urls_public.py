@@ -48,6 +48,7 @@ urlpatterns = [
     path('', include('appschedule.urls')),
     path('', include('appinventory.urls')),
     path('', include('apptransactions.urls')),
+    path('', include('appcore.urls')),
     path('', include('tenants.urls')),  # Incluir URLs de onboarding
 ]
 
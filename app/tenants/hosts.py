@@ -0,0 +1,186 @@
+"""
+Validación de Host y de orígenes CSRF para los dominios de tenants.
+
+Antes los middlewares agregaban cada dominio activo a settings.ALLOWED_HOSTS y
+settings.CSRF_TRUSTED_ORIGINS (más las variantes con puerto en desarrollo) y
+Django recorría esas listas en cada petición. Ahora hay un índice por proceso:
+
+- conjunto (hash) con los dominios de tenants activos y los hosts exactos de
+  STATIC_ALLOWED_HOSTS;
+- trie de sufijos (por etiquetas, de derecha a izquierda) con los patrones
+  '.dominio' de STATIC_ALLOWED_HOSTS.
+
+Verificar un host cuesta una búsqueda en el conjunto más, a lo sumo, una por
+etiqueta del hostname, sin importar cuántos tenants haya.
+
+El índice se vacía por señales (tenants/signals.py) y se reconstruye con una
+sola consulta en la siguiente petición. Los demás procesos lo reconstruyen
+cuando cambia la versión compartida de tenants.resolver.routing_version(), que
+la señal cambia tras el commit: un dominio borrado o un tenant desactivado
+deja de aceptarse en todos los workers. Un dominio creado desde otro proceso
+se acepta igual: si el host es un subdominio de TENANT_BASE_DOMAIN y no está
+en el índice se consulta tenants.resolver (cacheado, también para hosts
+desconocidos).
+"""
+
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import DatabaseError
+
+from tenants.resolver import normalize_hostname, resolve_tenant, routing_version
+
+logger = logging.getLogger(__name__)
+
+# Puertos del frontend/backend en desarrollo (orígenes http://<dominio>:<puerto>)
+DEV_ORIGIN_PORTS = (8000, 3000, 8080)
+
+_END = None
+
+
+def _index_ttl():
+    return getattr(settings, 'TENANT_HOST_INDEX_TTL', 300)
+
+
+class HostMatcher:
+    """Patrones con la semántica de ALLOWED_HOSTS ('*', 'host', '.dominio') más dominios de tenants."""
+
+    def __init__(self, patterns=(), domains=()):
+        self.allow_all = False
+        self.exact = set()
+        self.suffixes = {}
+        self.domains = {d.lower() for d in domains if d}
+        for pattern in patterns:
+            self.add_pattern(pattern)
+
+    def add_pattern(self, pattern):
+        pattern = (pattern or '').strip().lower()
+        if not pattern:
+            return
+        if pattern == '*':
+            self.allow_all = True
+        elif pattern.startswith('.'):
+            node = self.suffixes
+            for label in reversed(pattern[1:].split('.')):
+                node = node.setdefault(label, {})
+            node[_END] = True
+        else:
+            self.exact.add(pattern)
+
+    def _matches_suffix(self, host):
+        # '.chalan-pro.net' acepta 'chalan-pro.net' y cualquier subdominio
+        node = self.suffixes
+        for label in reversed(host.split('.')):
+            node = node.get(label)
+            if node is None:
+                return False
+            if _END in node:
+                return True
+        return False
+
+    def is_tenant_domain(self, host):
+        return host in self.domains
+
+    def matches(self, host):
+        return (
+            self.allow_all
+            or host in self.domains
+            or host in self.exact
+            or self._matches_suffix(host)
+        )
+
+
+_index = None
+_index_version = None
+_loaded_at = 0.0
+_index_lock = threading.Lock()
+
+
+def _static_patterns():
+    return getattr(settings, 'STATIC_ALLOWED_HOSTS', settings.ALLOWED_HOSTS)
+
+
+def host_index():
+    """Índice del proceso; se reconstruye si se invalidó, cambió la versión compartida o expiró."""
+    global _index, _index_version, _loaded_at
+    version = routing_version()
+    index = _index
+    if (
+        index is not None
+        and _index_version == version
+        and time.monotonic() - _loaded_at <= _index_ttl()
+    ):
+        return index
+
+    from tenants.models import Domain
+
+    try:
+        domains = list(
+            Domain.objects.filter(tenant__is_active=True).values_list('domain', flat=True)
+        )
+    except DatabaseError as e:
+        # Tabla aún sin crear (migraciones): sólo los patrones estáticos, sin guardar
+        logger.warning(f"No se pudieron cargar los dominios de tenants: {e}")
+        return HostMatcher(_static_patterns())
+
+    index = HostMatcher(_static_patterns(), domains)
+    with _index_lock:
+        _index, _index_version, _loaded_at = index, version, time.monotonic()
+    return index
+
+
+def invalidate_host_index():
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def _under_base_domain(host):
+    base = (getattr(settings, 'TENANT_BASE_DOMAIN', None) or '').strip('.').lower()
+    return bool(base) and host.endswith(f'.{base}')
+
+
+def _active_tenant_domain(host):
+    """
+    Dominio que todavía no está en el índice (creado en otro proceso). Sólo
+    para subdominios de TENANT_BASE_DOMAIN: un Host arbitrario no llega a la BD
+    ni ocupa entradas del LRU del resolver.
+    """
+    if not _under_base_domain(host):
+        return False
+    tenant = resolve_tenant(host)
+    return tenant is not None and tenant.is_active
+
+
+def is_allowed_host(host):
+    host = normalize_hostname(host)
+    if not host:
+        return False
+    return host_index().matches(host) or _active_tenant_domain(host)
+
+
+def is_tenant_domain(host):
+    host = normalize_hostname(host)
+    if not host:
+        return False
+    return host_index().is_tenant_domain(host) or _active_tenant_domain(host)
+
+
+def is_trusted_origin(origin):
+    """
+    Origen de un dominio de tenant activo: https://<dominio> y, en desarrollo,
+    también http://<dominio>:<puerto> con los puertos de DEV_ORIGIN_PORTS.
+    """
+    try:
+        parsed = urlsplit(origin)
+        port = parsed.port
+    except ValueError:
+        return False
+    if not parsed.hostname or not is_tenant_domain(parsed.hostname):
+        return False
+    if parsed.scheme == 'https' and port is None:
+        return True
+    return settings.DEBUG and parsed.scheme == 'http' and port in DEV_ORIGIN_PORTS
@@ -0,0 +1,49 @@
+"""
+Mantiene el pool de schemas ya migrados que usa el onboarding
+(tenants.provisioning.claim_pooled_schema).
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from tenants.provisioning import fill_schema_pool
+
+# python manage.py fill_tenant_pool                  (rellena hasta TENANT_SCHEMA_POOL_SIZE y termina)
+# python manage.py fill_tenant_pool --size 10
+# python manage.py fill_tenant_pool --loop           (worker: vuelve a rellenar cada --sleep segundos)
+
+
+class Command(BaseCommand):
+    help = 'Keep a pool of migrated, unassigned schemas ready for tenant onboarding.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--size",
+            type=int,
+            default=getattr(settings, 'TENANT_SCHEMA_POOL_SIZE', 5),
+            help="Schemas libres a mantener (default: TENANT_SCHEMA_POOL_SIZE).",
+        )
+        parser.add_argument("--loop", action="store_true", help="No terminar: rellenar periódicamente.")
+        parser.add_argument("--sleep", type=float, default=30.0, help="Segundos entre rellenos con --loop.")
+
+    def handle(self, *args, **options):
+        size = max(options["size"], 0)
+        while True:
+            started = time.monotonic()
+            done = fill_schema_pool(size)
+            for schema_name, method in done:
+                self.stdout.write(f"[INFO] {schema_name}: {method}")
+            if done:
+                self.stdout.write(self.style.SUCCESS(
+                    f"[SUCCESS] Pool refilled ({len(done)} schema(s), {time.monotonic() - started:.1f}s)."
+                ))
+
+            if not options["loop"]:
+                if not done:
+                    self.stdout.write(self.style.SUCCESS(f"[SUCCESS] Pool already has {size} schema(s)."))
+                break
+            # Un worker de larga duración no debe quedarse con conexiones caídas
+            connections.close_all()
+            time.sleep(options["sleep"])
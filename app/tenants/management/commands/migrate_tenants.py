@@ -0,0 +1,100 @@
+"""
+Migra el schema público, la plantilla de tenants y todos los schemas de
+tenants, estos últimos en paralelo (un proceso por schema).
+
+Reanudable: cada schema calcula su plan antes de migrar, así que los que ya
+están al día se saltan sin tocar nada y uno que falló a mitad sigue desde la
+primera migración sin aplicar (en PostgreSQL cada migración es atómica).
+Volver a ejecutar el comando tras un fallo sólo trabaja sobre lo pendiente.
+"""
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django_tenants.utils import get_public_schema_name, get_tenant_model
+
+from tenants.provisioning import ensure_template_schema, migrate_schema, pending_migrations, template_schema_name
+
+# python manage.py migrate_tenants                          (público + plantilla + tenants, CPUs procesos)
+# python manage.py migrate_tenants --workers 8
+# python manage.py migrate_tenants --schema phoenix --schema globo_dyned2
+# python manage.py migrate_tenants --skip-shared --skip-template
+
+
+def _migrate_tenant_schema(schema_name):
+    """Punto de entrada de cada proceso del pool (un schema por tarea)."""
+    try:
+        started = time.monotonic()
+        pending = pending_migrations(schema_name)
+        if pending:
+            migrate_schema(schema_name)
+        return schema_name, len(pending), time.monotonic() - started
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Migrate the public schema, the tenant template schema and every tenant schema in parallel.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=multiprocessing.cpu_count(),
+            help="Procesos del pool para los schemas de tenants (default: número de CPUs).",
+        )
+        parser.add_argument(
+            "--schema",
+            action="append",
+            dest="schemas",
+            help="Migrar sólo este schema (se puede repetir).",
+        )
+        parser.add_argument("--skip-shared", action="store_true", help="No migrar el schema público.")
+        parser.add_argument("--skip-template", action="store_true", help="No crear/migrar la plantilla.")
+
+    def handle(self, *args, **options):
+        if not options["skip_shared"]:
+            self.stdout.write("[INFO] Migrating public schema...")
+            call_command("migrate_schemas", shared=True, interactive=False, verbosity=0)
+
+        template = template_schema_name()
+        if template and not options["skip_template"]:
+            applied = ensure_template_schema()
+            self.stdout.write(f"[INFO] Template schema {template}: {len(applied)} migration(s) applied")
+
+        schemas = options.get("schemas") or list(
+            get_tenant_model().objects
+            .exclude(schema_name=get_public_schema_name())
+            .values_list("schema_name", flat=True)
+        )
+        if not schemas:
+            self.stdout.write(self.style.SUCCESS("[SUCCESS] No tenant schemas to migrate."))
+            return
+
+        workers = max(1, min(options["workers"], len(schemas)))
+        self.stdout.write(f"[INFO] Migrating {len(schemas)} tenant schema(s) with {workers} worker(s)...")
+
+        # Los procesos hijos no deben heredar conexiones abiertas del padre
+        connections.close_all()
+        failures = []
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork")) as pool:
+            futures = {pool.submit(_migrate_tenant_schema, schema): schema for schema in schemas}
+            for done, future in enumerate(as_completed(futures), start=1):
+                schema = futures[future]
+                try:
+                    _, applied, elapsed = future.result()
+                    status = f"{applied} migration(s) applied" if applied else "up to date"
+                    self.stdout.write(f"[{done}/{len(schemas)}] {schema}: {status} ({elapsed:.1f}s)")
+                except Exception as e:
+                    failures.append(schema)
+                    self.stdout.write(self.style.ERROR(f"[{done}/{len(schemas)}] {schema}: {e}"))
+
+        if failures:
+            raise CommandError(
+                f"Migrations failed for {len(failures)} schema(s): {', '.join(failures)}. "
+                "Run the command again to resume."
+            )
+        self.stdout.write(self.style.SUCCESS(f"[SUCCESS] {len(schemas)} tenant schema(s) migrated."))
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.3 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0003_remove_admin_temp_password'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PooledSchema',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('schema_name', models.CharField(max_length=63, unique=True, verbose_name='Schema Name')),
+                ('migrations_key', models.CharField(db_index=True, max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Pooled Schema',
+                'verbose_name_plural': 'Pooled Schemas',
+                'ordering': ['created_at'],
+            },
+        ),
+    ]
@@ -270,3 +270,22 @@ class Domain(DomainMixin):
     class Meta:
         verbose_name = "Domain"
         verbose_name_plural = "Domains"
+
+
+class PooledSchema(models.Model):
+    """
+    Schema ya migrado y todavía sin tenant (tenants.provisioning).
+    El onboarding toma uno y lo renombra al schema_name del tenant nuevo.
+    """
+    schema_name = models.CharField(max_length=63, unique=True, verbose_name="Schema Name")
+    # Hash de las últimas migraciones con las que se creó/migró (ver provisioning.migrations_key)
+    migrations_key = models.CharField(max_length=64, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Pooled Schema"
+        verbose_name_plural = "Pooled Schemas"
+        ordering = ['created_at']
+
+    def __str__(self):
+        return self.schema_name
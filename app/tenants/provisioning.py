@@ -0,0 +1,197 @@
+"""
+Aprovisionamiento de schemas de tenants a partir de un schema plantilla.
+
+Migrar un schema nuevo desde cero ejecuta cada migración de TENANT_APPS (y los
+post_migrate de contenttypes/permisos): decenas de segundos dentro de la
+petición de onboarding. En su lugar se mantiene un schema plantilla
+(TENANT_BASE_SCHEMA) ya migrado y cada tenant nuevo se crea clonándolo con
+clone_schema de django-tenants (estructura, secuencias y filas de
+django_migrations/contenttypes/permisos en una sola llamada SQL).
+
+- ensure_template_schema(): crea la plantilla si falta y la migra. Lo llama
+  `manage.py migrate_tenants`, así la plantilla queda al día en cada deploy.
+- provision_schema(tenant): toma un schema del pool si hay; si no, clona la
+  plantilla si está al día; si no existe o le faltan migraciones, crea y migra
+  el schema como antes.
+
+Pool de schemas: `manage.py fill_tenant_pool` mantiene TENANT_SCHEMA_POOL_SIZE
+schemas ya migrados y sin tenant (tabla PooledSchema, en public). Asignar uno
+es un ALTER SCHEMA ... RENAME TO y un DELETE en la misma transacción, así que
+el onboarding no espera ni al clon. Cada schema del pool guarda el hash de las
+migraciones con las que quedó (migrations_key): tras un deploy con
+migraciones nuevas no se asigna hasta que fill_tenant_pool lo migra.
+"""
+
+import functools
+import hashlib
+import logging
+import uuid
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.migrations.loader import MigrationLoader
+from django_tenants.models import TenantMixin
+from django_tenants.signals import post_schema_sync
+from django_tenants.utils import schema_context, schema_exists
+
+logger = logging.getLogger(__name__)
+
+POOL_PREFIX = 'pool_'
+
+
+def template_schema_name():
+    return getattr(settings, 'TENANT_BASE_SCHEMA', None)
+
+
+def pending_migrations(schema_name):
+    """Migraciones sin aplicar en `schema_name` (lista de (app, nombre))."""
+    with schema_context(schema_name):
+        executor = MigrationExecutor(connection)
+        plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+    return [(migration.app_label, migration.name) for migration, _backwards in plan]
+
+
+def migrate_schema(schema_name, verbosity=0):
+    """Aplica las migraciones de tenant pendientes en un schema existente."""
+    call_command(
+        'migrate_schemas',
+        schema_name=schema_name,
+        tenant=True,
+        interactive=False,
+        verbosity=verbosity,
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def migrations_key():
+    """Hash de la última migración de cada app en disco (no cambia en la vida del proceso)."""
+    loader = MigrationLoader(None, ignore_no_migrations=True)
+    leaves = sorted(f"{app}.{name}" for app, name in loader.graph.leaf_nodes())
+    return hashlib.sha256('\n'.join(leaves).encode()).hexdigest()
+
+
+def ensure_template_schema(verbosity=0):
+    """Crea (si falta) y migra la plantilla. Devuelve las migraciones aplicadas."""
+    template = template_schema_name()
+    if not template:
+        return []
+    if not schema_exists(template):
+        with connection.cursor() as cursor:
+            cursor.execute(f'CREATE SCHEMA IF NOT EXISTS {connection.ops.quote_name(template)}')
+    pending = pending_migrations(template)
+    if pending:
+        migrate_schema(template, verbosity)
+    return pending
+
+
+def template_is_ready():
+    template = template_schema_name()
+    if not template or not schema_exists(template):
+        return False
+    return not pending_migrations(template)
+
+
+def build_schema(schema_name, verbosity=0):
+    """
+    Crea `schema_name` ya migrado: clon de la plantilla si está al día, si no
+    CREATE SCHEMA + migraciones. Devuelve 'cloned' o 'migrated'.
+    """
+    if template_is_ready():
+        from django_tenants.clone import CloneSchema
+
+        CloneSchema().clone_schema(template_schema_name(), schema_name)
+        # La plantilla no tenía migraciones pendientes: el clon tampoco
+        return 'cloned'
+
+    logger.warning(
+        f"Plantilla {template_schema_name()!r} inexistente o desactualizada; "
+        f"migrando {schema_name} desde cero (ejecuta manage.py migrate_tenants)"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f'CREATE SCHEMA IF NOT EXISTS {connection.ops.quote_name(schema_name)}')
+    migrate_schema(schema_name, verbosity)
+    return 'migrated'
+
+
+def claim_pooled_schema(schema_name):
+    """Renombra un schema libre del pool a `schema_name`. False si no hay ninguno."""
+    from tenants.models import PooledSchema
+
+    qn = connection.ops.quote_name
+    with transaction.atomic():
+        pooled = (
+            PooledSchema.objects
+            .select_for_update(skip_locked=True)
+            .filter(migrations_key=migrations_key())
+            .order_by('created_at')
+            .first()
+        )
+        if pooled is None:
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute(f'ALTER SCHEMA {qn(pooled.schema_name)} RENAME TO {qn(schema_name)}')
+        pooled.delete()
+    return True
+
+
+def fill_schema_pool(size, verbosity=0):
+    """
+    Deja `size` schemas libres con las migraciones actuales: migra los que
+    quedaron con migraciones viejas y crea los que falten. Devuelve
+    [(schema_name, 'migrated' | 'cloned' | 'updated'), ...].
+    """
+    from tenants.models import PooledSchema
+
+    key = migrations_key()
+    done = []
+    while True:
+        # De a una fila, bloqueada mientras se migra: claim_pooled_schema no la
+        # renombra a medias y otro fill_tenant_pool en paralelo pasa a la siguiente
+        with transaction.atomic():
+            pooled = (
+                PooledSchema.objects
+                .select_for_update(skip_locked=True)
+                .exclude(migrations_key=key)
+                .order_by('created_at')
+                .first()
+            )
+            if pooled is None:
+                break
+            if schema_exists(pooled.schema_name):
+                migrate_schema(pooled.schema_name, verbosity)
+                pooled.migrations_key = key
+                pooled.save(update_fields=['migrations_key'])
+                done.append((pooled.schema_name, 'updated'))
+            else:
+                pooled.delete()
+
+    missing = size - PooledSchema.objects.filter(migrations_key=key).count()
+    for _ in range(max(missing, 0)):
+        schema_name = f"{POOL_PREFIX}{uuid.uuid4().hex[:16]}"
+        try:
+            method = build_schema(schema_name, verbosity)
+        except Exception:
+            # No dejar un schema a medias fuera del pool
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP SCHEMA IF EXISTS {connection.ops.quote_name(schema_name)} CASCADE')
+            raise
+        PooledSchema.objects.create(schema_name=schema_name, migrations_key=key)
+        done.append((schema_name, method))
+    return done
+
+
+def provision_schema(tenant, verbosity=0):
+    """
+    Crea el schema de un tenant ya guardado con auto_create_schema = False.
+    Devuelve 'pooled', 'cloned' o 'migrated' según el camino usado.
+    """
+    if claim_pooled_schema(tenant.schema_name):
+        method = 'pooled'
+    else:
+        method = build_schema(tenant.schema_name, verbosity)
+
+    # Mismo aviso que envía TenantMixin.save() al crear el schema
+    post_schema_sync.send(sender=TenantMixin, tenant=tenant.serializable_fields())
+    return method
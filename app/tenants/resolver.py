@@ -0,0 +1,157 @@
+"""
+Resolución hostname -> tenant cacheada por proceso.
+
+Cada petición HTTP (TenantMainMiddleware) y cada conexión WebSocket
+(TenantASGIMiddleware) necesitan el tenant del hostname. Sin caché eso es una
+consulta a tenants_domain por petición (y en WebSocket, si no hay dominio
+exacto, un domain__icontains que recorre la tabla).
+
+Este módulo guarda un LRU con TTL: hostname normalizado -> Tenant (o "no
+existe", para no consultar en cada petición con un Host desconocido). Se
+devuelve una copia del Tenant porque django-tenants le asigna domain_url en
+cada petición.
+
+El caché se vacía por señales (tenants/signals.py) en el proceso que hace el
+cambio y, tras el commit, la señal cambia una versión compartida en el caché
+de Django (utils.tenant_cache, scope 'tenant_routing' del schema público).
+Cada proceso compara esa versión al leer y vacía su LRU si cambió, así que
+un dominio borrado o un tenant desactivado deja de resolverse en todos los
+workers en SHARED_VERSION_CHECK_INTERVAL segundos, sin esperar a
+TENANT_RESOLVER_CACHE_TTL.
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from utils.tenant_cache import bump_version, recent_version
+
+ROUTING_SCOPE = 'tenant_routing'
+ROUTING_SCHEMA = 'public'
+
+MISSING = object()
+_NOT_FOUND = object()
+
+
+def _cache_ttl():
+    return getattr(settings, 'TENANT_RESOLVER_CACHE_TTL', 60)
+
+
+def _cache_size():
+    return getattr(settings, 'TENANT_RESOLVER_CACHE_SIZE', 1024)
+
+
+def normalize_hostname(hostname):
+    """'Phoenix.Chalan-Pro.net:8000' -> 'phoenix.chalan-pro.net'"""
+    if not hostname:
+        return None
+    return hostname.split(':')[0].rstrip('.').lower() or None
+
+
+def routing_version():
+    """
+    Versión compartida entre procesos de dominios/tenants. Se lee del caché a
+    lo sumo una vez cada SHARED_VERSION_CHECK_INTERVAL segundos por proceso, no
+    en cada petición (la usan cached_tenant() y host_index()).
+    """
+    return recent_version(ROUTING_SCOPE, ROUTING_SCHEMA)
+
+
+def bump_routing_version():
+    bump_version(ROUTING_SCOPE, ROUTING_SCHEMA)
+
+
+class TenantResolutionCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> (expira_en, Tenant | _NOT_FOUND)
+        self._entries = OrderedDict()
+        self._version = None
+
+    def sync(self, version):
+        """Vacía el LRU si otro proceso cambió la versión compartida."""
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + _cache_ttl(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > _cache_size():
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = TenantResolutionCache()
+
+
+def _lookup(hostname, subdomain_fallback):
+    from django_tenants.utils import get_tenant_domain_model
+
+    DomainModel = get_tenant_domain_model()
+    domain = DomainModel.objects.select_related('tenant').filter(domain=hostname).first()
+    if domain:
+        return domain.tenant
+
+    if subdomain_fallback:
+        # Compatibilidad con TenantASGIMiddleware:
+        # 'globo_dyned2.chalan-pro.net' -> dominio que contenga 'globo_dyned2'
+        parts = hostname.split('.')
+        if len(parts) > 1:
+            domain = DomainModel.objects.select_related('tenant').filter(domain__icontains=parts[0]).first()
+            if domain:
+                return domain.tenant
+    return None
+
+
+def cached_tenant(hostname, subdomain_fallback=False):
+    """
+    Tenant del caché sin tocar la BD: Tenant, None (se sabe que no existe) o
+    MISSING (hay que resolverlo con resolve_tenant()).
+    """
+    hostname = normalize_hostname(hostname)
+    if not hostname:
+        return None
+    _cache.sync(routing_version())
+    value = _cache.get((hostname, subdomain_fallback))
+    if value is MISSING:
+        return MISSING
+    if value is _NOT_FOUND:
+        return None
+    return copy.copy(value)
+
+
+def resolve_tenant(hostname, subdomain_fallback=False):
+    """Tenant del hostname (None si no hay dominio), consultando la BD sólo si no está en caché."""
+    tenant = cached_tenant(hostname, subdomain_fallback)
+    if tenant is not MISSING:
+        return tenant
+
+    hostname = normalize_hostname(hostname)
+    tenant = _lookup(hostname, subdomain_fallback)
+    _cache.set((hostname, subdomain_fallback), tenant if tenant is not None else _NOT_FOUND)
+    return copy.copy(tenant) if tenant is not None else None
+
+
+def invalidate_tenant_cache():
+    _cache.clear()
@@ -0,0 +1,28 @@
+"""
+Señales de tenants.
+
+Vacían el caché de resolución hostname -> tenant (tenants.resolver) y el
+índice de hosts/orígenes (tenants.hosts) cuando cambia un dominio o un
+tenant. Se vacían ya en este proceso y, tras el commit, se cambia la versión
+compartida de enrutamiento: cada proceso (éste incluido, por si otra petición
+volvió a cargar la fila anterior mientras la transacción seguía abierta)
+descarta lo que tenía en la siguiente petición.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from tenants.models import Domain, Tenant
+from tenants.hosts import invalidate_host_index
+from tenants.resolver import bump_routing_version, invalidate_tenant_cache
+
+
+@receiver(post_save, sender=Domain, dispatch_uid="domain_invalidate_tenant_resolver")
+@receiver(post_delete, sender=Domain, dispatch_uid="domain_delete_invalidate_tenant_resolver")
+@receiver(post_save, sender=Tenant, dispatch_uid="tenant_invalidate_tenant_resolver")
+@receiver(post_delete, sender=Tenant, dispatch_uid="tenant_delete_invalidate_tenant_resolver")
+def invalidate_tenant_routing(sender, instance, **kwargs):
+    invalidate_tenant_cache()
+    invalidate_host_index()
+    transaction.on_commit(bump_routing_version)
@@ -1,3 +1,48 @@
+import datetime
+
+from django.db import connection
 from django.test import TestCase
+from django.utils import timezone
+from django_tenants.utils import schema_exists
+
+from tenants.models import PooledSchema
+from tenants.provisioning import claim_pooled_schema, migrations_key
+
+
+class ClaimPooledSchemaTests(TestCase):
+    # El DDL de PostgreSQL es transaccional: los schemas creados aquí se deshacen con el test
+
+    def _pooled(self, schema_name, key=None, age=0):
+        with connection.cursor() as cursor:
+            cursor.execute(f'CREATE SCHEMA {connection.ops.quote_name(schema_name)}')
+        pooled = PooledSchema.objects.create(schema_name=schema_name, migrations_key=key or migrations_key())
+        PooledSchema.objects.filter(pk=pooled.pk).update(
+            created_at=timezone.now() - datetime.timedelta(minutes=age)
+        )
+        return pooled
+
+    def test_empty_pool_returns_false(self):
+        self.assertFalse(claim_pooled_schema('tenant_new'))
+        self.assertFalse(schema_exists('tenant_new'))
+
+    def test_renames_the_oldest_schema_and_removes_it_from_the_pool(self):
+        self._pooled('pool_test_new', age=1)
+        self._pooled('pool_test_old', age=10)
+
+        self.assertTrue(claim_pooled_schema('tenant_new'))
+
+        self.assertTrue(schema_exists('tenant_new'))
+        self.assertFalse(schema_exists('pool_test_old'))
+        self.assertTrue(schema_exists('pool_test_new'))
+        self.assertEqual(
+            list(PooledSchema.objects.values_list('schema_name', flat=True)), ['pool_test_new']
+        )
+
+    def test_skips_schemas_with_old_migrations(self):
+        self._pooled('pool_test_stale', key='0' * 64)
+
+        self.assertFalse(claim_pooled_schema('tenant_new'))
 
-# Create your tests here.
+        self.assertTrue(schema_exists('pool_test_stale'))
+        self.assertFalse(schema_exists('tenant_new'))
+        self.assertTrue(PooledSchema.objects.filter(schema_name='pool_test_stale').exists())
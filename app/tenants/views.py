@@ -3,7 +3,6 @@ Vistas para el sistema de onboarding y gestión de tenants
 """
 import logging
 from django.conf import settings
-from django.core.management import call_command
 from django_tenants.utils import schema_context
 from django.contrib.auth import get_user_model
 from rest_framework import status
@@ -11,6 +10,7 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from .models import Tenant, Domain
+from .provisioning import provision_schema
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
@@ -233,8 +233,8 @@ def create_tenant_onboarding(request):
         logger.info(f"Schema name generado: {schema_name}")
         logger.info(f"Tenant ID generado: {tenant_id}")
         
-        # Paso 2: Crear el tenant - django-tenants creará automáticamente el schema
-        # El modelo Tenant tiene auto_create_schema=True como atributo de clase
+        # Paso 2: Crear el tenant. El schema no lo crea save() (auto_create_schema=True
+        # migraría desde cero); se crea después clonando la plantilla (tenants.provisioning)
         tenant = Tenant(
             name=company_name,
             email=email,
@@ -250,14 +250,15 @@ def create_tenant_onboarding(request):
             on_trial=True,
             is_active=True
         )
+        tenant.auto_create_schema = False
         
-        # Paso 3: Validar y guardar el tenant (django-tenants creará el schema automáticamente)
+        # Paso 3: Validar y guardar el tenant
         try:
             logger.info(f"Validando tenant: {company_name}")
             tenant.full_clean()
             
             logger.info(f"Guardando tenant en base de datos: {tenant.name}")
-            tenant.save()  # django-tenants creará el schema automáticamente aquí
+            tenant.save()
             logger.info(f"✓ Tenant guardado exitosamente con ID: {tenant.id}, Schema: {tenant.schema_name}")
             
         except Exception as e:
@@ -311,83 +312,23 @@ def create_tenant_onboarding(request):
         logger.info(f"Tenant creado: {tenant.name} ({tenant.schema_name})")
         logger.info(f"Dominio creado: {domain_name}")
         
-        # Verificar que el schema se haya creado correctamente
+        # Crear el schema: uno del pool de schemas ya migrados (rename), o clon de la
+        # plantilla, o migración completa si no hay ninguno. Ver tenants/provisioning.py
         try:
-            from django.db import connection
-            with connection.cursor() as cursor:
-                cursor.execute("""
-                    SELECT EXISTS (
-                        SELECT 1 FROM information_schema.schemata 
-                        WHERE schema_name = %s
-                    )
-                """, [tenant.schema_name])
-                schema_exists = cursor.fetchone()[0]
-            
-            if not schema_exists:
-                logger.error(f"✗ El schema {tenant.schema_name} no existe después de crear el tenant")
-                # Intentar crear el schema manualmente
-                logger.info(f"Intentando crear el schema {tenant.schema_name} manualmente...")
-                with connection.cursor() as cursor:
-                    cursor.execute(f'CREATE SCHEMA IF NOT EXISTS "{tenant.schema_name}"')
-                logger.info(f"✓ Schema {tenant.schema_name} creado manualmente")
-            else:
-                logger.info(f"✓ Schema {tenant.schema_name} existe correctamente")
+            logger.info(f"Creando schema: {tenant.schema_name}")
+            method = provision_schema(tenant)
+            logger.info(f"✓ Schema {tenant.schema_name} listo ({method})")
         except Exception as e:
-            logger.error(f"✗ Error al verificar/crear schema: {str(e)}", exc_info=True)
-            return Response({
-                'success': False,
-                'error': f'Error al verificar el schema del tenant: {str(e)}'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        
-        # Ejecutar migraciones para el nuevo tenant
-        # django-tenants requiere que las migraciones se ejecuten después de crear el schema
-        try:
-            logger.info(f"Ejecutando migraciones para schema: {tenant.schema_name}")
-            
-            # Método 1: Intentar con migrate_schemas usando el parámetro schema
-            # El comando migrate_schemas de django-tenants acepta --schema=<schema_name>
+            logger.error(f"✗ Error al crear el schema del tenant: {str(e)}", exc_info=True)
+            # Eliminar el tenant y lo que haya quedado del schema
             try:
-                call_command('migrate_schemas', schema=tenant.schema_name, verbosity=1)
-                logger.info(f"✓ Migraciones completadas usando migrate_schemas para schema: {tenant.schema_name}")
-            except Exception as e1:
-                logger.warning(f"migrate_schemas con parámetro 'schema' falló: {str(e1)}")
-                # Método 2: Intentar usando schema_context con migrate normal
-                try:
-                    logger.info(f"Intentando ejecutar migraciones usando schema_context...")
-                    with schema_context(tenant.schema_name):
-                        call_command('migrate', verbosity=1, interactive=False)
-                    logger.info(f"✓ Migraciones completadas usando schema_context para schema: {tenant.schema_name}")
-                except Exception as e2:
-                    logger.error(f"✗ Error con schema_context: {str(e2)}", exc_info=True)
-                    # Método 3: Intentar usando el método create_schema del tenant si está disponible
-                    try:
-                        logger.info(f"Intentando usar método create_schema del tenant...")
-                        if hasattr(tenant, 'create_schema'):
-                            tenant.create_schema(check_if_exists=True)
-                            logger.info(f"✓ Schema creado/verificado usando create_schema")
-                            # Intentar migraciones nuevamente
-                            with schema_context(tenant.schema_name):
-                                call_command('migrate', verbosity=1, interactive=False)
-                            logger.info(f"✓ Migraciones completadas después de create_schema")
-                        else:
-                            raise Exception("El método create_schema no está disponible")
-                    except Exception as e3:
-                        logger.error(f"✗ Error con create_schema: {str(e3)}", exc_info=True)
-                        # Si todos los métodos fallan, intentar limpiar el tenant creado
-                        try:
-                            tenant.delete()
-                            logger.info(f"Tenant {tenant.name} eliminado debido a error en migraciones")
-                        except:
-                            pass
-                        return Response({
-                            'success': False,
-                            'error': f'Error al ejecutar migraciones para el nuevo tenant. Métodos intentados: migrate_schemas ({str(e1)}), schema_context ({str(e2)}), create_schema ({str(e3)})'
-                        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        except Exception as e:
-            logger.error(f"✗ Error inesperado al ejecutar migraciones: {str(e)}", exc_info=True)
+                tenant.delete(force_drop=True)
+                logger.info(f"Tenant {tenant.name} eliminado debido a error al crear el schema")
+            except:
+                pass
             return Response({
                 'success': False,
-                'error': f'Error inesperado al ejecutar migraciones: {str(e)}'
+                'error': f'Error al crear el schema del nuevo tenant: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
         # Crear superusuario inicial para el tenant
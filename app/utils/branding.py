@@ -0,0 +1,18 @@
+"""
+Logo del tenant para los PDFs (contratos, transacciones, schedule).
+
+Se resuelve por el host de la petición. Los trabajos en segundo plano no
+tienen petición: guardan la URL calculada al encolar (ver appcore.exports).
+"""
+
+
+def tenant_logo_path(domain):
+    if 'phoenixelectricandair' in domain:
+        return 'media/tenant_logos/Logo-phoenix-w.png'
+    if '192.168.0.248:8000' in domain or 'division16llc' in domain:
+        return 'media/tenant_logos/Logo-division-w.png'
+    return 'media/tenant_logos/default-logo.png'
+
+
+def tenant_logo_url(request):
+    return request.build_absolute_uri('/' + tenant_logo_path(request.get_host()))
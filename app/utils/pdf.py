@@ -0,0 +1,137 @@
+"""
+Entrega de PDFs generados con WeasyPrint (contratos, transacciones, schedule).
+
+- render_pdf(): renderiza un template reutilizando una FontConfiguration por
+  hilo (crearla en cada llamada obliga a WeasyPrint a reconstruir la
+  configuración de fontconfig).
+- cached_pdf(): cache en disco por tenant, con clave = hash del contenido que
+  alimenta el PDF. Si las filas de origen no cambian, reimprimir cuesta una
+  lectura de archivo. Cuando cambian, la clave cambia y la versión anterior
+  del mismo objeto se borra. Con `max_files` el directorio del tipo se poda
+  a los archivos usados más recientemente.
+- pdf_response(): devuelve application/pdf en bloques (FileResponse), o el
+  formato anterior {file: base64, filename, file_type} con ?base64=1.
+"""
+
+import base64
+import glob
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+from django.db import connection
+from django.http import FileResponse
+from django.template.loader import render_to_string
+from rest_framework.response import Response
+
+_local = threading.local()
+
+
+def font_configuration():
+    """FontConfiguration reutilizable del hilo actual."""
+    font_config = getattr(_local, 'font_config', None)
+    if font_config is None:
+        from weasyprint.text.fonts import FontConfiguration
+        font_config = _local.font_config = FontConfiguration()
+    return font_config
+
+
+def render_pdf(template_name, context):
+    from weasyprint import HTML
+
+    html = render_to_string(template_name, context)
+    return HTML(string=html).write_pdf(font_config=font_configuration())
+
+
+def content_key(*parts):
+    """Hash estable de las filas/valores que determinan el PDF."""
+    payload = json.dumps([settings.PDF_CACHE_VERSION, *parts], default=str, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+def _cache_dir(kind):
+    schema = getattr(connection, 'schema_name', 'public')
+    return os.path.join(settings.PDF_CACHE_DIR, schema, kind)
+
+
+def _prune(directory, max_files):
+    """Deja los `max_files` PDFs usados más recientemente (mtime, ver cached_pdf)."""
+    entries = []
+    for path in glob.glob(os.path.join(directory, '*.pdf')):
+        try:
+            entries.append((os.path.getmtime(path), path))
+        except FileNotFoundError:
+            pass
+    entries.sort(reverse=True)
+    for _, path in entries[max_files:]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def cached_pdf(kind, object_id, key, render, max_files=None):
+    """
+    PDF `kind`/`object_id` con la clave de contenido `key`, como archivo
+    binario abierto. Si no está en disco se genera con render() -> bytes.
+    Escritura atómica (archivo temporal + os.replace) para que dos workers no
+    lean un PDF a medias.
+
+    El archivo se abre aquí y no en pdf_response(): otro worker puede borrarlo
+    (versión nueva, poda) entre la comprobación y la lectura;
+    un descriptor abierto sigue siendo legible y si el open falla se regenera.
+    """
+    directory = _cache_dir(kind)
+    path = os.path.join(directory, f"{object_id}-{key}.pdf")
+    try:
+        pdf = open(path, 'rb')
+    except FileNotFoundError:
+        pass
+    else:
+        if max_files:
+            try:
+                os.utime(path)  # uso reciente, para _prune
+            except FileNotFoundError:
+                pass
+        return pdf
+
+    pdf_file = render()
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as tmp:
+        tmp.write(pdf_file)
+    os.replace(tmp_path, path)
+
+    # Versiones anteriores del mismo objeto ya no se van a pedir
+    for old in glob.glob(os.path.join(directory, f"{glob.escape(str(object_id))}-*.pdf")):
+        if old != path:
+            try:
+                os.remove(old)
+            except FileNotFoundError:
+                pass
+    if max_files:
+        _prune(directory, max_files)
+    return io.BytesIO(pdf_file)
+
+
+def wants_base64(request):
+    return request.GET.get('base64') in ('1', 'true')
+
+
+def pdf_response(request, pdf, filename):
+    """
+    PDF binario a partir del archivo abierto que devuelve cached_pdf(); el
+    JSON con base64 queda sólo por compatibilidad (?base64=1).
+    """
+    if wants_base64(request):
+        with pdf:
+            return Response({
+                'file': base64.b64encode(pdf.read()).decode('utf-8'),
+                'filename': filename,
+                'file_type': 'application/pdf'
+            }, status=200)
+    return FileResponse(pdf, content_type='application/pdf', filename=filename)
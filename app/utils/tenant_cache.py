@@ -0,0 +1,119 @@
+"""
+Caché read-through por tenant para endpoints de dashboard y analítica.
+
+Las claves combinan schema del tenant + ámbito (scope) + endpoint + query
+params normalizados + una versión por (tenant, scope). Invalidar no borra
+claves: bump_version() cambia la versión y las entradas anteriores quedan
+huérfanas hasta que expiran (TTL de ANALYTICS_CACHE_TTL).
+
+Uso:
+
+    class TopSellingProductsAPIView(APIView):
+        @cached_response("inventory_analytics")
+        def get(self, request):
+            ...
+
+    # en señales, tras el commit:
+    bump_version_on_commit("inventory_analytics")
+
+recent_version() es get_version() para caminos calientes (por fila o por
+petición): consulta el caché compartido a lo sumo una vez cada
+SHARED_VERSION_CHECK_INTERVAL segundos por proceso.
+"""
+
+import hashlib
+import json
+import threading
+import time
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from rest_framework.response import Response
+
+KEY_PREFIX = "tenant_cache"
+
+# (schema, scope) -> (leída_en, versión), por proceso (ver recent_version)
+_recent = {}
+_recent_lock = threading.Lock()
+
+
+def _schema_name():
+    return getattr(connection, "schema_name", "public")
+
+
+def _version_key(schema, scope):
+    return f"{KEY_PREFIX}:{schema}:{scope}:version"
+
+
+def get_version(scope, schema=None):
+    key = _version_key(schema or _schema_name(), scope)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def recent_version(scope, schema=None):
+    """
+    get_version() leída de nuevo sólo si pasaron SHARED_VERSION_CHECK_INTERVAL
+    segundos desde la última lectura en este proceso. Un bump_version() de
+    este mismo proceso se ve de inmediato.
+    """
+    schema = schema or _schema_name()
+    now = time.monotonic()
+    seen = _recent.get((schema, scope))
+    if seen is not None and now - seen[0] < settings.SHARED_VERSION_CHECK_INTERVAL:
+        return seen[1]
+    version = get_version(scope, schema)
+    with _recent_lock:
+        _recent[(schema, scope)] = (now, version)
+    return version
+
+
+def bump_version(scope, schema=None):
+    """Invalida todas las entradas del scope para el tenant."""
+    schema = schema or _schema_name()
+    # Un token aleatorio (no un contador) evita reutilizar versiones si la clave se desaloja
+    cache.set(_version_key(schema, scope), uuid.uuid4().hex, None)
+    with _recent_lock:
+        _recent.pop((schema, scope), None)
+
+
+def bump_version_on_commit(scope):
+    """Invalida tras el commit, para no cachear datos que aún no son visibles."""
+    schema = _schema_name()
+    transaction.on_commit(lambda: bump_version(scope, schema))
+
+
+def build_cache_key(scope, endpoint, params):
+    """Clave estable: el orden de los query params no importa."""
+    normalized = sorted((name, sorted(values)) for name, values in params.lists())
+    digest = hashlib.md5(json.dumps(normalized).encode()).hexdigest()
+    schema = _schema_name()
+    return f"{KEY_PREFIX}:{schema}:{scope}:{get_version(scope, schema)}:{endpoint}:{digest}"
+
+
+def cached_response(scope, timeout=None):
+    """
+    Decorador para métodos get() de APIView: sirve Response.data desde caché
+    y sólo guarda respuestas 200.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            key = build_cache_key(scope, type(self).__name__, request.query_params)
+            data = cache.get(key)
+            if data is not None:
+                return Response(data)
+
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                ttl = timeout if timeout is not None else settings.ANALYTICS_CACHE_TTL
+                cache.set(key, response.data, ttl)
+            return response
+        return wrapper
+    return decorator
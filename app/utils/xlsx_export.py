@@ -0,0 +1,152 @@
+"""
+Motor de exportación a Excel con memoria constante.
+
+Las hojas se escriben con openpyxl en modo write-only: cada fila se serializa
+a un archivo temporal en cuanto se agrega, así que las filas pueden venir de un
+queryset con .iterator(chunk_size=...) sin materializarlo. El ancho de las
+columnas se estima con una muestra de las primeras filas (en write-only hay
+que fijarlo antes de escribir) en lugar de recorrer toda la hoja al final.
+El .xlsx terminado se envía en bloques con un StreamingHttpResponse.
+
+Uso:
+
+    sheet = ExportSheet(
+        "Product Movements",
+        ['Date', 'Product', 'Quantity'],
+        ([m.timestamp.date(), m.product.name, float(m.quantity)]
+         for m in movements.iterator(chunk_size=EXPORT_CHUNK_SIZE)),
+    )
+    return xlsx_response([sheet], "product_movements.xlsx")
+"""
+
+import tempfile
+from itertools import chain, islice
+
+from django.http import StreamingHttpResponse
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, PatternFill
+from openpyxl.utils import get_column_letter
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Filas por viaje a la base de datos al iterar querysets
+EXPORT_CHUNK_SIZE = 2000
+# Filas usadas para estimar el ancho de las columnas
+WIDTH_SAMPLE_ROWS = 200
+STREAM_BLOCK_SIZE = 64 * 1024
+
+HEADER_STYLE = {
+    "font": Font(bold=True),
+    "fill": PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid"),
+    "alignment": Alignment(horizontal="center"),
+}
+
+
+class StyledRow(list):
+    """Fila con estilo propio (p. ej. una fila de totales en negrita)."""
+
+    def __init__(self, values, **style):
+        super().__init__(values)
+        self.style = style
+
+
+class ExportSheet:
+    """
+    Definición de una hoja: título, encabezados y un iterable de filas.
+
+    - `header_style` / `row_style`: atributos de celda (font, fill, alignment, border).
+    - `widths`: anchos fijos; si no se indican se estiman con la muestra.
+    - `max_width`: tope del ancho estimado (None = sin tope).
+    """
+
+    def __init__(self, title, headers, rows, header_style=HEADER_STYLE, row_style=None,
+                 widths=None, max_width=50):
+        self.title = title[:31]  # Excel admite como máximo 31 caracteres
+        self.headers = list(headers)
+        self.rows = rows
+        self.header_style = header_style or {}
+        self.row_style = row_style or {}
+        self.widths = widths
+        self.max_width = max_width
+
+
+def _estimate_widths(headers, sample, max_width):
+    widths = [len(str(header)) for header in headers]
+    for row in sample:
+        for index, value in enumerate(row):
+            length = len(str(value)) if value is not None else 0
+            if index >= len(widths):
+                widths.append(length)
+            elif length > widths[index]:
+                widths[index] = length
+    widths = [width + 2 for width in widths]
+    if max_width is not None:
+        widths = [min(width, max_width) for width in widths]
+    return widths
+
+
+def _cells(ws, values, style):
+    if not style:
+        return list(values)
+    cells = []
+    for value in values:
+        cell = WriteOnlyCell(ws, value=value)
+        for attr, attr_value in style.items():
+            setattr(cell, attr, attr_value)
+        cells.append(cell)
+    return cells
+
+
+def write_sheet(wb, sheet):
+    ws = wb.create_sheet(title=sheet.title)
+    rows = iter(sheet.rows)
+    sample = list(islice(rows, WIDTH_SAMPLE_ROWS))
+
+    widths = sheet.widths or _estimate_widths(sheet.headers, sample, sheet.max_width)
+    for index, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(index)].width = width
+
+    if sheet.headers:
+        ws.append(_cells(ws, sheet.headers, sheet.header_style))
+    for row in chain(sample, rows):
+        style = row.style if isinstance(row, StyledRow) else sheet.row_style
+        ws.append(_cells(ws, row, style))
+
+
+def build_workbook(sheets, target):
+    """Escribe las hojas en `target` (ruta o archivo binario)."""
+    wb = Workbook(write_only=True)
+    for sheet in sheets:
+        write_sheet(wb, sheet)
+    if not wb.worksheets:
+        wb.create_sheet(title="Sheet")  # un .xlsx necesita al menos una hoja
+    wb.save(target)
+
+
+def _stream_file(fileobj):
+    try:
+        while True:
+            block = fileobj.read(STREAM_BLOCK_SIZE)
+            if not block:
+                break
+            yield block
+    finally:
+        fileobj.close()
+
+
+def xlsx_response(sheets, filename):
+    """StreamingHttpResponse con el .xlsx construido en un archivo temporal."""
+    tmp = tempfile.TemporaryFile()
+    try:
+        build_workbook(sheets, tmp)
+        size = tmp.tell()
+        tmp.seek(0)
+    except Exception:
+        tmp.close()
+        raise
+
+    response = StreamingHttpResponse(_stream_file(tmp), content_type=XLSX_CONTENT_TYPE)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Content-Length'] = str(size)
+    return response
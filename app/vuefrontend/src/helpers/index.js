@@ -7,32 +7,20 @@ function isMobile() {
   return isAndroid || isiOS || isWindowsPhone || isMobileSafari || screen.width < 768;
 }
 
-function base64ToBlob(base64Data, contentType) {
-  var sliceSize = 512;
-  var byteCharacters = atob(base64Data);
-  var byteArrays = [];
-
-  for (var offset = 0; offset < byteCharacters.length; offset += sliceSize) {
-    var slice = byteCharacters.slice(offset, offset + sliceSize);
-
-    var byteNumbers = new Array(slice.length);
-    for (var i = 0; i < slice.length; i++) {
-      byteNumbers[i] = slice.charCodeAt(i);
-    }
-
-    var byteArray = new Uint8Array(byteNumbers);
-    byteArrays.push(byteArray);
-  }
-
-  return new Blob(byteArrays, { type: contentType });
-}
-
+// Nombre de archivo del header Content-Disposition (PDFs binarios)
+export const pdfFilename = (response, fallback) => {
+  const disposition = response.headers['content-disposition'] || '';
+  const match = /filename\*?=(?:UTF-8'')?"?([^";]+)"?/i.exec(disposition);
+  return match ? decodeURIComponent(match[1]) : fallback;
+};
+
+// data: { blob, filename } (respuesta de axios con responseType: 'blob')
 export const openPdf = (data) => {
   const reportName = data.filename;
+  const blob = new Blob([data.blob], { type: 'application/pdf' });
 
   setTimeout(() => {
     if (isMobile()) {
-      const blob = base64ToBlob(data.file, data.file_type);
       const url = URL.createObjectURL(blob);
       const link = document.createElement('a');
 
@@ -60,7 +48,7 @@ export const openPdf = (data) => {
           newWindow.document.head.appendChild(title);
           newWindow.document.body.setAttribute('style', 'margin: 0;');
 
-          iframe.setAttribute('src', `data:application/pdf;base64,${data.file}`);
+          iframe.setAttribute('src', URL.createObjectURL(blob));
           iframe.setAttribute('width', "100%");
           iframe.setAttribute('height', "100%");
           iframe.setAttribute('style', "border:none;");